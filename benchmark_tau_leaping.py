@@ -0,0 +1,109 @@
+import os
+import time
+
+import apacepy.calibration as calib
+import numpy as np
+import pandas as pd
+from deampy.in_out_functions import make_directory
+from scipy.stats import ks_2samp
+
+from covid_model.settings import COVIDSettings
+from covid_model.vectorized_model import BatchOfEpiModels, get_sum_and_ratio_time_series
+from definitions import ROOT_DIR, SIM_BATCH_SIZE, TAU_LEAPING_EPS, TAU_LEAPING_MIN_CHANGE
+
+N = 250  # number of trajectories simulated with each stepper
+BATCH_SIZE = SIM_BATCH_SIZE  # number of trajectories simulated together
+WEEKS = (96, 117)  # weeks (from Mar-1, 2020) over which the distribution of hospital occupancy is compared
+
+"""
+To measure the accuracy and speed of tau-leaping (SIM_TAU_LEAPING in definitions.py) against the 
+simulation with the fixed time-step deltaT. The same seeds (of calibrated trajectories if the model 
+is calibrated) are simulated with both steppers and the distribution of hospital occupancy rate 
+(per 100,000 population) across trajectories is compared at each week in WEEKS. 
+
+The results will be stored in:
+    outputs/summary/tau_leaping_benchmark.csv -> mean, percentiles, and the Kolmogorov-Smirnov statistic 
+        (and its p-value) of hospital occupancy rate at each week
+    outputs/summary/tau_leaping_benchmark.txt -> run-times and the average length of time-steps
+"""
+
+
+def simulate(seeds, tau_leaping):
+    """
+    :param seeds: (list) of seeds of trajectories
+    :param tau_leaping: (bool) if tau-leaping is used
+    :return: (hospital occupancy rate per 100,000 population [trajectory, week], run-time,
+              number of updates of compartments per trajectory)
+    """
+
+    sets = COVIDSettings(engine='numpy', tau_leaping=tau_leaping)
+    hosp_occ_rates = []
+    run_time = 0
+    n_updates = 0
+    for ids in np.array_split(np.arange(len(seeds)), int(np.ceil(len(seeds) / BATCH_SIZE))):
+        batch = BatchOfEpiModels(ids=ids.tolist(), settings=sets)
+        batch.simulate(seeds=[seeds[i] for i in ids])
+        run_time += batch.runTime
+        n_updates += batch.nUpdates.sum()
+        for i in range(len(batch)):
+            sums, ratios = get_sum_and_ratio_time_series(history=batch.history, i=i, pd=batch.pd)
+            values = next(r for r in ratios if r.name == 'Hospital occupancy rate').values
+            values = np.concatenate((values, np.full(WEEKS[1] + 1, np.nan)))
+            hosp_occ_rates.append(100000 * values[WEEKS[0]:WEEKS[1] + 1])
+
+    return np.array(hosp_occ_rates), run_time, n_updates / len(seeds)
+
+
+def benchmark(n):
+
+    filename = ROOT_DIR + '/outputs/summary/calibration_summary.csv'
+    if os.path.exists(filename):
+        seeds = calib.get_seeds_with_non_zero_prob(filename=filename, random_state=0)[:n]
+    else:
+        seeds = list(range(n))
+
+    results = dict()
+    for tau_leaping in (False, True):
+        start = time.time()
+        results[tau_leaping] = simulate(seeds=seeds, tau_leaping=tau_leaping)
+        print('Tau-leaping: {} -- simulated in {} seconds'.format(tau_leaping, round(time.time() - start, 1)))
+
+    rows = []
+    for j, week in enumerate(range(WEEKS[0], WEEKS[1] + 1)):
+        row = {'Week': week}
+        samples = dict()
+        for tau_leaping, label in ((False, 'Fixed step'), (True, 'Tau-leaping')):
+            values = results[tau_leaping][0][:, j]
+            samples[tau_leaping] = values[~np.isnan(values)]
+            row[label + ': mean'] = np.mean(samples[tau_leaping])
+            for q in (5, 50, 95):
+                row[label + ': {}th percentile'.format(q)] = np.percentile(samples[tau_leaping], q)
+        ks = ks_2samp(samples[False], samples[True])
+        row['KS statistic'] = ks.statistic
+        row['KS p-value'] = ks.pvalue
+        rows.append(row)
+
+    df = pd.DataFrame(rows)
+    make_directory(ROOT_DIR + '/outputs/summary/')
+    df.to_csv(ROOT_DIR + '/outputs/summary/tau_leaping_benchmark.csv', index=False)
+
+    with open(ROOT_DIR + '/outputs/summary/tau_leaping_benchmark.txt', 'w') as file:
+        file.write('Number of trajectories: {}\n'.format(len(seeds)))
+        file.write('Batch size: {}\n'.format(BATCH_SIZE))
+        file.write('Tau-leaping epsilon: {}\n'.format(TAU_LEAPING_EPS))
+        file.write('Tau-leaping minimum change: {}\n'.format(TAU_LEAPING_MIN_CHANGE))
+        for tau_leaping, label in ((False, 'Fixed step'), (True, 'Tau-leaping')):
+            hosp_occ_rates, run_time, n_updates = results[tau_leaping]
+            file.write('{}: run-time (seconds): {}\n'.format(label, round(run_time, 1)))
+            file.write('{}: average number of time-steps per trajectory: {}\n'.format(label, round(n_updates, 1)))
+        file.write('Maximum KS statistic over weeks {}-{}: {}\n'.format(
+            WEEKS[0], WEEKS[1], round(df['KS statistic'].max(), 3)))
+        file.write('Minimum KS p-value over weeks {}-{}: {}\n'.format(
+            WEEKS[0], WEEKS[1], round(df['KS p-value'].min(), 3)))
+
+    print(df[['Week', 'Fixed step: mean', 'Tau-leaping: mean', 'KS statistic', 'KS p-value']].round(3))
+
+
+if __name__ == "__main__":
+
+    benchmark(n=N)
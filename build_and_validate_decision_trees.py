@@ -1,10 +1,11 @@
 import numpy as np
 
 from covid_prediction.model_specs import *
-from covid_prediction.optimize_parameters import optimize_and_eval_dec_tree, SummaryOfTreePerformance
+from covid_prediction.optimize_parameters import optimize_and_eval_dec_trees, get_pool, SummaryOfTreePerformance
 from definitions import ROOT_DIR, HOSP_OCCU_THRESHOLDS, DIGITS, CV_FOLD
 
 MODELS = (A, B)  # decision trees to evaluate
+WEEKS_TO_PREDICT = (4, 8)  # weeks to predict
 ALPHAS = np.arange(0.001, 0.020, 0.001)  # values of ccp penalty
 IF_PARALLEL = True
 
@@ -13,37 +14,45 @@ IF_PARALLEL = True
 ERROR_TOLERANCE = 0.005
 
 
-def evaluate(weeks_to_predict):
+def evaluate(list_of_weeks_to_predict, pool=None):
 
-    # summary builder
-    summary = SummaryOfTreePerformance()
+    print("Evaluating models {} for {}-week prediction.".format(
+        ', '.join(model.name for model in MODELS), ', '.join(str(w) for w in list_of_weeks_to_predict)))
 
-    for model in MODELS:
+    # cross validation of all models, thresholds, and weeks to predict is run as one set of tasks
+    best_spec_and_validation_performance = optimize_and_eval_dec_trees(
+        model_specs=MODELS,
+        hosp_occu_thresholds=HOSP_OCCU_THRESHOLDS,
+        list_of_weeks_to_predict=list_of_weeks_to_predict,
+        list_of_ccp_alphas=ALPHAS,
+        error_tolerance=ERROR_TOLERANCE,
+        cv_fold=CV_FOLD,
+        shorten_feature_names=SHORT_FEATURE_NAMES,
+        pool=pool)
 
-        print("Evaluating model {} for {}-week prediction.".format(model.name, weeks_to_predict))
+    for weeks_to_predict in list_of_weeks_to_predict:
 
-        best_spec_and_validation_performance = optimize_and_eval_dec_tree(
-            model_spec=model,
-            weeks_to_predict=weeks_to_predict,
-            hosp_occu_thresholds=HOSP_OCCU_THRESHOLDS,
-            list_of_ccp_alphas=ALPHAS,
-            error_tolerance=ERROR_TOLERANCE,
-            cv_fold=CV_FOLD,
-            if_parallel=IF_PARALLEL,
-            shorten_feature_names=SHORT_FEATURE_NAMES)
+        # summary builder
+        summary = SummaryOfTreePerformance()
+        dict_of_performance = best_spec_and_validation_performance[weeks_to_predict]
 
-        summary.add(model_name=model.name,
-                    hosp_occu_thresholds=HOSP_OCCU_THRESHOLDS,
-                    best_spec_and_validation_performance=best_spec_and_validation_performance,
-                    digits=DIGITS)
+        for model in MODELS:
+            summary.add(model_name=model.name,
+                        hosp_occu_thresholds=HOSP_OCCU_THRESHOLDS,
+                        best_spec_and_validation_performance=dict_of_performance[model.name],
+                        digits=DIGITS)
 
-    # generate the report
-    summary.print(
-        file_name=ROOT_DIR + '/outputs/prediction_summary_{}_weeks/dec_tree/summary.csv'.format(weeks_to_predict))
+        # generate the report
+        summary.print(
+            file_name=ROOT_DIR + '/outputs/prediction_summary_{}_weeks/dec_tree/summary.csv'.format(weeks_to_predict))
 
 
 if __name__ == '__main__':
 
-    evaluate(weeks_to_predict=4)
-    evaluate(weeks_to_predict=8)
-
+    # one pool of processes (with the training and validation datasets already read)
+    # is used for the cross validation and the final models of all weeks to predict
+    if IF_PARALLEL:
+        with get_pool(list_of_weeks_to_predict=WEEKS_TO_PREDICT) as pool:
+            evaluate(list_of_weeks_to_predict=WEEKS_TO_PREDICT, pool=pool)
+    else:
+        evaluate(list_of_weeks_to_predict=WEEKS_TO_PREDICT)
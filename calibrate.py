@@ -3,11 +3,15 @@ import warnings
 from deampy.in_out_functions import make_directory
 
 from covid_model.model import build_covid_model
+from covid_model.prescreen import SurrogatePreScreen
 from covid_model.settings import COVIDSettings
-from definitions import N_SIM_CALIBRATION, N_SIM_TRAINING, N_SIM_VALIDATION, CALIB_PERIOD, ROOT_DIR
+from covid_model.vectorized_calibration import VectorizedCalibrationWithRandomSampling, VectorizedCalibrationWithSMC
+from definitions import N_SIM_CALIBRATION, N_SIM_TRAINING, N_SIM_VALIDATION, CALIB_PERIOD, CALIB_METHOD, ROOT_DIR
 from simulate_many import simulate
 
 RUN_IN_PARALLEL = True  # set True to run the simulated trajectories in parallel
+PRE_SCREEN = False  # set True to reject parameter draws that are unlikely to produce feasible trajectories
+                    # before simulating them (only with SIM_ENGINE = 'numpy')
 
 """
 To calibrate the model against the data provided under covid_model/data.py to identify 
@@ -18,6 +22,8 @@ The settings can be customized in definitions.py:
         a trajectory feasible should be met (specified in covid_model/data.py)
    CALIB_PERIOD: years to simulate a trajectory to calculate the likelihoods against data 
    N_SIM_CALIBRATION: number of trajectories simulated for calibration 
+   CALIB_METHOD: 'random sampling' or 'abc-smc' (with ABC-SMC, calibration continues until 
+        N_SIM_TRAINING + N_SIM_VALIDATION trajectories with non-zero probability are found)
    N_SIM_TRAINING: number of trajectories simulated for training the decision rules
    N_SIM_VALIDATION: number of trajectories simulated for validating the decision rules
    
@@ -25,6 +31,12 @@ The results of calibration will be stored in:
     outputs/summary/calibration_summary.csv -> likelihood weight of each simulated trajectory
     outputs/summary/calibration.txt -> summary of calibration results
 
+With SIM_ENGINE = 'numpy' and random sampling, the outcome of each simulated trajectory is also appended to 
+    outputs/summary/calibration_checkpoint.csv
+If calibration is interrupted, running this script again resumes it from this file (it can also extend a
+finished calibration to a larger N_SIM_CALIBRATION). Delete this file to start a new calibration 
+(e.g. after changing the model).
+
 This scrip will also simulated and visualized a random set of 100 trajectories with positive likelihood. The
 figures will be stored in: 
     outputs/figures/summary.png; calibration.png; incidence.png; novel_variant.png 
@@ -43,26 +55,49 @@ if __name__ == "__main__":
     sets.storeParameterValues = False
 
     # calibrate the model
-    calibration = calib.CalibrationWithRandomSampling(
-        model_settings=sets, parallelization_approach='few-many', max_tries=100)
+    n_trajs_needed = N_SIM_TRAINING+N_SIM_VALIDATION
+    num_of_iterations = N_SIM_CALIBRATION
+    if CALIB_METHOD == 'abc-smc':
+        if sets.engine != 'numpy':
+            raise ValueError("ABC-SMC calibration requires SIM_ENGINE = 'numpy'.")
+        calibration = VectorizedCalibrationWithSMC(model_settings=sets)
+        num_of_iterations = n_trajs_needed
+    elif sets.engine == 'numpy':
+        # infeasible trajectories are terminated as soon as a feasible condition is violated
+        calibration = VectorizedCalibrationWithRandomSampling(
+            model_settings=sets, parallelization_approach='few-many', max_tries=100,
+            pre_screen=SurrogatePreScreen() if PRE_SCREEN else None,
+            checkpoint_filename=ROOT_DIR + '/outputs/summary/calibration_checkpoint.csv')
+    else:
+        calibration = calib.CalibrationWithRandomSampling(
+            model_settings=sets, parallelization_approach='few-many', max_tries=100)
 
     calibration.run(
         function_to_populate_model=build_covid_model,
-        num_of_iterations=N_SIM_CALIBRATION,
+        num_of_iterations=num_of_iterations,
         if_run_in_parallel=RUN_IN_PARALLEL)
 
-    file.write('Number of calibration processors: {}\n'.format(N_SIM_CALIBRATION))
+    file.write('Number of calibration processors: {}\n'.format(num_of_iterations))
     file.write('Number of trajectories discarded: {}\n'.format(calibration.nTrajsDiscarded))
     file.write('Calibration duration (seconds): {}\n'.format(round(calibration.runTime, 1)))
     file.write('Number of trajectories with non-zero probability: {}\n'.format(calibration.nTrajsWithNonZeroProb))
-    n_trajs_needed = N_SIM_TRAINING+N_SIM_VALIDATION
+    if CALIB_METHOD == 'abc-smc':
+        for line in calibration.get_generation_summary():
+            file.write(line + '\n')
+    if sets.engine == 'numpy':
+        for line in calibration.get_rejection_summary():
+            file.write(line + '\n')
+    else:
+        # apacepy discards infeasible trajectories without recording which feasible condition rejected them
+        file.write("Numbers of trajectories rejected by each feasible condition and the simulation time saved "
+                   "by early termination are only reported with SIM_ENGINE = 'numpy'.\n")
     if calibration.nTrajsWithNonZeroProb < n_trajs_needed:
         warnings.warn('\nNumber of trajectories with non-zero probability ({}) is less than '
                       'the number of trajectories needed '
                       'for training and validating the predictive models ({}).'
                       '\nIncrease the number of trajectories '
                       'used for calibration which is currently {}.'
-                      .format(calibration.nTrajsWithNonZeroProb, n_trajs_needed, N_SIM_CALIBRATION))
+                      .format(calibration.nTrajsWithNonZeroProb, n_trajs_needed, num_of_iterations))
 
     file.close()
 
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from apacepy.epidemic import EpiModel
+from deampy.in_out_functions import write_columns_to_csv, make_directory
+
+from covid_model import model as M
+from covid_model.settings import COVIDSettings
+from covid_model.vectorized_model import VectorizedEpiModel
+
+SEED = 5  # seed of the trajectory simulated with both engines
+FOLDER = 'outputs/engine_comparison'
+# columns that only depend on the simulation clock and on when the epidemic is detected
+CLOCK_COLUMNS = ('Simulation Time', 'Simulation Period', 'Observation Time', 'Observation Period')
+
+"""
+To check that the 'numpy' engine (covid_model/vectorized_model.py) exports trajectories in the same
+layout as apacepy. A trajectory is simulated with the same seed by both engines and exported into
+csv files, which are then compared column by column.
+The two engines draw different random numbers, so the values of time-series are not expected to match,
+but both files should have the same columns (in the same order), the same number of rows, the same
+simulation and observation clocks, and each column should have its first value at the same row
+(e.g. surveyed time-series should start in the same observation period). Ratios are missing while
+their denominators are zero, so ratios of hospitalizations and deaths could still start at different
+rows (e.g. at the first hospitalization of each trajectory).
+
+The trajectory files and the comparison will be stored in:
+    outputs/engine_comparison/apacepy and outputs/engine_comparison/numpy -> trajectory files
+    outputs/engine_comparison/engine_comparison.csv -> for each column, if it is exported by each engine
+        and the first row with a value
+"""
+
+
+def export_trajectory(engine, seed):
+    """ simulates a trajectory with the engine and exports it into a csv file
+    :return: (DataFrame) the exported trajectory """
+
+    sets = COVIDSettings(novel_variant_will_emerge=True, engine=engine)
+    # all time-series are compared
+    sets.outputProfile = 'full diagnostics'
+    folder = FOLDER + '/' + engine
+    file_name = 'trajectory 1 - {}.csv'.format(seed)
+
+    if engine == 'numpy':
+        model = VectorizedEpiModel(id=1, settings=sets)
+        model.simulate(seed=seed)
+        # the numpy engine exports into the trajectory store, so the columns are written as apacepy does
+        write_columns_to_csv(cols=model.get_trajectories(), file_name=file_name,
+                             directory=folder, delete_existing_files=True)
+    else:
+        model = EpiModel(id=1, settings=sets)
+        M.build_covid_model(model)
+        model.simulate(seed=seed)
+        model.export_trajectories(folder=folder, delete_existing_files=True)
+
+    return pd.read_csv(folder + '/' + file_name)
+
+
+def get_first_row(values):
+    """ :returns the first row with a value (None if all values are missing) """
+
+    rows = np.nonzero(values.notna().values)[0]
+    return int(rows[0]) if len(rows) > 0 else None
+
+
+def compare(seed):
+
+    trajs = {engine: export_trajectory(engine=engine, seed=seed) for engine in ('apacepy', 'numpy')}
+    a, n = trajs['apacepy'], trajs['numpy']
+
+    rows = []
+    for name in list(a.columns) + [c for c in n.columns if c not in a.columns]:
+        row = {'Column': name, 'In apacepy': name in a.columns, 'In numpy': name in n.columns}
+        for engine, df in trajs.items():
+            row['First row ({})'.format(engine)] = get_first_row(df[name]) if name in df.columns else None
+        row['Match'] = row['In apacepy'] and row['In numpy'] \
+            and row['First row (apacepy)'] == row['First row (numpy)']
+        rows.append(row)
+    df = pd.DataFrame(rows)
+
+    make_directory(FOLDER + '/')
+    df.to_csv(FOLDER + '/engine_comparison.csv', index=False)
+
+    print('Same columns in the same order:', list(a.columns) == list(n.columns))
+    print('Number of rows (apacepy, numpy):', len(a), len(n))
+    for name in CLOCK_COLUMNS:
+        k = min(len(a), len(n))
+        print('Same {}:'.format(name), np.allclose(a[name].values[:k], n[name].values[:k], equal_nan=True))
+    print('Columns with different first rows (or exported by one engine):')
+    print(df[~df['Match']].to_string(index=False))
+
+
+if __name__ == "__main__":
+
+    compare(seed=SEED)
@@ -3,7 +3,8 @@ from apacepy.model_objects import Compartment, ChanceNode, Counter, \
 from apacepy.time_series import SumIncidence, SumPrevalence, SumCumulativeIncidence, RatioTimeSeries
 from deampy.parameters import Constant
 
-from covid_model.model_support import get_interventions_features_conditions, add_calibration_info
+from covid_model.model_support import get_interventions_features_conditions, add_calibration_info, \
+    get_names_of_ratio_time_series_to_collect
 from covid_model.parameters import COVIDParameters
 from definitions import ProfileDefiner, Variants
 
@@ -550,6 +551,16 @@ def build_covid_model(model):
     list_of_ratio_time_series.extend(perc_incd_by_variant)
     list_of_ratio_time_series.extend(perc_new_hosp_by_variant)
 
+    # only collect the time-series needed under the output profile
+    names = get_names_of_ratio_time_series_to_collect(output_profile=sets.outputProfile, age_groups_profiles=pd)
+    if names is not None:
+        list_of_ratio_time_series = [r for r in list_of_ratio_time_series if r.name in names]
+        sim_time_series_in_use = [ts for r in list_of_ratio_time_series
+                                  for ts in (r.numerSimTimeSeries, r.denomSimTimeSeries)]
+        list_of_sum_time_series = [s for s in list_of_sum_time_series
+                                   if s is incd_by_age[0]
+                                   or any(s.get_sim_time_series() is ts for ts in sim_time_series_in_use)]
+
     model.populate(compartments=compartments,
                    parameters=params,
                    param_base_contact_matrix=params.baseContactMatrix,
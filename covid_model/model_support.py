@@ -127,6 +127,84 @@ def get_interventions_features_conditions(params, hosp_occupancy_rate, mitigatin
     return interventions, features, conditions
 
 
+def get_feasible_conditions():
+    """
+    :return: (dictionary) of feasible conditions (FeasibleConditions) with
+        the names of ratio time-series they apply to as keys
+    """
+
+    return {
+        # feasible ranges of hospital occupancy rate
+        'Hospital occupancy rate': FeasibleConditions(
+            feasible_max=MAX_HOSP_OCC_RATE / 100000,
+            min_threshold_to_hit=MIN_HOSP_OCC_RATE / 100000,
+            period=[0, SIM_DURATION]),
+        # feasible ranges of hospitalization rate
+        'New hospitalization rate': FeasibleConditions(
+            feasible_max=MAX_HOSP_RATE_OVERALL / 100000,
+            min_threshold_to_hit=MIN_HOSP_RATE_OVERALL / 100000,
+            period=[0, FEASIBILITY_PERIOD]),
+        # feasibility range of prevalence of population with immunity after infection
+        'Prevalence with immunity from infection': FeasibleConditions(
+            feasible_max=MAX_PREV_IMMUNE_FROM_INF / 100,
+            period=[0, FEASIBILITY_PERIOD]),
+        # feasibility range of the overall hospitalization rate
+        'Cumulative hospitalization rate': FeasibleConditions(
+            feasible_max=CUM_HOSP_RATE_OVERALL[0][3]*1.25 / 100000,
+            period=[0, FEASIBILITY_PERIOD]),
+        # the delta variant should become dominant
+        '% of incidence due to Delta': FeasibleConditions(
+            min_threshold_to_hit=0.2,
+            period=[1, FEASIBILITY_PERIOD+2/52]),
+        # the novel variant should not emerge during the feasibility period
+        '% of incidence due to Novel': FeasibleConditions(
+            feasible_max=0.0,
+            period=[0.5, FEASIBILITY_PERIOD])
+    }
+
+
+def get_calibration_targets(settings, age_groups_profiles):
+    """
+    :param settings: (COVIDSettings) model settings (with calibration targets)
+    :param age_groups_profiles: (ProfileDefiner)
+    :return: (dictionary) of calibration targets with the names of ratio time-series they apply to as keys and
+        dictionaries with keys 'ratios', 'survey_sizes', and 'variances' as values
+    """
+
+    targets = dict()
+
+    # prevalence of population with immunity after infection
+    targets['Prevalence with immunity from infection'] = dict(
+        ratios=settings.prevImmFromInfMean, survey_sizes=None, variances=settings.prevImmFromInfVar)
+
+    # calibration information for the overall hospitalization rate
+    targets['Cumulative hospitalization rate'] = dict(
+        ratios=settings.cumHospRateMean, survey_sizes=None, variances=settings.cumHospRateVar)
+
+    # calibration information for hospitalization rate by age
+    for a in range(age_groups_profiles.nAgeGroups):
+        targets['Cumulative hospitalization rate-' + age_groups_profiles.strAge[a]] = dict(
+            ratios=settings.cumHospRateByAgeMean[a], survey_sizes=settings.cumHospRateByAgeN[a], variances=None)
+
+    # calibration information for the overall vaccination coverage
+    targets['Cumulative vaccination rate'] = dict(
+        ratios=settings.cumVaccRateMean, survey_sizes=settings.cumVaccRateN, variances=None)
+
+    # by age
+    for a in range(age_groups_profiles.nAgeGroups):
+        if a > 1:  # no age 0-4 and 5-12
+            targets['Cumulative vaccination rate-' + age_groups_profiles.strAge[a]] = dict(
+                ratios=settings.cumVaccRateByAgeMean[a], survey_sizes=None, variances=settings.cumVaccRateByAgeVar[a])
+
+    # calibration information for the percentage of infection associated with the novel variant
+    targets['% of incidence due to Delta'] = dict(
+        ratios=settings.percInfWithNovelMean, survey_sizes=settings.percInfWithNovelN,
+        variances=None  # settings.percInfWithNovelVar
+    )
+
+    return targets
+
+
 def add_calibration_info(settings,
                          age_groups_profiles,
                          hosp_occupancy_rate,
@@ -136,19 +214,16 @@ def add_calibration_info(settings,
                          cum_vaccine_rate_by_age,
                          perc_incd_delta, perc_incd_novel):
 
+    feasible_conditions = get_feasible_conditions()
+    targets = get_calibration_targets(settings=settings, age_groups_profiles=age_groups_profiles)
+
     # feasible ranges of hospital occupancy rate
     hosp_occupancy_rate.add_feasible_conditions(
-        feasible_conditions=FeasibleConditions(
-            feasible_max=MAX_HOSP_OCC_RATE / 100000,
-            min_threshold_to_hit=MIN_HOSP_OCC_RATE / 100000,
-            period=[0, SIM_DURATION]))
+        feasible_conditions=feasible_conditions[hosp_occupancy_rate.name])
 
     # feasible ranges of hospitalization rate
     new_hosp_rate_by_age[0].add_feasible_conditions(
-        feasible_conditions=FeasibleConditions(
-            feasible_max=MAX_HOSP_RATE_OVERALL / 100000,
-            min_threshold_to_hit=MIN_HOSP_RATE_OVERALL / 100000,
-            period=[0, FEASIBILITY_PERIOD]))
+        feasible_conditions=feasible_conditions[new_hosp_rate_by_age[0].name])
     # for a in range(age_groups_profiles.nAgeGroups):
     #     new_hosp_rate_by_age[a+1].add_feasible_conditions(
     #         feasible_conditions=FeasibleConditions(feasible_max=MAX_HOSP_RATE_BY_AGE[a] / 100000,
@@ -156,47 +231,65 @@ def add_calibration_info(settings,
 
     # feasibility range of prevalence of population with immunity after infection
     prev_immune_from_inf.add_feasible_conditions(
-        feasible_conditions=FeasibleConditions(
-            feasible_max=MAX_PREV_IMMUNE_FROM_INF / 100,
-            period=[0, FEASIBILITY_PERIOD]))
+        feasible_conditions=feasible_conditions[prev_immune_from_inf.name])
 
-    prev_immune_from_inf.add_calibration_targets(
-        ratios=settings.prevImmFromInfMean, variances=settings.prevImmFromInfVar)
+    prev_immune_from_inf.add_calibration_targets(**targets[prev_immune_from_inf.name])
 
     # calibration information for the overall hospitalization rate
-    cum_hosp_rate_by_age[0].add_calibration_targets(
-        ratios=settings.cumHospRateMean, variances=settings.cumHospRateVar)
+    cum_hosp_rate_by_age[0].add_calibration_targets(**targets[cum_hosp_rate_by_age[0].name])
     cum_hosp_rate_by_age[0].add_feasible_conditions(
-        feasible_conditions=FeasibleConditions(
-            feasible_max=CUM_HOSP_RATE_OVERALL[0][3]*1.25 / 100000,
-            period=[0, FEASIBILITY_PERIOD]))
+        feasible_conditions=feasible_conditions[cum_hosp_rate_by_age[0].name])
 
     # calibration information for hospitalization rate by age
     for a in range(age_groups_profiles.nAgeGroups):
-        cum_hosp_rate_by_age[a + 1].add_calibration_targets(
-            ratios=settings.cumHospRateByAgeMean[a], survey_sizes=settings.cumHospRateByAgeN[a])
+        cum_hosp_rate_by_age[a + 1].add_calibration_targets(**targets[cum_hosp_rate_by_age[a + 1].name])
 
     # calibration information for the overall vaccination coverage
-    cum_vaccine_rate_by_age[0].add_calibration_targets(
-        ratios=settings.cumVaccRateMean, survey_sizes=settings.cumVaccRateN)
+    cum_vaccine_rate_by_age[0].add_calibration_targets(**targets[cum_vaccine_rate_by_age[0].name])
 
     # by age
     for a in range(age_groups_profiles.nAgeGroups):
         if a > 1:  # no age 0-4 and 5-12
-            cum_vaccine_rate_by_age[a + 1].add_calibration_targets(
-                ratios=settings.cumVaccRateByAgeMean[a], variances=settings.cumVaccRateByAgeVar[a])
+            cum_vaccine_rate_by_age[a + 1].add_calibration_targets(**targets[cum_vaccine_rate_by_age[a + 1].name])
 
     # calibration information for the percentage of infection associated with the novel variant
-    perc_incd_delta.add_calibration_targets(
-        ratios=settings.percInfWithNovelMean, survey_sizes=settings.percInfWithNovelN,
-        # variances=settings.percInfWithNovelVar
-    )
+    perc_incd_delta.add_calibration_targets(**targets[perc_incd_delta.name])
     perc_incd_delta.add_feasible_conditions(
-        feasible_conditions=FeasibleConditions(
-            min_threshold_to_hit=0.2,
-            period=[1, FEASIBILITY_PERIOD+2/52]))
+        feasible_conditions=feasible_conditions[perc_incd_delta.name])
 
     perc_incd_novel.add_feasible_conditions(
-        feasible_conditions=FeasibleConditions(
-            feasible_max=0.0,
-            period=[0.5, FEASIBILITY_PERIOD]))
+        feasible_conditions=feasible_conditions[perc_incd_novel.name])
+
+
+def get_names_of_ratio_time_series_to_collect(output_profile, age_groups_profiles):
+    """
+    :param output_profile: (string) 'minimal for prediction', 'calibration', or 'full diagnostics'
+        (see outputProfile in COVIDSettings)
+    :param age_groups_profiles: (ProfileDefiner)
+    :return: (set) of names of ratio time-series to collect (None if all time-series should be collected);
+        only the sum time-series that these ratio time-series are defined on (and incidence which marks
+        the start of the epidemic) are collected
+    """
+
+    if output_profile == 'full diagnostics':
+        return None
+
+    # ratio time-series used to build the datasets for prediction
+    # (see covid_prediction/pre_process.py and covid_prediction/summary_of_trajs.py)
+    names = {'Hospital occupancy rate',
+             'New hospitalization rate',
+             'Prevalence with immunity from infection',
+             'Cumulative hospitalization rate',
+             'Cumulative vaccination rate',
+             '% of incidence due to Novel'}
+
+    if output_profile == 'calibration':
+        # ratio time-series with feasible conditions or calibration targets
+        names.update(get_feasible_conditions())
+        for a in range(age_groups_profiles.nAgeGroups):
+            names.add('Cumulative hospitalization rate-' + age_groups_profiles.strAge[a])
+            names.add('Cumulative vaccination rate-' + age_groups_profiles.strAge[a])
+    elif output_profile != 'minimal for prediction':
+        raise ValueError('Invalid output profile: {}.'.format(output_profile))
+
+    return names
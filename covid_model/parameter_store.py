@@ -0,0 +1,129 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+"""
+Parameter store: the sampled parameter values of the simulated trajectories of a run are kept in
+a typed columnar table (outputs/summary/parameter_values.npz) keyed by the id and seed of trajectories,
+in addition to the csv file exported by apacepy (outputs/summary/parameter_values.csv) where vector
+and matrix parameters are stored as strings.
+Each parameter is a column of the table: scalar parameters are float arrays [trajectory] and
+vector and matrix parameters are fixed-shape float arrays [trajectory, ...].
+If a directory has no store but has the csv file exported by apacepy, readers parse the csv file.
+"""
+
+STORE_FILENAME = 'parameter_values.npz'
+CSV_FILENAME = 'parameter_values.csv'
+
+
+def write_parameter_store(ids, seeds, dict_of_param_values, directory):
+    """ stores parameter values into the parameter store in the directory (replaces the existing store)
+    :param ids: (list) of trajectory ids
+    :param seeds: (list) of trajectory seeds
+    :param dict_of_param_values: (dictionary) parameter name -> (list) of values of trajectories
+        (as in dictParameterValues of apacepy's multi-model outputs)
+    :param directory: (string) directory to save the store to
+    """
+
+    columns = _get_columns(ids=ids, seeds=seeds, dict_of_param_values=dict_of_param_values)
+
+    # the store is written to a new file that then replaces the existing one
+    os.makedirs(directory, exist_ok=True)
+    file_name = os.path.join(directory, STORE_FILENAME)
+    with open(file_name + '.tmp', 'wb') as file:
+        np.savez(file, **columns)
+    os.replace(file_name + '.tmp', file_name)
+
+
+def _get_columns(ids, seeds, dict_of_param_values):
+    """ :returns (dictionary) of columns of the parameter store (see write_parameter_store for parameters) """
+
+    columns = {'ID': np.array(ids, dtype=np.int64),
+               'Seed': np.array(seeds, dtype=np.int64)}
+    for name, values in dict_of_param_values.items():
+        try:
+            columns[name] = np.array([np.asarray(v, dtype=float) for v in values])
+        except ValueError:
+            raise ValueError("Values of parameter '{}' should have the same shape "
+                             "in all trajectories.".format(name))
+    return columns
+
+
+def convert_csv_file_to_parameter_store(directory):
+    """ stores the parameter values in the csv file exported by apacepy in the directory
+    into the parameter store
+    :param directory: (string) directory of parameter_values.csv
+    """
+
+    ids, seeds, dict_of_param_values = _read_csv_file(directory=directory)
+    write_parameter_store(ids=ids, seeds=seeds, dict_of_param_values=dict_of_param_values, directory=directory)
+
+
+def _read_csv_file(directory):
+    """ :returns (ids, seeds, dictionary of parameter name -> list of values of trajectories)
+    read from the csv file of parameter values exported by apacepy in the directory """
+
+    df = pd.read_csv(os.path.join(directory, CSV_FILENAME))
+    return df['ID'], df['Seed'], {name: [_parse_array(v) if isinstance(v, str) else v for v in df[name]]
+                                  for name in df.columns if name not in ('ID', 'Seed')}
+
+
+def _parse_array(text):
+    """ :returns (np.array) the array printed as text by numpy (e.g. '[[1. 2.]\n [3. 4.]]') """
+
+    values = np.array(text.replace('[', ' ').replace(']', ' ').split(), dtype=float)
+    n_dims = len(text) - len(text.lstrip('['))
+    if n_dims == 1:
+        return values
+    elif n_dims == 2:
+        return values.reshape(text.count('[') - 1, -1)
+    else:
+        raise ValueError('Only vector and matrix parameters are supported.')
+
+
+class ParameterStore:
+    """ reads the parameter values of a parameter store """
+
+    def __init__(self, directory):
+        """
+        :param directory: (string) directory of the parameter store
+            (or of the csv file exported by apacepy if the directory has no store)
+        """
+
+        if os.path.isfile(os.path.join(directory, STORE_FILENAME)):
+            with np.load(os.path.join(directory, STORE_FILENAME)) as store:
+                self._columns = {name: store[name] for name in store.files}
+        else:
+            ids, seeds, dict_of_param_values = _read_csv_file(directory=directory)
+            self._columns = _get_columns(ids=ids, seeds=seeds, dict_of_param_values=dict_of_param_values)
+
+        self.ids = self._columns.pop('ID')
+        self.seeds = self._columns.pop('Seed')
+        self.parameterNames = list(self._columns)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_values(self, name, ids=None):
+        """
+        :param name: (string) name of the parameter
+        :param ids: (list) of ids of trajectories (if None, all trajectories in the order of the store)
+        :returns (np.array) values of the parameter for the specified trajectories [trajectory, ...]
+        """
+
+        if name not in self._columns:
+            raise KeyError("Parameter '{}' is not in the parameter store.".format(name))
+
+        if ids is None:
+            return self._columns[name]
+        return self._columns[name][self._get_rows(ids=ids)]
+
+    def _get_rows(self, ids):
+        """ :returns (np.array) rows of the store where the trajectories with the specified ids are """
+
+        rows = pd.Index(self.ids).get_indexer(np.asarray(ids))
+        if (rows < 0).any():
+            raise KeyError('Parameter values of trajectories {} are not in the parameter store.'
+                           .format(np.asarray(ids)[rows < 0].tolist()))
+        return rows
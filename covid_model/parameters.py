@@ -187,6 +187,9 @@ class COVIDParameters(EpiParameters):
         self.matrixOfPercChangeInContactsY1 = None
         self.matrixOfPercChangeInContactsY2 = None
 
+        # values to replace the sampled values of parameters (parameter label -> value)
+        self.overrides = None
+
         self.calculate_dependent_params(us_age_dist=us_age_dist,
                                         hosp_relative_risk=hosp_relative_risk,
                                         prob_death=prob_death,
@@ -459,3 +462,30 @@ class COVIDParameters(EpiParameters):
              'Matrix of change in contacts - PD Y1': self.matrixOfPercChangeInContactsY1,
              'Matrix of change in contacts - PD Y1+': self.matrixOfPercChangeInContactsY2
              })
+
+    def _sample_this_param(self, param, rng, time, label):
+        """ samples a parameter and replaces the sampled value if an override is provided for it
+        (parameters that depend on it are sampled afterwards, so they use the replaced value) """
+
+        EpiParameters._sample_this_param(param=param, rng=rng, time=time, label=label)
+        if self.overrides is not None and label in self.overrides:
+            param.value = self.overrides[label]
+
+    def get_dic_of_params_by_label(self):
+        """
+        :return: (dictionary) with parameter labels (as used in get_dic_of_parameter_samples) as keys
+            and parameters as values
+        """
+
+        dic = dict()
+        for key, par in self.dictOfParams.items():
+            if isinstance(par, list):
+                for i, p in enumerate(par):
+                    if isinstance(p, list):
+                        for j, q in enumerate(p):
+                            dic[key + '-' + str(i) + '-' + str(j)] = q
+                    else:
+                        dic[key + '-' + str(i)] = p
+            else:
+                dic[key] = par
+        return dic
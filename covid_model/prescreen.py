@@ -0,0 +1,121 @@
+import numpy as np
+from numpy.random import RandomState
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from covid_model.vectorized_model import sample_parameters
+
+"""
+A pre-screen to reject parameter draws before they are simulated during calibration.
+The pre-screen scores each parameter draw by the probability that the trajectory it produces
+is feasible (i.e. meets the feasible conditions in covid_model/model_support.py) and
+rejects the draws for which this probability is so low that the rejection is near-certain.
+The pre-screen is fitted to trajectories simulated in the first rounds of calibration and
+its false-rejection rate (% of feasible trajectories that would have been rejected)
+is measured on a holdout set of these trajectories.
+"""
+
+
+def get_features(seeds, novel_variant_will_emerge):
+    """
+    :param seeds: (list) of seeds of trajectories
+    :param novel_variant_will_emerge: (bool) if the novel variant will emerge
+    :return: (np.array) of parameter values sampled by each seed [seed, parameter]
+        (only parameters with scalar values are included)
+    """
+
+    features = []
+    for seed in seeds:
+        rng, params, surveyed_hosp_occ_rate = sample_parameters(
+            seed=seed, novel_variant_will_emerge=novel_variant_will_emerge)
+        features.append([v for v in params.get_dic_of_parameter_samples().values() if np.isscalar(v)])
+
+    return np.array(features, dtype=float)
+
+
+class SurrogatePreScreen:
+    """ pre-screen that uses a logistic regression model of the feasibility of a trajectory
+    as a function of the parameter values as a surrogate for the simulation model """
+
+    def __init__(self, max_false_rejection_rate=0.02, min_n_feasible=30, holdout_fraction=0.2, seed=0):
+        """
+        :param max_false_rejection_rate: (float) the rejection threshold is selected so that the
+            false-rejection rate estimated by cross-validation on the training set does not exceed this value
+        :param min_n_feasible: (int) minimum number of feasible trajectories needed to fit the surrogate
+        :param holdout_fraction: (float) fraction of simulated trajectories held out to measure
+            the false-rejection rate of the pre-screen
+        :param seed: (int) seed to select the holdout set and cross-validation folds
+        """
+
+        self.maxFalseRejectionRate = max_false_rejection_rate
+        self.minNFeasible = min_n_feasible
+        self.holdoutFraction = holdout_fraction
+        self.seed = seed
+        self.model = None
+        self.threshold = None
+        self.ifFitted = False
+        self.falseRejectionRate = None  # % of feasible trajectories in the holdout set that are rejected
+        self.rejectionRate = None       # % of trajectories in the holdout set that are rejected
+        self.nFeasibleInHoldout = None
+
+    def fit_and_validate(self, features, if_feasible):
+        """ fits the pre-screen to a set of simulated trajectories and measures its false-rejection rate
+            on a holdout set of these trajectories
+        :param features: (np.array) parameter values of trajectories [trajectory, parameter]
+        :param if_feasible: (list of bool) if each trajectory is feasible
+        """
+
+        if_feasible = np.array(if_feasible, dtype=bool)
+        rng = RandomState(seed=self.seed)
+        if_holdout = rng.random_sample(len(if_feasible)) < self.holdoutFraction
+
+        self.ifFitted = self._fit(features=features[~if_holdout], if_feasible=if_feasible[~if_holdout])
+        if not self.ifFitted:
+            return
+
+        if_rejected = self.if_reject(features=features[if_holdout])
+        self.nFeasibleInHoldout = if_feasible[if_holdout].sum()
+        self.rejectionRate = if_rejected.mean()
+        if self.nFeasibleInHoldout > 0:
+            self.falseRejectionRate = if_rejected[if_feasible[if_holdout]].mean()
+
+    def _fit(self, features, if_feasible):
+        """ fits the surrogate and selects the rejection threshold
+        :returns (bool) if the pre-screen could be fitted """
+
+        n_feasible = if_feasible.sum()
+        if n_feasible < self.minNFeasible or n_feasible == len(if_feasible):
+            return False
+
+        self.model = make_pipeline(
+            StandardScaler(), LogisticRegression(C=0.1, class_weight='balanced', max_iter=2000))
+
+        # select the threshold based on cross-validated probabilities of feasible trajectories
+        probs = cross_val_predict(
+            self.model, features, if_feasible, method='predict_proba',
+            cv=StratifiedKFold(n_splits=min(5, n_feasible), shuffle=True, random_state=self.seed))[:, 1]
+        self.threshold = np.quantile(probs[if_feasible], self.maxFalseRejectionRate, method='lower')
+
+        self.model.fit(features, if_feasible)
+        return True
+
+    def get_prob_feasible(self, features):
+        """ :returns (np.array) the probability that the trajectory of each parameter draw is feasible """
+        return self.model.predict_proba(features)[:, 1]
+
+    def if_reject(self, features):
+        """ :returns (np.array of bool) if each parameter draw should be rejected """
+        return self.get_prob_feasible(features=features) < self.threshold
+
+    def get_summary(self):
+        """ :returns (list) of lines describing the performance of the pre-screen on the holdout set """
+
+        if not self.ifFitted:
+            return ['Pre-screen: not used (too few feasible trajectories to fit)']
+
+        return ['Pre-screen: % of holdout trajectories rejected: {}'.format(round(100 * self.rejectionRate, 1)),
+                'Pre-screen: false-rejection rate on holdout trajectories (%): {} (of {} feasible trajectories)'
+                .format(None if self.falseRejectionRate is None else round(100 * self.falseRejectionRate, 1),
+                        self.nFeasibleInHoldout)]
@@ -11,12 +11,32 @@ class COVIDSettings(ModelSettings):
 
     def __init__(self, if_calibrating=False,
                  novel_variant_will_emerge=True,
-                 mitigating_strategies_on=True):
+                 mitigating_strategies_on=True,
+                 engine=None, deterministic=None, tau_leaping=None):
 
         ModelSettings.__init__(self)
 
         self.novelVariantWillEmerge = novel_variant_will_emerge
         self.mitigatingStrategiesOn = mitigating_strategies_on
+        # scenario of simulated trajectories (recorded in the manifest of the trajectory store)
+        if not novel_variant_will_emerge and not mitigating_strategies_on:
+            self.scenario = D.SCENARIOS['no novel variant'] + ' and ' + D.SCENARIOS['no control measure']
+        elif not novel_variant_will_emerge:
+            self.scenario = D.SCENARIOS['no novel variant']
+        elif not mitigating_strategies_on:
+            self.scenario = D.SCENARIOS['no control measure']
+        else:
+            self.scenario = D.SCENARIOS['base']
+        # simulation engine ('apacepy' or 'numpy')
+        self.engine = D.SIM_ENGINE if engine is None else engine
+        # if the model is deterministic (only available for the 'numpy' engine)
+        self.deterministic = D.SIM_DETERMINISTIC if deterministic is None else deterministic
+        if self.deterministic and self.engine != 'numpy':
+            raise ValueError("The deterministic model requires SIM_ENGINE = 'numpy'.")
+        # if time-steps of the 'numpy' engine are adapted with tau-leaping
+        self.tauLeaping = D.SIM_TAU_LEAPING if tau_leaping is None else tau_leaping
+        self.tauLeapingEps = D.TAU_LEAPING_EPS
+        self.tauLeapingMinChange = D.TAU_LEAPING_MIN_CHANGE
 
         # model settings
         self.deltaT = 1 / 364
@@ -38,8 +58,15 @@ class COVIDSettings(ModelSettings):
 
         self.calibrationPeriod = D.CALIB_PERIOD
 
+        # time-series to collect and export ('minimal for prediction', 'calibration', or 'full diagnostics'),
+        # see get_names_of_ratio_time_series_to_collect in model_support.py
+        self.outputProfile = 'calibration' if if_calibrating else D.OUTPUT_PROFILE
+
         # parameter values
         self.storeParameterValues = True
+        # values to replace the sampled parameter values of trajectories
+        # (seed -> {parameter label: value}; these are produced by ABC-SMC calibration)
+        self.paramOverrides = None
 
         # calibration targets
         if if_calibrating:
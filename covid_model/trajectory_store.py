@@ -0,0 +1,271 @@
+import json
+import os
+
+import apacepy.analysis.trajectories as A
+import numpy as np
+import pandas as pd
+
+"""
+Trajectory store: all simulated trajectories of a run are kept in a single binary file
+(outputs/trajectories/trajectories.bin) instead of one csv file per trajectory.
+The file is a float32 cube [time-series, trajectory, row] (padded with nan after the last row of
+each trajectory) that is memory-mapped by readers, so slicing it returns views and only the parts
+of the file that are accessed are read from disk. Time-series are the columns of the trajectory
+files exported by apacepy; only numeric time-series are stored (the status of interventions is not).
+A small JSON header (outputs/trajectories/trajectories.json) maps the names of time-series to
+their offsets in the cube.
+A manifest (outputs/trajectories/manifest.csv) has a row for each trajectory with its id, seed,
+scenario, offset in the cube, number of rows, and simulation run-time. Trajectories are stored in
+the order of their ids and readers find trajectories (and join other outputs, such as parameter
+values, onto them) through the ids in the manifest.
+If a directory has no store but has trajectory files exported by apacepy (e.g. trajectories simulated
+before the store was introduced), readers read these files into memory in the layout of the store.
+"""
+
+STORE_FILENAME = 'trajectories.bin'
+HEADER_FILENAME = 'trajectories.json'
+MANIFEST_FILENAME = 'manifest.csv'
+
+
+def write_trajectory_store(ids, seeds, list_of_columns, directory, scenario=None, run_times=None):
+    """ stores trajectories into the trajectory store in the directory (replaces the existing store)
+    :param ids: (list) of trajectory ids
+    :param seeds: (list) of trajectory seeds
+    :param list_of_columns: (list) of columns of each trajectory (the first element of each column
+        is its title) in the layout of the trajectory files exported by apacepy
+    :param directory: (string) directory to save the store to
+    :param scenario: (string) scenario of trajectories (see SCENARIOS in definitions.py)
+    :param run_times: (list) of simulation run-times of trajectories (in seconds)
+    """
+
+    first_cols = list_of_columns[0]
+    numeric = [j for j, col in enumerate(first_cols) if _is_numeric(col[1:])]
+
+    list_of_values = []
+    for cols in list_of_columns:
+        values = np.full((max(len(col) - 1 for col in cols), len(numeric)), np.nan, dtype=np.float32)
+        for k, j in enumerate(numeric):
+            if cols[j][0] != first_cols[j][0]:
+                raise ValueError('Trajectories in a store should have the same time-series.')
+            values[:len(cols[j]) - 1, k] = np.array(cols[j][1:], dtype=float)
+        list_of_values.append(values)
+
+    _write_store(ids=ids, seeds=seeds, series_names=[first_cols[j][0] for j in numeric],
+                 list_of_values=list_of_values, directory=directory, scenario=scenario, run_times=run_times)
+
+
+def _write_store(ids, seeds, series_names, list_of_values, directory, scenario=None, run_times=None):
+    """ stores trajectories into the trajectory store in the directory (replaces the existing store)
+    :param ids: (list) of trajectory ids
+    :param seeds: (list) of trajectory seeds
+    :param series_names: (list) of names of time-series
+    :param list_of_values: (list) of values of time-series of each trajectory [row, time-series]
+    :param directory: (string) directory to save the store to
+    :param scenario: (string) scenario of trajectories
+    :param run_times: (list) of simulation run-times of trajectories
+    """
+
+    manifest, list_of_values = _get_manifest(
+        ids=ids, seeds=seeds, list_of_values=list_of_values, scenario=scenario, run_times=run_times)
+    shape = (len(series_names), len(list_of_values), manifest['Rows'].max())
+
+    # the store is written to new files that then replace the existing ones
+    # (so that stores memory-mapped by readers are not modified)
+    os.makedirs(directory, exist_ok=True)
+    file_name = os.path.join(directory, STORE_FILENAME)
+    cube = np.memmap(file_name + '.tmp', dtype=np.float32, mode='w+', shape=shape)
+    _fill_cube(cube=cube, list_of_values=list_of_values)
+    cube.flush()
+    del cube
+
+    header = {'dtype': 'float32',
+              'shape': [int(n) for n in shape],
+              'series': list(series_names)}
+    with open(os.path.join(directory, HEADER_FILENAME) + '.tmp', 'w') as file:
+        json.dump(header, file)
+    manifest.to_csv(os.path.join(directory, MANIFEST_FILENAME) + '.tmp', index=False)
+
+    for filename in (STORE_FILENAME, HEADER_FILENAME, MANIFEST_FILENAME):
+        os.replace(os.path.join(directory, filename) + '.tmp', os.path.join(directory, filename))
+
+
+def _get_manifest(ids, seeds, list_of_values, scenario=None, run_times=None):
+    """ :returns (manifest of the store, list of values of trajectories in the order of the store)
+    (see _write_store for parameters) """
+
+    if len(set(ids)) < len(ids):
+        raise ValueError('Trajectories in a store should have unique ids.')
+
+    # trajectories are stored in the order of their ids
+    order = np.argsort(ids, kind='stable')
+    list_of_values = [list_of_values[i] for i in order]
+    manifest = pd.DataFrame({'ID': np.asarray(ids, dtype=np.int64)[order],
+                             'Seed': np.asarray(seeds, dtype=np.int64)[order],
+                             'Scenario': scenario,
+                             'Offset': np.arange(len(order)),
+                             'Rows': [len(values) for values in list_of_values],
+                             'Run time': np.nan if run_times is None else np.asarray(run_times, dtype=float)[order]})
+    return manifest, list_of_values
+
+
+def _fill_cube(cube, list_of_values):
+    """ fills the cube [time-series, trajectory, row] with the values of trajectories (padded with nan) """
+
+    cube[:] = np.nan
+    for i, values in enumerate(list_of_values):
+        cube[:, i, :len(values)] = values.T
+
+
+def convert_csv_files_to_trajectory_store(directory, scenario=None, dict_of_run_times=None):
+    """ stores the trajectory files exported by apacepy in the directory into the trajectory store
+    and deletes these files
+    :param directory: (string) directory of trajectory files
+    :param scenario: (string) scenario of trajectories (see SCENARIOS in definitions.py)
+    :param dict_of_run_times: (dictionary) trajectory id -> simulation run-time of the trajectory
+    """
+
+    ids, seeds, series_names, list_of_values, filenames = _read_csv_files(directory=directory)
+    _write_store(ids=ids, seeds=seeds, series_names=series_names, list_of_values=list_of_values,
+                 directory=directory, scenario=scenario,
+                 run_times=None if dict_of_run_times is None else [dict_of_run_times[id] for id in ids])
+    for filename in filenames:
+        os.remove(os.path.join(directory, filename))
+
+
+def _read_csv_files(directory):
+    """ reads the numeric columns of the trajectory files exported by apacepy in the directory
+    :param directory: (string) directory of trajectory files
+    :returns (ids, seeds, names of time-series, list of values of each trajectory [row, time-series], filenames)
+    """
+
+    ids, seeds, list_of_values = [], [], []
+    series_names = None
+    filenames = sorted(f for f in os.listdir(directory) if f.startswith('trajectory ') and f.endswith('.csv'))
+    for filename in filenames:
+        # filenames are 'trajectory {id} - {seed}.csv'
+        id, seed = filename[len('trajectory '):-len('.csv')].split(' - ')
+        file_name = os.path.join(directory, filename)
+        if series_names is None:
+            series_names = _get_numeric_columns(file_name=file_name)
+        # only parse the numeric columns, directly into the dtype of the store
+        df = pd.read_csv(file_name, usecols=series_names, dtype=np.float32, engine='c')
+        ids.append(int(id))
+        seeds.append(int(seed))
+        list_of_values.append(df[series_names].values)
+
+    return ids, seeds, series_names, list_of_values, filenames
+
+
+def _get_numeric_columns(file_name):
+    """ :returns (list) names of the numeric columns of a trajectory file (found from its first rows) """
+
+    df = pd.read_csv(file_name, nrows=10)
+    return [name for name in df.columns if _is_numeric(df[name].tolist())]
+
+
+def _is_numeric(values):
+    """ :returns if the first value that is not missing is a number """
+
+    for v in values:
+        if v is not None and not (isinstance(v, float) and np.isnan(v)):
+            return isinstance(v, (int, float, np.number))
+    return True
+
+
+class TrajectoryStore:
+    """ reads the trajectories of a trajectory store
+    (store[trajectories, rows, name of time-series] returns a view of the memory-mapped cube) """
+
+    def __init__(self, directory):
+        """
+        :param directory: (string) directory of the trajectory store
+            (or of trajectory files exported by apacepy if the directory has no store)
+        """
+
+        if os.path.isfile(os.path.join(directory, HEADER_FILENAME)):
+            with open(os.path.join(directory, HEADER_FILENAME)) as file:
+                header = json.load(file)
+            self.manifest = pd.read_csv(os.path.join(directory, MANIFEST_FILENAME))
+            self.seriesNames = header['series']
+            self._cube = np.memmap(os.path.join(directory, STORE_FILENAME),
+                                   dtype=header['dtype'], mode='r', shape=tuple(header['shape']))
+        else:
+            # the trajectory files are read into memory in the layout of the store
+            ids, seeds, self.seriesNames, list_of_values, filenames = _read_csv_files(directory=directory)
+            if len(ids) == 0:
+                raise FileNotFoundError('There is no trajectory store or trajectory file in {}.'.format(directory))
+            self.manifest, list_of_values = _get_manifest(ids=ids, seeds=seeds, list_of_values=list_of_values)
+            self._cube = np.empty((len(self.seriesNames), len(list_of_values), self.manifest['Rows'].max()),
+                                  dtype=np.float32)
+            _fill_cube(cube=self._cube, list_of_values=list_of_values)
+
+        self.ids = self.manifest['ID'].values
+        self.seeds = self.manifest['Seed'].values
+        self.nRows = self.manifest['Rows'].values
+        self._indexOfSeries = {name: k for k, name in enumerate(self.seriesNames)}
+        self._indexOfId = {id: offset for id, offset in zip(self.ids.tolist(), self.manifest['Offset'])}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        """ :param key: (tuple) (trajectories, rows, name of time-series) where trajectories and rows
+            are indices or slices (rows are simulation output periods)
+        :returns (np.array) values of the time-series (a view if trajectories and rows are slices) """
+
+        trajs, rows, name = key
+        return self.get_series(name=name)[trajs, rows]
+
+    def get_index(self, id):
+        """ :returns (int) index of the trajectory with the specified id """
+        return self._indexOfId[id]
+
+    def get_series(self, name):
+        """ :returns (np.array) view of a time-series [trajectory, row] (nan after the last row of a trajectory) """
+
+        if name not in self._indexOfSeries:
+            raise KeyError("Time-series '{}' is not in the trajectory store "
+                           "(see OUTPUT_PROFILE in definitions.py).".format(name))
+        return self._cube[self._indexOfSeries[name]]
+
+    def get_trajectory(self, i, series_names):
+        """ :returns (DataFrame) the specified time-series of trajectory i
+        (as if the trajectory file exported by apacepy was read) """
+
+        return pd.DataFrame({name: self.get_series(name)[i, :self.nRows[i]] for name in series_names})
+
+    def get_sim_outcome_trajectories(self, series_names=None):
+        """
+        :param series_names: (list) of time-series to include (if None, all time-series are included)
+        :returns (SimOutcomeTrajectories) the specified time-series of all trajectories
+            (as if trajectory files exported by apacepy were parsed with apacepy)
+        """
+        return _StoredSimOutcomeTrajectories(store=self, series_names=series_names)
+
+
+class _StoredSimOutcomeTrajectories(A.SimOutcomeTrajectories):
+    # apacepy's SimOutcomeTrajectories populated from a trajectory store instead of csv files
+
+    def __init__(self, store, series_names=None):
+
+        self.dictOfSimOutcomeTrajectories = {}
+        self.outcomeNames = store.seriesNames
+        # apacepy only uses this list to find the number of trajectories
+        self.replicationDFs = [None] * len(store)
+        self.filenames = ['trajectory {} - {}.csv'.format(id, seed) for id, seed in zip(store.ids, store.seeds)]
+
+        # the time of each outcome is the last time column before it (as in apacepy,
+        # time columns other than 'Observation Period' are also included as outcomes)
+        time_col_name = 'Simulation Time'
+        for name in self.outcomeNames:
+            if name in ('Simulation Period', 'Observation Time', 'Observation Period'):
+                time_col_name = name
+            if name != 'Observation Period' and (series_names is None or name in series_names):
+                times = store.get_series(time_col_name)
+                obss = store.get_series(name)
+                oomr = A.TrajsOneOutcomeMultipleReps()
+                for i in range(len(store)):
+                    traj = A.TrajOneOutcomeOneRep(i)
+                    traj.add_observations(times=times[i, :store.nRows[i]], observations=obss[i, :store.nRows[i]])
+                    oomr.add_traj_from_one_rep(traj)
+                self.dictOfSimOutcomeTrajectories[name] = oomr
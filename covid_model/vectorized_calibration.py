@@ -0,0 +1,628 @@
+import csv
+import multiprocessing as mp
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy.stats as scs
+from apacepy.calibration import CalibrationWithRandomSampling, CalibResultOfATraj
+from deampy.parameters import Beta, Gamma, Uniform
+from deampy.support.simulation import SeedGenerator
+from numpy import iinfo, int32
+from numpy.random import RandomState
+from scipy.special import logsumexp
+
+import definitions as D
+from covid_model.model_support import get_feasible_conditions
+from covid_model.parameters import COVIDParameters
+from covid_model.prescreen import get_features
+from covid_model.vectorized_model import BatchOfEpiModels, sample_parameters
+
+"""
+Calibration of the vectorized COVID model (covid_model/vectorized_model.py) by random sampling.
+Trajectories are simulated in batches and each trajectory is terminated as soon as one of
+its feasible conditions (see get_feasible_conditions in covid_model/model_support.py) is violated.
+Optionally, parameter draws are pre-screened before they are simulated (see covid_model/prescreen.py).
+The outcome of each simulated trajectory can be streamed to an append-only checkpoint file so that
+an interrupted calibration can be resumed (or extended to more iterations) without redoing finished work.
+
+Calibration with ABC-SMC (sequential Monte Carlo) narrows the distribution from which parameters are
+proposed toward the feasible and high-likelihood region over several generations. The parameter values
+proposed for a trajectory replace the values sampled by its seed and are stored in the calibration summary
+(columns starting with OVERRIDE_PREFIX) so that the trajectory can be simulated again from its seed.
+
+The results are saved in the same format as apacepy's CalibrationWithRandomSampling.
+"""
+
+# prefix of the columns of calibration summary that store the values of parameters proposed by ABC-SMC
+OVERRIDE_PREFIX = 'Override: '
+# columns of the checkpoint file (one row for each simulated or pre-screened trajectory)
+CHECKPOINT_HEADER = ['ID', 'Seed', 'LnL', 'Rejected by', 'Time-steps saved', 'Message']
+PRE_SCREEN = 'Pre-screen'
+
+
+class VectorizedCalibrationWithRandomSampling(CalibrationWithRandomSampling):
+
+    def __init__(self, model_settings, parallelization_approach='few-many', max_tries=100, batch_size=None,
+                 pre_screen=None, checkpoint_filename=None):
+        """
+        :param model_settings: (COVIDSettings) model settings
+        :param parallelization_approach: (string)
+            'few-many' to simulate each calibration iteration until a feasible trajectory is found.
+            'many-once' to simulate each calibration iteration once.
+        :param max_tries: (int) maximum number of simulation runs to try to find a feasible trajectory
+            when 'few-many' option is selected
+        :param batch_size: (int) number of trajectories simulated together (D.SIM_BATCH_SIZE if None)
+        :param pre_screen: (SurrogatePreScreen) to reject parameter draws before simulating them
+            (fitted to the trajectories simulated in the first rounds of calibration)
+        :param checkpoint_filename: (string) csv file to which the outcome of each trajectory is appended
+            (if the file exists, the calibration resumes from the trajectories recorded in it)
+        """
+
+        CalibrationWithRandomSampling.__init__(
+            self, model_settings=model_settings,
+            parallelization_approach=parallelization_approach, max_tries=max_tries)
+
+        self.batchSize = D.SIM_BATCH_SIZE if batch_size is None else batch_size
+
+        # number of trajectories rejected by the feasible conditions of each ratio time-series
+        self.nTrajsRejectedByCondition = {name: 0 for name in get_feasible_conditions()}
+        # simulation time (in years) saved by terminating infeasible trajectories early
+        self.simTimeSaved = 0
+
+        self.preScreen = pre_screen
+        # number of parameter draws rejected by the pre-screen (these are not simulated)
+        self.nDrawsRejectedByPreScreen = 0
+
+        self.checkpointFilename = checkpoint_filename
+        self.nTrajsResumed = 0  # number of trajectories read from the checkpoint file
+
+    def run(self, function_to_populate_model=None, num_of_iterations=1, initial_seed=None, if_run_in_parallel=True):
+        """
+        :param function_to_populate_model: (not used; the vectorized model builds itself)
+        :param num_of_iterations: number of calibration iterations
+        :param initial_seed: (int) to initialize the seed of the RandomState that is used to generate the seeds of
+            calibration iterations
+        :param if_run_in_parallel: set to True to simulate batches in parallel
+        """
+
+        self.runTime = time.time()
+
+        if self.parallApproach == 'few-many':
+            max_tries = self.maxTries
+        elif self.parallApproach == 'many-once':
+            max_tries = 1
+        else:
+            raise ValueError('Invalid parallelization approach.')
+
+        # as in apacepy, each calibration iteration has its own random number generator to generate
+        # the seeds of trajectories it simulates until a feasible trajectory is found
+        seeds = SeedGenerator(seeds=None, weights=None).next_seeds(
+            n=num_of_iterations, rng=RandomState(0 if initial_seed is None else initial_seed))
+        if self.parallApproach == 'few-many':
+            rngs = [RandomState(seed=s) for s in seeds]
+        else:
+            rngs = None
+
+        pool = mp.Pool(mp.cpu_count()) if if_run_in_parallel else None
+
+        results = [None] * num_of_iterations
+        n_tries = np.zeros(num_of_iterations, dtype=int)
+        ids_to_simulate = self._resume(seeds=seeds, rngs=rngs, n_tries=n_tries, max_tries=max_tries, results=results)
+        features, if_feasible = [], []  # to fit the pre-screen
+        while len(ids_to_simulate) > 0:
+
+            # seeds of trajectories to simulate in this round
+            if rngs is None:
+                n_tries[ids_to_simulate] += 1
+                ids_to_simulate, seeds_to_simulate = ids_to_simulate, [seeds[i] for i in ids_to_simulate]
+            else:
+                ids_to_simulate, seeds_to_simulate = self._draw_seeds(
+                    ids=ids_to_simulate, rngs=rngs, n_tries=n_tries, max_tries=max_tries, results=results)
+
+            # simulate all in batches
+            calib_results, ids_infeasible = self._simulate_batches(
+                ids=ids_to_simulate, seeds=seeds_to_simulate, pool=pool)
+            for result in calib_results:
+                results[result.epiID] = result
+
+            # fit the pre-screen to the trajectories simulated so far
+            # (until enough feasible trajectories are simulated to fit it)
+            if self.preScreen is not None and rngs is not None and not self.preScreen.ifFitted:
+                set_of_ids_infeasible = set(ids_infeasible)
+                features.append(get_features(
+                    seeds=seeds_to_simulate, novel_variant_will_emerge=self.sets.novelVariantWillEmerge))
+                if_feasible.extend([i not in set_of_ids_infeasible for i in ids_to_simulate])
+                self.preScreen.fit_and_validate(features=np.concatenate(features), if_feasible=if_feasible)
+
+            ids_to_simulate = [i for i in ids_infeasible if n_tries[i] < max_tries]
+
+        if pool is not None:
+            pool.close()
+
+        self.calibResultsOfTrajs = results
+
+        # this is to make sure the likelihood are not calculated if the model is used for simulation
+        self.sets.calcLikelihood = False
+        self.sets.storeProjectedOutcomes = True
+
+        # calculate probabilities
+        self._calculate_probs()
+
+        self.runTime = time.time() - self.runTime
+
+    def _resume(self, seeds, rngs, n_tries, max_tries, results):
+        """ reads the trajectories recorded in the checkpoint file (if any) and replays the random number
+        generators of calibration iterations to continue from where the calibration was interrupted
+        :returns (list) ids of calibration iterations that are not finished """
+
+        rows_by_id = {}
+        if self.checkpointFilename is not None and os.path.isfile(self.checkpointFilename):
+            with open(self.checkpointFilename, newline='') as file:
+                for row in csv.DictReader(file):
+                    rows_by_id.setdefault(int(row['ID']), []).append(row)
+
+        ids_to_simulate = []
+        for i in range(len(seeds)):
+            rows = rows_by_id.get(i, [])
+            for row in rows:
+                seed = seeds[i] if rngs is None else rngs[i].randint(0, iinfo(int32).max)
+                if seed != int(row['Seed']):
+                    raise ValueError('The checkpoint file {} does not match this calibration '
+                                     '(seed of iteration {}).'.format(self.checkpointFilename, i))
+                n_tries[i] += 1
+                self.nTrajsResumed += 1
+                self._update_stats(
+                    rejected_by=row['Rejected by'] if row['Rejected by'] != '' else None,
+                    n_delta_ts_saved=int(row['Time-steps saved']))
+
+            if len(rows) > 0:
+                row = rows[-1]
+                param_values = None
+                if self.sets.storeParameterValues:
+                    params = sample_parameters(
+                        seed=int(row['Seed']), novel_variant_will_emerge=self.sets.novelVariantWillEmerge)[1]
+                    param_values = params.get_list_of_parameter_samples()
+                    self.listOfParameterNames = list(params.get_dic_of_parameter_samples().keys())
+                results[i] = CalibResultOfATraj(
+                    epi_id=i, seed=int(row['Seed']), lnl=float(row['LnL']), message=row['Message'],
+                    param_values=param_values)
+
+            if len(rows) == 0 or (rows[-1]['Rejected by'] != '' and n_tries[i] < max_tries):
+                ids_to_simulate.append(i)
+
+        return ids_to_simulate
+
+    def _update_stats(self, rejected_by, n_delta_ts_saved):
+        """ updates the calibration statistics with the outcome of a trajectory
+        :param rejected_by: (string) name of the condition that rejected the trajectory (None if feasible)
+        :param n_delta_ts_saved: (int) number of simulation time-steps saved by terminating the trajectory early
+        """
+
+        if rejected_by == PRE_SCREEN:
+            self.nDrawsRejectedByPreScreen += 1
+        elif rejected_by is not None:
+            self.nTrajsRejectedByCondition[rejected_by] += 1
+        if rejected_by is not None:
+            self.nTrajsDiscarded += 1
+        self.simTimeSaved += n_delta_ts_saved * self.sets.deltaT
+
+    def _write_checkpoint(self, rows):
+        """ appends rows to the checkpoint file """
+
+        if self.checkpointFilename is None or len(rows) == 0:
+            return
+
+        if_new = not os.path.isfile(self.checkpointFilename)
+        with open(self.checkpointFilename, 'a', newline='') as file:
+            writer = csv.writer(file)
+            if if_new:
+                writer.writerow(CHECKPOINT_HEADER)
+            writer.writerows(rows)
+
+    def _draw_seeds(self, ids, rngs, n_tries, max_tries, results):
+        """ draws the seeds of trajectories to simulate in this round
+            (draws rejected by the pre-screen are replaced until the maximum number of tries is reached)
+        :returns (ids of trajectories to simulate, seeds of these trajectories) """
+
+        seeds = {}
+        ids_to_draw = ids
+        while len(ids_to_draw) > 0:
+            new_seeds = [rngs[i].randint(0, iinfo(int32).max) for i in ids_to_draw]
+            n_tries[ids_to_draw] += 1
+
+            if self.preScreen is not None and self.preScreen.ifFitted:
+                if_rejected = self.preScreen.if_reject(features=get_features(
+                    seeds=new_seeds, novel_variant_will_emerge=self.sets.novelVariantWillEmerge))
+            else:
+                if_rejected = np.zeros(len(ids_to_draw), dtype=bool)
+
+            ids_rejected = []
+            rows = []
+            for i, seed, rejected in zip(ids_to_draw, new_seeds, if_rejected):
+                if rejected:
+                    self._update_stats(rejected_by=PRE_SCREEN, n_delta_ts_saved=0)
+                    rows.append([i, seed, float('-inf'), PRE_SCREEN, 0, 'Rejected by pre-screen'])
+                    if n_tries[i] < max_tries:
+                        ids_rejected.append(i)
+                    else:
+                        param_values = None
+                        if self.sets.storeParameterValues:
+                            param_values = sample_parameters(
+                                seed=seed, novel_variant_will_emerge=self.sets.novelVariantWillEmerge
+                            )[1].get_list_of_parameter_samples()
+                        results[i] = CalibResultOfATraj(
+                            epi_id=i, seed=seed, lnl=float('-inf'), message='Rejected by pre-screen',
+                            param_values=param_values)
+                else:
+                    seeds[i] = seed
+            self._write_checkpoint(rows=rows)
+            ids_to_draw = ids_rejected
+
+        return list(seeds.keys()), list(seeds.values())
+
+    def _simulate_batches(self, ids, seeds, pool):
+        """ simulates trajectories in batches and updates the calibration statistics
+        :returns (list of calibration results (CalibResultOfATraj), list of ids of infeasible trajectories) """
+
+        if len(ids) == 0:
+            return [], []
+
+        n_batches = int(np.ceil(len(ids) / self.batchSize))
+        if pool is not None:
+            n_batches = max(n_batches, min(len(ids), mp.cpu_count()))
+
+        args = [(BatchOfEpiModels(ids=[ids[i] for i in idx], settings=self.sets), [seeds[i] for i in idx])
+                for idx in np.array_split(np.arange(len(ids)), n_batches)]
+        if pool is None:
+            batch_results = (calibrate_this_batch(batch=batch, seeds=s) for batch, s in args)
+        else:
+            # to record the outcomes of each batch as soon as it is finished
+            batch_results = pool.imap_unordered(_calibrate_this_batch, args)
+
+        results = []
+        ids_infeasible = []
+        for batch_result in batch_results:
+            calib_results, rejected_by, n_delta_ts_saved, param_names = batch_result
+            rows = []
+            for result, name, n in zip(calib_results, rejected_by, n_delta_ts_saved):
+                if name is not None:
+                    ids_infeasible.append(result.epiID)
+                self._update_stats(rejected_by=name, n_delta_ts_saved=n)
+                rows.append([result.epiID, result.seed, result.lnL, '' if name is None else name, n, result.message])
+            self._write_checkpoint(rows=rows)
+            if param_names is not None:
+                self.listOfParameterNames = param_names
+            results.extend(calib_results)
+
+        return results, ids_infeasible
+
+    def get_rejection_summary(self):
+        """ :returns (list) of lines describing the number of trajectories rejected by each feasible condition
+        (in decreasing order) and the simulation time saved by terminating infeasible trajectories early """
+
+        lines = []
+        if self.checkpointFilename is not None:
+            lines.append('Number of trajectories resumed from the checkpoint file: {}'.format(self.nTrajsResumed))
+        for name, n in sorted(self.nTrajsRejectedByCondition.items(), key=lambda item: item[1], reverse=True):
+            lines.append('Number of trajectories rejected by feasible conditions on "{}": {}'.format(name, n))
+        lines.append('Simulation time saved by early termination of infeasible trajectories (years): {}'.format(
+            round(self.simTimeSaved, 1)))
+        if self.preScreen is not None:
+            lines.append('Number of parameter draws rejected by the pre-screen: {}'.format(
+                self.nDrawsRejectedByPreScreen))
+            lines.extend(self.preScreen.get_summary())
+        return lines
+
+
+def calibrate_this_batch(batch, seeds):
+    """ simulates a batch of trajectories for calibration
+    :returns (calibration results, names of conditions that rejected trajectories,
+              number of simulation time-steps saved for each trajectory, names of parameters) """
+
+    batch.simulate(seeds=seeds)
+
+    param_names = None
+    if batch.settings.storeParameterValues:
+        param_names = list(batch.listOfParams[0].get_dic_of_parameter_samples().keys())
+
+    results = []
+    for i in range(len(batch)):
+        results.append(CalibResultOfATraj(
+            epi_id=batch.ids[i],
+            seed=batch.seeds[i],
+            lnl=batch.lnls[i][0],
+            message=batch.lnls[i][1],
+            param_values=batch.listOfParams[i].get_list_of_parameter_samples()
+            if batch.settings.storeParameterValues else None))
+
+    return results, batch.rejectedBy, batch.nDeltaTsSaved.tolist(), param_names
+
+
+def _calibrate_this_batch(args):
+    return calibrate_this_batch(*args)
+
+
+class VectorizedCalibrationWithSMC(VectorizedCalibrationWithRandomSampling):
+    """ calibration with approximate Bayesian computation - sequential Monte Carlo (ABC-SMC).
+    A particle is a trajectory that meets all feasible conditions. The first generation of particles is
+    sampled from the priors. The particles of each next generation are proposed by perturbing the
+    particles of the previous generation (selected with probabilities that are increasingly tilted toward
+    high-likelihood particles) and are weighted by (prior density / proposal density) to correct for
+    sampling from the proposal distribution. The probability of a particle in the last generation is
+    proportional to this importance weight times its likelihood. """
+
+    def __init__(self, model_settings, num_of_generations=4, initial_num_of_particles=100,
+                 ess_fraction=0.5, max_sims_per_particle=500, batch_size=None):
+        """
+        :param model_settings: (COVIDSettings) model settings
+        :param num_of_generations: (int) number of generations
+        :param initial_num_of_particles: (int) number of particles in the first generation (the number of
+            particles grows geometrically to the number of particles needed in the last generation)
+        :param ess_fraction: (float) the likelihood is tempered so that the effective sample size of the particles
+            selected to generate the next generation is at least this fraction of the number of particles
+        :param max_sims_per_particle: (int) maximum number of simulation runs per particle in a generation
+        :param batch_size: (int) number of trajectories simulated together (D.SIM_BATCH_SIZE if None)
+        """
+
+        VectorizedCalibrationWithRandomSampling.__init__(
+            self, model_settings=model_settings, batch_size=batch_size)
+
+        self.nGenerations = num_of_generations
+        self.initialNParticles = initial_num_of_particles
+        self.essFraction = ess_fraction
+        self.maxSimsPerParticle = max_sims_per_particle
+
+        self.rootParams = _RootParameters(novel_variant_will_emerge=self.sets.novelVariantWillEmerge)
+        self.generationSummaries = []   # (generation, number of simulations, number of particles, tempering)
+
+        # the proposed parameter values are stored in the calibration summary
+        self.ifSaveParamValues = True
+        self.listOfParameterNames = [OVERRIDE_PREFIX + label for label in self.rootParams.labels]
+
+    def run(self, function_to_populate_model=None, num_of_iterations=1, initial_seed=None, if_run_in_parallel=True):
+        """
+        :param function_to_populate_model: (not used; the vectorized model builds itself)
+        :param num_of_iterations: number of trajectories with non-zero probability needed in the last generation
+        :param initial_seed: (int) to initialize the RandomState that is used to propose particles
+        :param if_run_in_parallel: set to True to simulate batches in parallel
+        """
+
+        self.runTime = time.time()
+
+        rng = RandomState(0 if initial_seed is None else initial_seed)
+        pool = mp.Pool(mp.cpu_count()) if if_run_in_parallel else None
+        n_per_round = self.batchSize * (1 if pool is None else mp.cpu_count())
+
+        sizes = np.geomspace(min(self.initialNParticles, num_of_iterations), num_of_iterations, self.nGenerations)
+        z = log_weights = lnls = kernel = None
+        results = []
+        for g, size in enumerate(np.round(sizes).astype(int)):
+
+            if_last = g == self.nGenerations - 1
+            # particles of this generation (results keeps the particles of the last generation that has any)
+            gen_results, list_of_z, list_of_log_weights = [], [], []
+            n_sims = 0
+            while n_sims < self.maxSimsPerParticle * size:
+
+                # stop when this generation has enough particles
+                if len(gen_results) >= size and (not if_last or _get_n_non_zero(
+                        np.concatenate(list_of_log_weights) + np.array([r.lnL for r in gen_results])) >= size):
+                    break
+
+                # propose particles
+                seeds = _get_new_seeds(rng=rng, n=n_per_round)
+                if g == 0:
+                    new_z = None    # calculated below for feasible trajectories
+                    new_log_weights = np.zeros(n_per_round)
+                    self.sets.paramOverrides = None
+                else:
+                    new_z, new_log_weights = kernel.propose(rng=rng, n=n_per_round)
+                    self.sets.paramOverrides = {seed: self.rootParams.get_overrides(z=new_z[i])
+                                                for i, seed in enumerate(seeds)}
+
+                # simulate and keep the feasible trajectories
+                calib_results, ids_infeasible = self._simulate_batches(
+                    ids=list(range(n_sims, n_sims + n_per_round)), seeds=seeds, pool=pool)
+                # (batches may finish in any order, so results are paired with their proposals by id)
+                for result in sorted(calib_results, key=lambda r: r.epiID):
+                    if result.lnL > float('-inf'):
+                        k = result.epiID - n_sims
+                        z_of_particle = self.rootParams.get_z(seeds=[result.seed])[0] if new_z is None else new_z[k]
+                        result.paramValues = self.rootParams.get_values(z=z_of_particle).tolist()
+                        gen_results.append(result)
+                        list_of_z.append(z_of_particle)
+                        list_of_log_weights.append(new_log_weights[k:k+1])
+                n_sims += n_per_round
+
+            if len(gen_results) == 0:
+                if g == 0:
+                    warnings.warn('No feasible trajectory found.')
+                else:
+                    warnings.warn('No feasible trajectory found in generation {}; the particles of '
+                                  'generation {} are used.'.format(g, g - 1))
+                break
+
+            results = gen_results
+            z = np.array(list_of_z)
+            log_weights = np.concatenate(list_of_log_weights)
+            lnls = np.array([r.lnL for r in results])
+
+            # select the tempering of the likelihood and build the kernel to propose the next generation
+            tempering = _get_tempering(log_weights=log_weights, lnls=lnls, ess_fraction=self.essFraction)
+            kernel = _PerturbationKernel(z=z, log_probs=log_weights + tempering * lnls)
+            self.generationSummaries.append((g, n_sims, len(results), tempering))
+
+        if pool is not None:
+            pool.close()
+        self.sets.paramOverrides = None
+
+        self.calibResultsOfTrajs = results
+
+        # this is to make sure the likelihood are not calculated if the model is used for simulation
+        self.sets.calcLikelihood = False
+        self.sets.storeProjectedOutcomes = True
+
+        # probabilities are proportional to importance weights times likelihoods
+        self._calculate_probs_with_weights(log_weights=log_weights)
+
+        self.runTime = time.time() - self.runTime
+
+    def _calculate_probs_with_weights(self, log_weights):
+
+        self.nTrajsWithNonZeroProb = 0
+        if len(self.calibResultsOfTrajs) == 0:
+            return
+
+        log_probs = log_weights + np.array([r.lnL for r in self.calibResultsOfTrajs])
+        probs = np.exp(log_probs - log_probs.max())
+        probs /= probs.sum()
+        for result, prob in zip(self.calibResultsOfTrajs, probs):
+            result.prob = prob
+            if prob > 0:
+                self.nTrajsWithNonZeroProb += 1
+
+    def get_generation_summary(self):
+        """ :returns (list) of lines describing the number of simulations and particles in each generation """
+
+        lines = []
+        for g, n_sims, n_particles, tempering in self.generationSummaries:
+            lines.append('Generation {}: {} simulated trajectories, {} particles, likelihood tempering {}'.format(
+                g, n_sims, n_particles, round(tempering, 3)))
+        return lines
+
+
+class _RootParameters:
+    """ parameters of COVIDParameters with continuous priors that are perturbed by ABC-SMC.
+    Each parameter is mapped to a standard normal variable (z) through the CDF of its prior
+    so that perturbations stay within the support of the prior. """
+
+    def __init__(self, novel_variant_will_emerge):
+
+        self.novelVariantWillEmerge = novel_variant_will_emerge
+        self.labels = []
+        self.dists = []
+        params = COVIDParameters(novel_variant_will_emerge=novel_variant_will_emerge)
+        for label, param in params.get_dic_of_params_by_label().items():
+            dist = _get_prior(param=param)
+            if dist is not None:
+                self.labels.append(label)
+                self.dists.append(dist)
+
+    def get_z(self, seeds):
+        """ :returns (np.array) z values of parameters sampled from priors by each seed [seed, parameter] """
+
+        z = np.zeros((len(seeds), len(self.labels)))
+        for i, seed in enumerate(seeds):
+            rng, params, surveyed_hosp_occ_rate = sample_parameters(
+                seed=seed, novel_variant_will_emerge=self.novelVariantWillEmerge)
+            values = params.get_dic_of_parameter_samples()
+            for j, label in enumerate(self.labels):
+                z[i, j] = scs.norm.ppf(np.clip(self.dists[j].cdf(values[label]), 1e-12, 1 - 1e-12))
+        return z
+
+    def get_values(self, z):
+        """ :returns (np.array) parameter values of the z values of a particle """
+
+        u = np.clip(scs.norm.cdf(z), 1e-12, 1 - 1e-12)
+        return np.array([dist.ppf(u[j]) for j, dist in enumerate(self.dists)])
+
+    def get_overrides(self, z):
+        """ :returns (dictionary) parameter label -> value of the z values of a particle """
+
+        return dict(zip(self.labels, self.get_values(z=z)))
+
+
+class _PerturbationKernel:
+    """ proposes particles by perturbing particles of the previous generation with normal noise
+    (the standard deviation of the noise is twice the weighted variance of particles in each dimension) """
+
+    def __init__(self, z, log_probs):
+        """
+        :param z: (np.array) z values of particles [particle, parameter]
+        :param log_probs: (np.array) log of the probabilities to select each particle (not normalized)
+        """
+
+        self.z = z
+        self.probs = np.exp(log_probs - logsumexp(log_probs))
+        mean = self.probs @ z
+        self.sd = np.maximum(np.sqrt(2 * (self.probs @ (z - mean) ** 2)), 0.05)
+
+    def propose(self, rng, n):
+        """ :returns (z values of proposed particles, log of importance weights (prior / proposal)) """
+
+        parents = rng.choice(len(self.z), size=n, p=self.probs)
+        new_z = self.z[parents] + self.sd * rng.standard_normal(size=(n, self.z.shape[1]))
+
+        # log density of the proposal (a mixture of normal distributions centered at particles)
+        scaled_z, scaled_particles = new_z / self.sd, self.z / self.sd
+        squared_distances = (scaled_z ** 2).sum(axis=1)[:, None] - 2 * scaled_z @ scaled_particles.T \
+            + (scaled_particles ** 2).sum(axis=1)[None, :]
+        log_proposal = logsumexp(-0.5 * squared_distances, b=self.probs[None, :], axis=1)
+        # the prior of z is the standard normal (normalizing constants are the same for all particles)
+        log_prior = -0.5 * (new_z ** 2).sum(axis=1) + np.log(self.sd).sum()
+
+        return new_z, log_prior - log_proposal
+
+
+def _get_prior(param):
+    """ :returns the prior (scipy distribution) of a parameter or None if it is not perturbed by ABC-SMC """
+
+    if type(param) == Uniform and param.par.scale > 0:
+        return scs.uniform(loc=param.par.loc, scale=param.par.scale)
+    elif type(param) == Beta:
+        return scs.beta(a=param.par.a, b=param.par.b, loc=param.par.loc, scale=param.par.scale)
+    elif type(param) == Gamma:
+        return scs.gamma(a=param.par.shape, loc=param.par.loc, scale=param.par.scale)
+    return None
+
+
+def _get_new_seeds(rng, n):
+    return [rng.randint(0, iinfo(int32).max) for i in range(n)]
+
+
+def _get_tempering(log_weights, lnls, ess_fraction):
+    """ :returns the largest power (between 0 and 1) of the likelihood so that the effective sample size
+    of weights * likelihood ^ power is at least ess_fraction of the number of particles """
+
+    def get_ess(power):
+        log_probs = log_weights + power * lnls
+        probs = np.exp(log_probs - log_probs.max())
+        return probs.sum() ** 2 / (probs ** 2).sum()
+
+    if get_ess(1) >= ess_fraction * len(lnls):
+        return 1
+    low, high = 0, 1
+    for i in range(30):
+        power = (low + high) / 2
+        if get_ess(power) >= ess_fraction * len(lnls):
+            low = power
+        else:
+            high = power
+    return low
+
+
+def _get_n_non_zero(log_probs):
+    """ :returns the number of particles with non-zero normalized probability """
+    return (np.exp(log_probs - log_probs.max()) > 0).sum()
+
+
+def get_param_overrides(filename):
+    """
+    :param filename: (string) calibration summary (see calibration_summary.csv)
+    :return: (dictionary) seed -> {parameter label: value} of parameter values proposed by ABC-SMC
+        (None if the calibration summary does not include proposed parameter values)
+    """
+
+    df = pd.read_csv(filename)
+    cols = [c for c in df.columns if c.startswith(OVERRIDE_PREFIX)]
+    if len(cols) == 0:
+        return None
+
+    overrides = {}
+    for seed, values in zip(df['Seed'], df[cols].values):
+        overrides[int(seed)] = {c[len(OVERRIDE_PREFIX):]: v for c, v in zip(cols, values)}
+    return overrides
+
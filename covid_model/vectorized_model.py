@@ -0,0 +1,1452 @@
+import copy
+import multiprocessing as mp
+import time
+
+import numpy as np
+from apacepy.calibration_support import get_lnl_of_a_time_series
+from apacepy.multi_epidemics import MultiEpidemics
+from apacepy.support import append_to_a_dict
+from deampy.support.simulation import SeedGenerator
+from numpy import iinfo, int32
+from numpy.random import RandomState
+from scipy.integrate import solve_ivp
+
+import definitions as D
+from covid_model.model_support import get_feasible_conditions, get_calibration_targets, \
+    get_names_of_ratio_time_series_to_collect
+from covid_model.parameters import COVIDParameters
+from covid_model.trajectory_store import write_trajectory_store
+from definitions import AgeGroups, FEASIBILITY_PERIOD, ProfileDefiner, Variants
+
+"""
+A vectorized implementation of the COVID model in build_covid_model (covid_model/model.py).
+Instead of moving members between compartment objects one at a time, the state of the model is
+stored in dense NumPy arrays indexed by (trajectory, age group, variant, vaccination status) and all
+compartments of a batch of trajectories are updated at once in every simulation time-step.
+
+The model structure, parameters (COVIDParameters), stochastic transitions (competing risks with
+binomial/multinomial draws and Poisson importation), physical distancing interventions, and the
+simulation outputs (names and layout of trajectory files) follow the apacepy implementation.
+To use this engine, set the engine of COVIDSettings to 'numpy'.
+
+If tauLeaping is set to True in COVIDSettings, the time-step is not fixed at deltaT but is selected for each
+trajectory in multiples of deltaT (up to the end of the current simulation output period) so that the expected
+relative change in the number of exposed and infectious members of each variant stays below tauLeapingEps
+(Cao, Gillespie, and Petzold 2006). Only the trajectories whose time-step has ended are updated, so a trajectory
+leaps by the same time-steps whatever batch it is simulated in. Transitions are still sampled with binomial
+draws, so compartments remain non-negative.
+
+If deterministic is set to True in COVIDSettings, instead of sampling stochastic transitions, the engine
+integrates the ODEs of the expected rates of change of compartments (with the same parameters, seasonality,
+importation and vaccination rates, and the effect of physical distancing informed by the surveyed hospital
+occupancy rate) with an adaptive solver (scipy's solve_ivp). Compartments and outputs are then real-valued
+but trajectory files follow the same layout.
+"""
+
+# relative and absolute tolerance of the ODE solver of the deterministic model
+ODE_RTOL = 1e-3
+ODE_ATOL = 1e-2  # persons
+
+
+class _SurveyedHospOccupancyRate:
+    """ stands in for the ratio time-series 'Hospital occupancy rate' from which
+    the effectiveness of control measures (SigmoidOnModelOutput) reads the last surveyed value """
+
+    def __init__(self):
+        self.value = None
+
+    def get_value(self):
+        return self.value
+
+
+class ParameterArrays:
+    """ values of the sampled COVIDParameters arranged as arrays
+    (indexed by age group, variant, and vaccination status) """
+
+    def __init__(self, params):
+        """
+        :param params: (COVIDParameters) parameters that are already sampled
+        """
+
+        n_a, n_v, n_vs = params.nAgeGroups, params.nVariants, params.nVaccStatus
+
+        self.contactMatrix = np.array(params.baseContactMatrix.value, dtype=float)
+        self.sizeS0 = np.array([p.value for p in params.sizeSByAge], dtype=np.int64)
+        self.sizeI0 = np.array([p.value for p in params.sizeIProfile0ByAge], dtype=np.int64)
+
+        # transmission
+        self.infectivityOrg = params.infectivityOrg.value
+        self.seasonalityPhase = params.seasonalityParams[0].value
+        self.seasonalityA0 = params.seasonalityParams[1].value
+        self.seasonalityA1 = params.seasonalityParams[2].value
+        # [vaccination status, variant]
+        self.ratioTransm = np.array([[params.ratioTransmByVaccByVariant[vs][v].value
+                                      for v in range(n_v)] for vs in range(n_vs)])
+        # [variant]
+        self.suspVacc = np.array([p.value for p in params.suspVaccByVariant])
+        # [variant, vaccination status, variant of new infection]
+        self.suspInR = np.array([[p.value for p in params.suspInRByProfileByVariant[i]]
+                                 for i in range(params.nProfiles)]).reshape(n_v, n_vs, n_v)
+
+        # rates of leaving compartments [variant, vaccination status]
+        self.ratesOfLeavingE = self._get_by_profile(params.ratesOfLeavingE, n_v, n_vs)
+        self.ratesOfLeavingI = self._get_by_profile(params.ratesOfLeavingI, n_v, n_vs)
+        self.ratesOfLeavingHosp = self._get_by_profile(params.ratesOfLeavingHosp, n_v, n_vs)
+        self.ratesOfLeavingR = self._get_by_profile(params.ratesOfLeavingR, n_v, n_vs)
+        self.rateOfLosingVacImmunity = params.rateOfLosingVacImmunity.value
+        # [age group, variant, vaccination status]
+        self.probHosp = np.array([self._get_by_profile(params.probHospByAgeAndProfile[a], n_v, n_vs)
+                                  for a in range(n_a)])
+        self.ratesOfDeathInHosp = np.array([self._get_by_profile(params.ratesOfDeathInHospByAge[a], n_v, n_vs)
+                                            for a in range(n_a)])
+
+        # importation (the original variant has a constant rate, others follow a sigmoid)
+        self.importRateOrg = params.importRateByVariant[0].value
+        self.importB = np.array([0, params.paramsForRateDeltaVariant[0].value,
+                                 params.paramsForRateNovelVariant[0].value])
+        self.importTMid = np.array([0, params.paramsForRateDeltaVariant[1].value,
+                                    params.paramsForRateNovelVariant[1].value])
+        self.importMax = np.array([self.importRateOrg, params.paramsForRateDeltaVariant[2].value,
+                                   params.paramsForRateNovelVariant[2].value])
+
+        # vaccination (no vaccination for age group 0-4)
+        self.vaccB = params.vaccRateParams[0].value
+        self.vaccTMid = params.vaccRateParams[1].value
+        self.vaccMin = params.vaccRateParams[2].value
+        self.vaccTMin = np.array([p.value for p in params.vaccRateTMinByAge], dtype=float)
+        self.vaccMax = np.array([p.value for p in params.vaccRateMaxByAge], dtype=float)
+        self.ifVaccinating = np.array([a != AgeGroups.Age_0_4.value for a in range(n_a)])
+
+        # physical distancing [on, off]
+        self.y1Thresholds = np.array([params.y1Thresholds[0].value, params.y1Thresholds[1].value])
+        self.y2Thresholds = np.array([params.y2Thresholds[0].value, params.y2Thresholds[1].value])
+        self.bEffOfControlMeasure = params.bEffOfControlMeasure.value
+        self.y1MaxEff = params.y1MaxEff.value
+        self.y2MaxEff = params.y2MaxEff.value
+
+    @staticmethod
+    def _get_by_profile(list_of_params, n_variants, n_vacc_status):
+        """ :returns values of parameters defined by profile as an array of shape (variant, vaccination status) """
+        return np.array([p.value for p in list_of_params]).reshape(n_variants, n_vacc_status)
+
+    @staticmethod
+    def stack(list_of_param_arrays):
+        """
+        :param list_of_param_arrays: (list) of ParameterArrays (one for each trajectory)
+        :return: (ParameterArrays) where each attribute has a leading axis for trajectories
+        """
+        stacked = ParameterArrays.__new__(ParameterArrays)
+        for name in vars(list_of_param_arrays[0]):
+            setattr(stacked, name, np.array([getattr(p, name) for p in list_of_param_arrays]))
+        return stacked
+
+    def get_subset(self, idx):
+        """
+        :param idx: (np.array) indices of trajectories
+        :return: (ParameterArrays) stacked parameters of the selected trajectories
+        """
+        subset = ParameterArrays.__new__(ParameterArrays)
+        for name, value in vars(self).items():
+            setattr(subset, name, value[idx])
+        return subset
+
+    # the methods below also work on stacked parameters
+    # (scalars become arrays of shape (trajectory, ) and t could be an array of shape (trajectory, ))
+
+    def get_infectivity(self, t):
+        """ :returns infectivity by vaccination status and variant at time t """
+        seasonality = self.seasonalityA0 + self.seasonalityA1 * np.cos(2 * np.pi * (t - self.seasonalityPhase))
+        return (self.infectivityOrg * seasonality)[..., None, None] * self.ratioTransm
+
+    def get_importation_rates(self, t):
+        """ :returns importation rate of each variant at time t """
+        t = np.asarray(t)[..., None]
+        rates = self.importMax / (1 + np.exp(-self.importB * (t - self.importTMid)))
+        rates[..., 0] = self.importRateOrg
+        return rates
+
+    def get_vaccination_rates(self, t):
+        """ :returns vaccination rate of each age group at time t """
+        t = np.asarray(t)[..., None]
+        logistic = 1 / (1 + np.exp(-np.asarray(self.vaccB)[..., None] * (
+                t - np.asarray(self.vaccTMid)[..., None] - self.vaccTMin)))
+        rates = np.asarray(self.vaccMin)[..., None] + (self.vaccMax - np.asarray(self.vaccMin)[..., None]) * logistic
+        return np.where((t >= self.vaccTMin) * self.ifVaccinating, rates, 0)
+
+    def get_eff_of_control_measure(self, max_eff, surveyed_hosp_occ_rate):
+        """ :returns the effectiveness of physical distancing given the last surveyed hospital occupancy rate
+        (nan if not surveyed) """
+        eff = max_eff / (1 + np.exp(-self.bEffOfControlMeasure * np.nan_to_num(surveyed_hosp_occ_rate)))
+        return np.where(np.isnan(surveyed_hosp_occ_rate), 0, eff)
+
+
+def sample_parameters(seed, novel_variant_will_emerge, overrides=None):
+    """
+    samples the parameters of a trajectory using the same random number streams as apacepy
+    :param seed: (int) seed of the trajectory
+    :param novel_variant_will_emerge: (bool) if the novel variant will emerge
+    :param overrides: (dictionary) parameter label -> value to replace the sampled value of the parameter
+    :return: (random number generator to continue the simulation with, sampled COVIDParameters,
+              the surveyed hospital occupancy rate that informs the effect of control measures)
+    """
+
+    rng = RandomState(seed=seed)
+    RandomState(rng.randint(0, iinfo(int32).max))
+
+    params = COVIDParameters(novel_variant_will_emerge=novel_variant_will_emerge)
+    params.overrides = overrides
+    surveyed_hosp_occ_rate = _SurveyedHospOccupancyRate()
+    params.y1EffOfControlMeasures.assign_sim_output(sim_output=surveyed_hosp_occ_rate)
+    params.y2EffOfControlMeasures.assign_sim_output(sim_output=surveyed_hosp_occ_rate)
+    params.list_time_dependent_params()
+
+    # sample all parameters
+    params.sample_parameters(rng=rng, time=0)
+
+    return rng, params, surveyed_hosp_occ_rate
+
+
+def sample_binomials(rngs, list_of_n_and_p):
+    """ samples arrays of independent binomial random numbers where the numbers of each trajectory are drawn
+    from its own random number generator (so that a trajectory does not depend on the other trajectories of
+    its batch); the numbers of all arrays are drawn together with one call for each trajectory
+    :param rngs: (list) of random number generators (one for each trajectory)
+    :param list_of_n_and_p: (list) of (number of trials, probabilities of success) where the first axis of
+        both is for trajectories (n and p are broadcast together)
+    :return: (list) of arrays of random numbers (one for each (n, p))
+    """
+
+    list_of_n, list_of_p, shapes = [], [], []
+    for n, p in list_of_n_and_p:
+        n, p = np.broadcast_arrays(n, p)
+        shapes.append(n.shape)
+        list_of_n.append(n.reshape(len(rngs), -1))
+        list_of_p.append(p.reshape(len(rngs), -1))
+    n, p = np.concatenate(list_of_n, axis=1), np.concatenate(list_of_p, axis=1)
+
+    values = np.empty(n.shape, dtype=np.int64)
+    for i, rng in enumerate(rngs):
+        values[i] = rng.binomial(n[i], p[i])
+
+    splits = np.cumsum([x.shape[1] for x in list_of_n])[:-1]
+    return [v.reshape(shape) for v, shape in zip(np.split(values, splits, axis=1), shapes)]
+
+
+def sample_poisson(rngs, lam):
+    """ samples Poisson random numbers where the numbers of each trajectory are drawn from its own
+    random number generator
+    :param rngs: (list) of random number generators (one for each trajectory)
+    :param lam: (np.array) expected values (the first axis is for trajectories)
+    :return: (np.array) of random numbers (shape of lam)
+    """
+
+    values = np.empty(np.shape(lam), dtype=np.int64)
+    for i, rng in enumerate(rngs):
+        values[i] = rng.poisson(lam[i])
+    return values
+
+
+def sample_competing_events(rngs, list_of_sizes_and_rates, delta_t, list_of_n_and_p=()):
+    """ samples the number of members leaving compartments through competing events over a time-step
+    (the number leaving is binomial and the split among events is multinomial)
+    :param rngs: (list) of random number generators (one for each trajectory)
+    :param list_of_sizes_and_rates: (list) of (size of compartments, rates of events) where the first axis
+        is for trajectories and the last axis of rates is for events
+    :param delta_t: (np.array) length of the time-step of each trajectory
+    :param list_of_n_and_p: (list) of (number of trials, probabilities of success) of other binomial random
+        numbers that are drawn together with the number of members leaving compartments
+    :return: (list of number of members leaving each compartment through each event (shape of rates),
+              list of other binomial random numbers)
+    """
+
+    # number of members leaving
+    values = sample_binomials(
+        rngs=rngs,
+        list_of_n_and_p=[(sizes, -np.expm1(-rates.sum(axis=-1) * delta_t.reshape((-1,) + (1,) * (sizes.ndim - 1))))
+                         for sizes, rates in list_of_sizes_and_rates] + list(list_of_n_and_p))
+    list_of_n_remaining, others = values[:len(list_of_sizes_and_rates)], values[len(list_of_sizes_and_rates):]
+
+    # split those leaving among events with sequential binomial draws
+    # (the probability of each event is calculated relative to the events not yet considered,
+    # and the draws of the same event of all compartments are made together)
+    list_of_outs = [np.zeros(rates.shape, dtype=np.int64) for sizes, rates in list_of_sizes_and_rates]
+    list_of_remaining_rates = [np.flip(np.cumsum(np.flip(rates, axis=-1), axis=-1), axis=-1)
+                               for sizes, rates in list_of_sizes_and_rates]
+    for e in range(max(rates.shape[-1] for sizes, rates in list_of_sizes_and_rates) - 1):
+        js = [j for j, (sizes, rates) in enumerate(list_of_sizes_and_rates) if e < rates.shape[-1] - 1]
+        list_of_n_and_p = []
+        for j in js:
+            rates, remaining_rates = list_of_sizes_and_rates[j][1], list_of_remaining_rates[j]
+            probs = np.divide(rates[..., e], remaining_rates[..., e],
+                              out=np.zeros(list_of_n_remaining[j].shape), where=remaining_rates[..., e] > 0)
+            list_of_n_and_p.append((list_of_n_remaining[j], np.minimum(probs, 1)))
+        for j, out in zip(js, sample_binomials(rngs=rngs, list_of_n_and_p=list_of_n_and_p)):
+            list_of_outs[j][..., e] = out
+            list_of_n_remaining[j] = list_of_n_remaining[j] - out
+    for outs, n_remaining in zip(list_of_outs, list_of_n_remaining):
+        outs[..., -1] = n_remaining
+
+    return list_of_outs, others
+
+
+class BatchOfEpiModels:
+    """ a batch of COVID models that are simulated together
+    (the state of all trajectories is stored in arrays with a leading axis for trajectories) """
+
+    def __init__(self, ids, settings):
+        """
+        :param ids: (list) of ids of the epidemic models in this batch
+        :param settings: (COVIDSettings) model settings
+        """
+
+        self.ids = ids
+        self.seeds = None
+        self.rngs = None    # random number generator of each trajectory
+        self.settings = settings
+        self.settings.initialize()
+        self.runTime = None
+
+        self.pd = ProfileDefiner(n_age_groups=len(AgeGroups), n_variants=3, n_vacc_status=2)
+        self.listOfParams = None
+        self.listOfSurveyedHospOccRates = None
+        self.paramArrays = None     # parameter values stacked over trajectories
+        self.lnls = None
+        self.ifFeasible = None
+
+        # feasibility conditions that are checked during calibration
+        self.feasibleConditions = None
+        self.ifMinThresholdReached = None   # [condition][trajectory]
+        self.rejectedBy = None      # name of the ratio time-series whose feasible conditions rejected a trajectory
+        self.nDeltaTsSaved = None   # simulation time-steps saved by terminating infeasible trajectories early
+
+        # compartments
+        self.S = None   # [trajectory, age group]
+        self.V = None   # [trajectory, age group]
+        self.E = None   # [trajectory, age group, variant, vaccination status]
+        self.I = None
+        self.H = None
+        self.R = None
+        self.D = None
+
+        # physical distancing in year 1 and year 2 (0: off, 1: on) [trajectory, intervention]
+        self.switches = None
+        self.nDeltaTsInUse = None
+        # last surveyed hospital occupancy rate (nan if not surveyed) [trajectory]
+        self.surveyedHospOccRate = None
+
+        # trajectories that are still being simulated
+        self.ifActive = None
+        # history
+        self.history = None
+        self.detectionRow = None
+        self.startOfEpidemic = None
+        self.endOfSim = None
+        self.lastTimeStep = None
+        # indices and parameters of trajectories that are still being simulated
+        self._activeIdx = None
+        self._activeParamArrays = None
+        # current time-step, time-step when each trajectory is next updated (with tau-leaping, trajectories
+        # leap by different time-steps), and trajectories eradicated in their last update (to pause and resume)
+        self._k = None
+        self._nextK = None
+        self._ifEradicated = None
+        # number of updates of compartments of each trajectory (fewer than the number of deltaTs with tau-leaping)
+        self.nUpdates = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def simulate(self, seeds, until=None):
+        """ simulate the batch of epidemic models
+        :param seeds: (list) of random number seeds (one for each trajectory)
+        :param until: (float) time (in years) to pause the simulation at (see resume and get_branch);
+            if None, trajectories are simulated until the end of the simulation
+        """
+
+        start = time.time()
+        self.seeds = seeds
+        self._initialize()
+        self.runTime = time.time() - start
+
+        self.resume(until=until)
+
+    def resume(self, until=None):
+        """ continues the simulation of this batch from where it was paused
+        :param until: (float) time (in years) to pause the simulation at again;
+            if None, trajectories are simulated until the end of the simulation
+        """
+
+        start = time.time()
+
+        sets = self.settings
+        delta_t = sets.deltaT
+        k_until = None if until is None else int(round(until / delta_t))
+        k = self._k
+        if_eradicated = self._ifEradicated
+        while True:
+            # pause the simulation (before recording outputs, which will be recorded when resumed)
+            if k_until is not None and k >= k_until:
+                self._k, self._ifEradicated = k, if_eradicated
+                self.runTime += time.time() - start
+                return
+
+            # trajectories whose last time-step ends now
+            if_due = self.ifActive * (self._nextK == k)
+
+            # record simulation outputs, record surveillance, and make decisions
+            if_recording = if_due * ((k % sets.nDeltaTsInSimOutputPeriod == 0) + if_eradicated)
+            if if_recording.any():
+                self._record_outputs(k=k, if_recording=if_recording)
+
+            # trajectories that reached the end of simulation or got eradicated stop here
+            if_ending = if_recording * ((k >= self.endOfSim) + if_eradicated)
+            self.lastTimeStep[if_ending] = k
+            self.ifActive *= ~if_ending
+            if not self.ifActive.any():
+                break
+            if_due *= self.ifActive
+
+            # time-dependent parameters use time 0 until the epidemic is detected
+            t = np.where(self.startOfEpidemic >= 0, k * delta_t, 0)
+            # interventions and surveillance only change at the end of simulation output periods,
+            # so the deterministic model is integrated until the next one in one go and
+            # tau-leaping could leap until the next one (time-steps of all trajectories end there)
+            max_n_delta_ts = sets.nDeltaTsInSimOutputPeriod - k % sets.nDeltaTsInSimOutputPeriod
+            if k_until is not None:
+                max_n_delta_ts = max(min(max_n_delta_ts, k_until - k), 1)
+            if sets.deterministic:
+                # (all active trajectories are due)
+                self._integrate_compartments(t=t, n_delta_ts=max_n_delta_ts)
+                n_delta_ts = if_due * max_n_delta_ts
+            else:
+                n_delta_ts = self._update_compartments(
+                    t=t, if_due=if_due, max_n_delta_ts=max_n_delta_ts if sets.tauLeaping else 1)
+            self.nDeltaTsInUse += self.switches * n_delta_ts[:, None]
+            self.nUpdates += if_due
+            self._nextK += n_delta_ts
+            k = self._nextK[self.ifActive].min()
+
+            if sets.checkEradicationConditions:
+                if_eradicated = self.E.sum(axis=(1, 2, 3)) + self.I.sum(axis=(1, 2, 3)) \
+                                + self.H.sum(axis=(1, 2, 3)) == 0
+
+        # update time-dependent parameters (so that their last values are reported)
+        for i, params in enumerate(self.listOfParams):
+            self.listOfSurveyedHospOccRates[i].value = self._get_surveyed_value(i)
+            params.update_time_dependent_params(rng=self.rngs[i], time=self.lastTimeStep[i] * delta_t)
+
+        if sets.calcLikelihood:
+            self._process_end_of_calibration_runs()
+
+        self._k, self._ifEradicated = k, if_eradicated
+        self.runTime += time.time() - start
+
+    def get_branch(self, settings):
+        """ to simulate a scenario from the current state of this (paused) batch.
+        The state of all trajectories (compartments, history, interventions switches, and the random number
+        generator) is copied, so scenarios branched from the same batch use common random numbers.
+        :param settings: (COVIDSettings) settings of the scenario (only settings that affect the simulation
+            after the current time should be changed, e.g. mitigatingStrategiesOn)
+        :return: (BatchOfEpiModels) the branch to continue by calling resume()
+        """
+
+        if settings.novelVariantWillEmerge != self.settings.novelVariantWillEmerge:
+            raise ValueError('Scenarios with different novelVariantWillEmerge cannot be branched from '
+                             'the same batch since they differ in parameter values from time 0.')
+
+        settings.initialize()
+        # the settings of this batch are replaced (not copied) by the settings of the scenario
+        return copy.deepcopy(self, memo={id(self.settings): settings})
+
+    def _initialize(self):
+        """ sample parameters and initialize compartments """
+
+        self.rngs = []
+        self.listOfParams = []
+        self.listOfSurveyedHospOccRates = []
+        list_of_param_arrays = []
+        for seed in self.seeds:
+            rng, params, surveyed_hosp_occ_rate = sample_parameters(
+                seed=seed, novel_variant_will_emerge=self.settings.novelVariantWillEmerge,
+                overrides=None if self.settings.paramOverrides is None else self.settings.paramOverrides.get(seed))
+            # each trajectory continues with its own random number generator
+            # (so it has the same outcomes whatever batch it is simulated in)
+            self.rngs.append(rng)
+
+            self.listOfParams.append(params)
+            self.listOfSurveyedHospOccRates.append(surveyed_hosp_occ_rate)
+            list_of_param_arrays.append(ParameterArrays(params=params))
+
+        self.paramArrays = ParameterArrays.stack(list_of_param_arrays)
+        self.lnls = [(None, '')] * len(self)
+        self.ifFeasible = [True] * len(self)
+
+        n, shape = len(self), (len(self), self.pd.nAgeGroups, self.pd.nVariants, self.pd.nVaccStatus)
+        # compartments are real-valued in the deterministic model
+        dtype = float if self.settings.deterministic else np.int64
+        self.S = self.paramArrays.sizeS0.astype(dtype)
+        self.V = np.zeros((n, self.pd.nAgeGroups), dtype=dtype)
+        self.E = np.zeros(shape, dtype=dtype)
+        self.I = np.zeros(shape, dtype=dtype)
+        self.I[..., 0, 0] = self.paramArrays.sizeI0
+        self.H = np.zeros(shape, dtype=dtype)
+        self.R = np.zeros(shape, dtype=dtype)
+        self.D = np.zeros(shape, dtype=dtype)
+
+        self.switches = np.zeros((n, 2), dtype=np.int64)
+        self.nDeltaTsInUse = np.zeros((n, 2), dtype=np.int64)
+        self.surveyedHospOccRate = np.full(n, np.nan)
+
+        sets = self.settings
+        self.ifActive = np.ones(n, dtype=bool)
+        self.history = TrajectoryHistory(
+            shape=shape,
+            max_n_rows=int(sets.maxSimDuration / sets.deltaT) // sets.nDeltaTsInSimOutputPeriod + 2,
+            dtype=dtype)
+        self.detectionRow = np.full(n, -1)
+        self.startOfEpidemic = np.full(n, -1)
+        self.endOfSim = np.full(n, sets.nDeltaTsInSimulation)
+        self.lastTimeStep = np.zeros(n, dtype=np.int64)
+        self._activeIdx = None
+        self._activeParamArrays = None
+        self._k = 0
+        self._nextK = np.zeros(n, dtype=np.int64)
+        self._ifEradicated = np.zeros(n, dtype=bool)
+        self.nUpdates = np.zeros(n, dtype=np.int64)
+
+        if sets.calcLikelihood:
+            self.feasibleConditions = get_feasible_conditions()
+            self.ifMinThresholdReached = {
+                name: np.full(n, c.minThresholdToHit is None) for name, c in self.feasibleConditions.items()}
+            self.rejectedBy = [None] * n
+            self.nDeltaTsSaved = np.zeros(n, dtype=np.int64)
+
+    def _get_active(self):
+        """ :returns (indices, parameters) of trajectories that are still being simulated
+        (indices is a slice if all trajectories are active) """
+
+        n_active = self.ifActive.sum()
+        if n_active == len(self):
+            return slice(None), self.paramArrays
+        # trajectories only become inactive, so the subset changes only if the number of active trajectories changes
+        if self._activeIdx is None or len(self._activeIdx) != n_active:
+            self._activeIdx = np.nonzero(self.ifActive)[0]
+            self._activeParamArrays = self.paramArrays.get_subset(self._activeIdx)
+        return self._activeIdx, self._activeParamArrays
+
+    @staticmethod
+    def _get_contact_matrices(pa, switches, surveyed_hosp_occ_rate):
+        """ :returns the contact matrix of each trajectory given the interventions in effect """
+
+        multiplier = np.ones(len(switches))
+        for i, max_eff in enumerate((pa.y1MaxEff, pa.y2MaxEff)):
+            eff = pa.get_eff_of_control_measure(max_eff=max_eff, surveyed_hosp_occ_rate=surveyed_hosp_occ_rate)
+            multiplier *= np.where(switches[:, i] == 1, 1 - eff, 1)
+        return pa.contactMatrix * multiplier[:, None, None]
+
+    @staticmethod
+    def _get_force_of_infection(pop_size, I, infectivity, contact_matrices):
+        """ :returns the rate of infection by each variant for a fully susceptible member of each age group
+        [trajectory, age group, variant] """
+
+        # infectivity of each age group for each variant
+        inf = (I * np.swapaxes(infectivity, -2, -1)[:, None]).sum(axis=-1)
+        inf_per_capita = np.divide(inf, pop_size[..., None],
+                                   out=np.zeros(inf.shape), where=pop_size[..., None] > 0)
+
+        return contact_matrices @ inf_per_capita
+
+    def _update_compartments(self, t, if_due, max_n_delta_ts=1):
+        """ moves members between compartments of active trajectories over one time-step
+        :param t: (np.array) time used to evaluate time-dependent parameters of each trajectory
+        :param if_due: (np.array of bool) active trajectories whose last time-step has ended
+            (with tau-leaping, the others are still in the middle of their time-step and are not updated)
+        :param max_n_delta_ts: (int) maximum length of the time-step (in multiples of deltaT) for tau-leaping
+        :return: (np.array) length of the time-step used for each trajectory (in multiples of deltaT,
+            0 for trajectories that are not updated)
+        """
+
+        n_v = self.pd.nVariants
+
+        idx, pa = self._get_active()
+        if_due_active = if_due[idx]
+        if not if_due_active.all():
+            idx = np.arange(len(self))[idx][if_due_active]
+            pa = pa.get_subset(np.nonzero(if_due_active)[0])
+        rngs = [self.rngs[i] for i in np.arange(len(self))[idx]]
+        t = t[idx]
+        S, V, E, I, H, R = self.S[idx], self.V[idx], self.E[idx], self.I[idx], self.H[idx], self.R[idx]
+
+        # population size of each age group (mixing groups)
+        pop_size = S + V + (E + I + H + R).sum(axis=(-2, -1))
+        foi = self._get_force_of_infection(
+            pop_size=pop_size, I=I, infectivity=pa.get_infectivity(t),
+            contact_matrices=self._get_contact_matrices(
+                pa=pa, switches=self.switches[idx], surveyed_hosp_occ_rate=self.surveyedHospOccRate[idx]))
+        vacc_rates = pa.get_vaccination_rates(t)  # [trajectory, age group]
+        import_rates = pa.get_importation_rates(t)  # [trajectory, variant]
+
+        n_delta_ts = np.ones(len(S), dtype=np.int64)
+        if max_n_delta_ts > 1:
+            n_delta_ts = self._get_n_delta_ts_to_leap(
+                S=S, V=V, E=E, I=I, R=R, pa=pa, foi=foi, import_rates=import_rates, max_n_delta_ts=max_n_delta_ts)
+        delta_t = self.settings.deltaT * n_delta_ts  # length of the time-step of each trajectory
+
+        # the transitions out of compartments are sampled together (see sample_competing_events)
+        rates_vacc_in_r = np.zeros(R.shape)
+        rates_vacc_in_r[..., 0] = vacc_rates[..., None]
+        (out_s, out_v, out_h, out_r), (out_e, out_i) = sample_competing_events(
+            rngs=rngs, delta_t=delta_t,
+            list_of_sizes_and_rates=[
+                # S: infection with each variant, and vaccination
+                (S, np.concatenate((foi, vacc_rates[..., None]), axis=-1)),
+                # V: infection with each variant, and losing vaccine immunity
+                (V, np.concatenate((foi * pa.suspVacc[:, None, :],
+                                    np.broadcast_to(pa.rateOfLosingVacImmunity[:, None, None], S.shape + (1,))),
+                                   axis=-1)),
+                # H: leaving hospital and death
+                (H, np.stack((np.broadcast_to(pa.ratesOfLeavingHosp[:, None], H.shape),
+                              pa.ratesOfDeathInHosp), axis=-1)),
+                # R: losing immunity, vaccination (if unvaccinated), and infection with other variants
+                (R, np.concatenate((np.broadcast_to(pa.ratesOfLeavingR[:, None], R.shape)[..., None],
+                                    rates_vacc_in_r[..., None],
+                                    foi[:, :, None, None, :] * pa.suspInR[:, None]), axis=-1))],
+            list_of_n_and_p=[
+                # E: becoming infectious
+                (E, -np.expm1(-pa.ratesOfLeavingE[:, None] * delta_t[:, None, None, None])),
+                # I: leaving I
+                (I, -np.expm1(-pa.ratesOfLeavingI[:, None] * delta_t[:, None, None, None]))])
+        # deciding whether to get hospitalized after leaving I
+        to_h, = sample_binomials(rngs=rngs, list_of_n_and_p=[(out_i, pa.probHosp)])
+        # importation
+        imported = sample_poisson(rngs=rngs, lam=np.broadcast_to(import_rates[:, None, :] * delta_t[:, None, None], foi.shape))
+
+        # infections among S, V, and R and importation
+        new_e = np.zeros(E.shape, dtype=np.int64)
+        new_e[..., 0] = out_s[..., :n_v] + imported + out_r[..., 2:].sum(axis=(-3, -2))
+        new_e[..., 1] = out_v[..., :n_v]
+        # recovered members who get vaccinated
+        to_vacc_r = np.zeros(R.shape, dtype=np.int64)
+        to_vacc_r[..., 1] = out_r[..., 0, 1]
+
+        # update compartments
+        self.S[idx] += out_r[..., 0].sum(axis=(-2, -1)) + out_v[..., n_v] - out_s.sum(axis=-1)
+        self.V[idx] += out_s[..., n_v] - out_v.sum(axis=-1)
+        self.E[idx] += new_e - out_e
+        self.I[idx] += out_e - out_i
+        self.H[idx] += to_h - out_h.sum(axis=-1)
+        self.R[idx] += out_i - to_h + out_h[..., 0] - out_r.sum(axis=-1) + to_vacc_r
+        self.D[idx] += out_h[..., 1]
+
+        # update incidence
+        self.history.update_incd(idx=idx, new_inf=out_e, new_hosp=to_h, new_deaths=out_h[..., 1],
+                                 new_vacc=out_s[..., n_v] + out_r[..., 0, 1].sum(axis=-1))
+
+        n_delta_ts_of_all = np.zeros(len(self), dtype=np.int64)
+        n_delta_ts_of_all[idx] = n_delta_ts
+        return n_delta_ts_of_all
+
+    def _get_n_delta_ts_to_leap(self, S, V, E, I, R, pa, foi, import_rates, max_n_delta_ts):
+        """ selects the length of the next time-step of each trajectory for tau-leaping so that the expected
+        change and the standard deviation of the change in the number of exposed and infectious members of each
+        variant are small relative to their size (Cao, Gillespie, and Petzold 2006). The change in a compartment
+        is bounded by max(eps * size / g, tauLeapingMinChange) where g is the order of the transitions it takes part
+        in as a source (1 for E and 2 for I, which infects S, V, and R). The floor is larger than the one member of
+        Cao et al. so that small or empty compartments (e.g. of variants that are just emerging) do not restrict the
+        time-step to deltaT (transitions are sampled with binomial draws, so compartments remain non-negative).
+        :return: (np.array) length of the time-step of each trajectory (in multiples of deltaT,
+            between 1 and max_n_delta_ts)
+        """
+
+        eps, min_change = self.settings.tauLeapingEps, self.settings.tauLeapingMinChange
+
+        # rates of flow into E, from E to I, and out of I for each variant [trajectory, variant]
+        to_e = (S[..., None] * foi).sum(axis=1) \
+               + (V[..., None] * foi * pa.suspVacc[:, None, :]).sum(axis=1) \
+               + np.einsum('mavs,maw,mvsw->mw', R, foi, pa.suspInR) \
+               + import_rates * self.pd.nAgeGroups
+        e_to_i = (E * pa.ratesOfLeavingE[:, None]).sum(axis=(1, 3))
+        out_of_i = (I * pa.ratesOfLeavingI[:, None]).sum(axis=(1, 3))
+
+        tau = np.full(len(S), np.inf)
+        for size, inflow, outflow, g in ((E.sum(axis=(1, 3)), to_e, e_to_i, 1),
+                                         (I.sum(axis=(1, 3)), e_to_i, out_of_i, 2)):
+            bound = np.maximum(eps * size / g, min_change)
+            mean = np.abs(inflow - outflow)
+            var = inflow + outflow
+            tau = np.minimum(tau, np.minimum(
+                np.divide(bound, mean, out=np.full(mean.shape, np.inf), where=mean > 0).min(axis=-1),
+                np.divide(bound ** 2, var, out=np.full(var.shape, np.inf), where=var > 0).min(axis=-1)))
+
+        return np.clip(tau // self.settings.deltaT, 1, max_n_delta_ts).astype(np.int64)
+
+    def _integrate_compartments(self, t, n_delta_ts):
+        """ deterministic counterpart of _update_compartments: integrates the expected rates of change of
+        compartments of active trajectories over n_delta_ts time-steps
+        :param t: (np.array) time used to evaluate time-dependent parameters of each trajectory
+            at the beginning of the integration period
+        :param n_delta_ts: (int) number of time-steps to integrate over
+        """
+
+        delta_t = self.settings.deltaT
+
+        idx, pa = self._get_active()
+        # time-dependent parameters use time 0 until the epidemic is detected
+        if_time_moving = self.startOfEpidemic[idx] >= 0
+        t = t[idx]
+        contact_matrices = self._get_contact_matrices(
+            pa=pa, switches=self.switches[idx], surveyed_hosp_occ_rate=self.surveyedHospOccRate[idx])
+
+        # state: compartments followed by cumulative infections, hospitalizations, deaths, and vaccinations
+        S, V = self.S[idx], self.V[idx]
+        shape = self.E[idx].shape
+        states = [S, V, self.E[idx], self.I[idx], self.H[idx], self.R[idx], self.D[idx],
+                  np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(S.shape)]
+        shapes = [s.shape for s in states]
+        splits = np.cumsum([s.size for s in states])[:-1]
+
+        def get_rates_of_change(tau, y):
+            S, V, E, I, H, R, D, inf, hosp, deaths, vacc = [
+                x.reshape(x_shape) for x, x_shape in zip(np.split(y, splits), shapes)]
+            time = t + tau * if_time_moving
+
+            pop_size = S + V + (E + I + H + R).sum(axis=(-2, -1))
+            foi = self._get_force_of_infection(
+                pop_size=pop_size, I=I, infectivity=pa.get_infectivity(time), contact_matrices=contact_matrices)
+            vacc_rates = pa.get_vaccination_rates(time)
+
+            # flows out of each compartment (the same events as in _update_compartments)
+            inf_s = S[..., None] * foi
+            vacc_s = S * vacc_rates
+            inf_v = V[..., None] * foi * pa.suspVacc[:, None, :]
+            lose_v = V * pa.rateOfLosingVacImmunity[:, None]
+            out_e = E * pa.ratesOfLeavingE[:, None]
+            out_i = I * pa.ratesOfLeavingI[:, None]
+            to_h = out_i * pa.probHosp
+            out_h = H * pa.ratesOfLeavingHosp[:, None]
+            death_h = H * pa.ratesOfDeathInHosp
+            lose_r = R * pa.ratesOfLeavingR[:, None]
+            vacc_r = R[..., 0] * vacc_rates[..., None]
+            # infections among R by profile [..., variant, vaccination status] and by the new variant [..., variant]
+            inf_r_by_profile = R * np.einsum('maw,mvsw->mavs', foi, pa.suspInR)
+            inf_r_by_variant = np.einsum('mavs,maw,mvsw->maw', R, foi, pa.suspInR)
+            imported = np.broadcast_to(pa.get_importation_rates(time)[:, None, :], foi.shape)
+
+            d_e = -out_e
+            d_e[..., 0] += inf_s + imported + inf_r_by_variant
+            d_e[..., 1] += inf_v
+            d_r = out_i - to_h + out_h - lose_r - inf_r_by_profile
+            d_r[..., 0] -= vacc_r
+            d_r[..., 1] += vacc_r
+
+            return np.concatenate([x.ravel() for x in (
+                lose_r.sum(axis=(-2, -1)) + lose_v - inf_s.sum(axis=-1) - vacc_s,   # S
+                vacc_s - inf_v.sum(axis=-1) - lose_v,                                 # V
+                d_e, out_e - out_i, to_h - out_h - death_h, d_r, death_h,           # E, I, H, R, D
+                out_e, to_h, death_h, vacc_s + vacc_r.sum(axis=-1))])                 # incidence
+
+        sol = solve_ivp(get_rates_of_change, t_span=(0, n_delta_ts * delta_t),
+                        y0=np.concatenate([x.ravel() for x in states]), rtol=ODE_RTOL, atol=ODE_ATOL)
+        # the solver could slightly overshoot below zero
+        S, V, E, I, H, R, D, inf, hosp, deaths, vacc = [
+            np.maximum(x.reshape(x_shape), 0) for x, x_shape in zip(np.split(sol.y[:, -1], splits), shapes)]
+
+        # update compartments
+        self.S[idx], self.V[idx], self.E[idx], self.I[idx], self.H[idx], self.R[idx], self.D[idx] = \
+            S, V, E, I, H, R, D
+
+        # update incidence
+        self.history.update_incd(idx=idx, new_inf=inf, new_hosp=hosp, new_deaths=deaths, new_vacc=vacc)
+
+    def _record_outputs(self, k, if_recording):
+        """ records the simulation outputs at the end of a simulation output period,
+        detects the start of epidemics, and makes decisions
+        :param k: (int) current time-step
+        :param if_recording: (np.array of bool) trajectories to record
+        """
+
+        sets = self.settings
+        rows = self.history.record(S=self.S, V=self.V, E=self.E, I=self.I, H=self.H, R=self.R,
+                                   switches=self.switches, if_recording=if_recording)
+
+        # terminate trajectories that violate feasible conditions (only when calibrating)
+        if sets.calcLikelihood:
+            self._check_feasibility(k=k, rows=rows, if_recording=if_recording)
+
+        # an epidemic is detected when incidence is observed during the last simulation output period
+        if_detected = if_recording * (self.detectionRow < 0) * (rows > 0) * (self.history.get_last_incd() > 0)
+        self.detectionRow[if_detected] = rows[if_detected]
+        self.startOfEpidemic[if_detected] = max(k - sets.nDeltaTsInObsPeriod, 0)
+        # (apacepy also schedules the end of simulation nDeltaTsInSimulation after the detection, but the
+        # end of simulation scheduled at time 0 always comes first, so self.endOfSim does not change)
+
+        # surveillance starts when the epidemic is detected
+        if_surveyed = if_recording * (self.detectionRow >= 0) * (rows >= self.detectionRow)
+        pop_size = self.history.popSizeByAge[np.arange(len(self)), rows].sum(axis=-1)
+        hosp_occ_rate = np.divide(self.history.hospOccupancy[np.arange(len(self)), rows], pop_size,
+                                  out=np.full(len(self), np.nan), where=pop_size > 0)
+        self.surveyedHospOccRate = np.where(
+            if_recording, np.where(if_surveyed, hosp_occ_rate, np.nan), self.surveyedHospOccRate)
+
+        if_deciding = if_recording * (self.startOfEpidemic >= 0)
+        if if_deciding.any():
+            self._make_decisions(epi_time=(k - self.startOfEpidemic) * sets.deltaT, if_deciding=if_deciding)
+
+    def _check_feasibility(self, k, rows, if_recording):
+        """ checks the feasible conditions (see add_calibration_info in model_support.py) at the last recorded row
+        and terminates the trajectories that are infeasible
+        :param k: (int) current time-step
+        :param rows: (np.array) the index of the last recorded row of each trajectory
+        :param if_recording: (np.array of bool) trajectories that are recorded at this time-step
+        """
+
+        # feasible conditions are not checked before the epidemic is detected
+        if_epi_started = self.startOfEpidemic >= 0
+        epi_time = (k - self.startOfEpidemic) * self.settings.deltaT
+        ratios = self.history.get_ratios_for_feasibility(rows=rows)
+
+        for name, c in self.feasibleConditions.items():
+            value = ratios[name]
+            if_checked = if_recording * if_epi_started * ~np.isnan(value)
+            value = np.nan_to_num(value)
+            t_min, t_max = (-np.inf, np.inf) if c.period is None else c.period
+            if_reached = self.ifMinThresholdReached[name]
+
+            # infeasible if the period has passed and the minimum threshold is not yet reached
+            if_violated = if_checked * (epi_time > t_max) * ~if_reached
+            if_checked *= (t_min <= epi_time) * (epi_time <= t_max)
+            if c.minThresholdToHit is not None:
+                if_reached += if_checked * (value >= c.minThresholdToHit)
+            if c.feasibleMin is not None:
+                if_violated += if_checked * (value < c.feasibleMin)
+            if c.feasibleMax is not None:
+                if_violated += if_checked * (value > c.feasibleMax)
+
+            for i in np.nonzero(if_violated)[0]:
+                self._reject(i=i, name=name, k=k)
+
+    def _reject(self, i, name, k=None):
+        """ marks trajectory i as infeasible
+        :param i: (int) index of the trajectory
+        :param name: (string) name of the ratio time-series whose feasible conditions are violated
+        :param k: (int) time-step when the violation happened (None if at the end of simulation)
+        """
+
+        # only the first violation is counted
+        if not self.ifFeasible[i]:
+            return
+
+        self.ifFeasible[i] = False
+        self.rejectedBy[i] = name
+        if k is not None:
+            # terminate the simulation of this trajectory
+            self.nDeltaTsSaved[i] = max(self.endOfSim[i] - k, 0)
+            self.endOfSim[i] = k
+
+    def _process_end_of_calibration_runs(self):
+        """ checks if minimum thresholds of feasible conditions are reached and
+        calculates the likelihood of feasible trajectories """
+
+        targets = get_calibration_targets(settings=self.settings, age_groups_profiles=self.pd)
+
+        for i in range(len(self)):
+            for name, if_reached in self.ifMinThresholdReached.items():
+                if not if_reached[i]:
+                    self._reject(i=i, name=name)
+
+            if self.ifFeasible[i]:
+                self.lnls[i] = self._calculate_lnl(i=i, targets=targets)
+            else:
+                self.lnls[i] = float('-inf'), 'Infeasible trajectory'
+
+    def _calculate_lnl(self, i, targets):
+        """
+        :param i: (int) index of the trajectory
+        :param targets: (dictionary) of calibration targets (see get_calibration_targets in model_support.py)
+        :return: (lnl, message) where lnl is the log likelihood of trajectory i
+        """
+
+        sums, ratios = get_sum_and_ratio_time_series(history=self.history, i=i, pd=self.pd)
+        detection_row = self.detectionRow[i]
+
+        lnl = 0
+        message = ''
+        for r in ratios:
+            if r.name in targets:
+                # surveyed ratios (starting from the second row)
+                sim_ratios = [v if 0 <= detection_row <= row and not np.isnan(v) else None
+                              for row, v in enumerate(r.values)][1:]
+                v, m = get_lnl_of_a_time_series(observed_ratios=targets[r.name]['ratios'],
+                                                sim_ratios=sim_ratios,
+                                                observed_ns=targets[r.name]['survey_sizes'],
+                                                observed_vars=targets[r.name]['variances'])
+                lnl += v
+                message += r.name + '-' + str(m) + '|'
+
+        if message == '':
+            message = 'Feasible trajectory'
+        return lnl, message
+
+    def _make_decisions(self, epi_time, if_deciding):
+        """ turns physical distancing on or off (see get_interventions_features_conditions in model_support.py)
+        :param epi_time: (np.array) epidemic time of each trajectory
+        :param if_deciding: (np.array of bool) trajectories for which decisions should be made
+        """
+
+        pa = self.paramArrays
+        h = self.surveyedHospOccRate
+        if_surveyed = ~np.isnan(h)
+        h = np.nan_to_num(h)
+        in_calib_period = epi_time < FEASIBILITY_PERIOD
+
+        # year 1
+        y1 = self.switches[:, 0]
+        turn_on = (y1 == 0) * in_calib_period * if_surveyed * (h >= pa.y1Thresholds[:, 0])
+        turn_off = (y1 == 1) * (~in_calib_period + if_surveyed * (h < pa.y1Thresholds[:, 1]))
+        y1[:] = np.where(if_deciding * turn_on, 1, np.where(if_deciding * turn_off, 0, y1))
+
+        # year 2
+        if self.settings.mitigatingStrategiesOn:
+            y2 = self.switches[:, 1]
+            turn_on = (y2 == 0) * ~in_calib_period * if_surveyed * (h >= pa.y2Thresholds[:, 0])
+            turn_off = (y2 == 1) * if_surveyed * (h < pa.y2Thresholds[:, 1])
+            y2[:] = np.where(if_deciding * turn_on, 1, np.where(if_deciding * turn_off, 0, y2))
+
+    def _get_surveyed_value(self, i):
+        """ :returns the last surveyed hospital occupancy rate of trajectory i (None if not surveyed) """
+        return None if np.isnan(self.surveyedHospOccRate[i]) else self.surveyedHospOccRate[i]
+
+    def get_dic_of_intervention_utilization(self, i):
+        """ :return: (dictionary) with the duration each intervention was in use in trajectory i """
+
+        names = ('Physical distancing during calibration period', 'Physical distancing during fall/winter')
+        result = dict()
+        for name, n in zip(names, self.nDeltaTsInUse[i]):
+            result['Duration of ' + name + ' (after epidemic warm-up)'] = n * self.settings.deltaT
+        return result
+
+    def get_trajectories(self, i):
+        """ :returns (list) of columns of trajectory i (the first element of each column is its title)
+        in the same layout as the trajectory files exported by apacepy """
+
+        return self.history.get_columns(
+            i=i,
+            pd=self.pd,
+            delta_t=self.settings.deltaT,
+            n_delta_ts_in_sim_output_period=self.settings.nDeltaTsInSimOutputPeriod,
+            detection_row=self.detectionRow[i] if self.detectionRow[i] >= 0 else None,
+            names_of_ratios=get_names_of_ratio_time_series_to_collect(
+                output_profile=self.settings.outputProfile, age_groups_profiles=self.pd))
+
+    def export_trajectories(self, folder=None, delete_existing_files=True):
+        """ exports the simulated epidemics into the trajectory store (see trajectory_store.py)
+        :param delete_existing_files: (not used; the existing store is always replaced)
+        """
+
+        write_trajectory_store(
+            ids=self.ids, seeds=self.seeds,
+            list_of_columns=[self.get_trajectories(i=i) for i in range(len(self))],
+            directory=self.settings.folderToSaveTrajs if folder is None else folder,
+            scenario=self.settings.scenario,
+            run_times=[self.runTime / len(self)] * len(self))
+
+
+class VectorizedEpiModel(BatchOfEpiModels):
+    """ COVID model with compartments stored as arrays
+    (it follows the interface of apacepy's EpiModel that is used in this project) """
+
+    def __init__(self, id, settings):
+        """
+        :param id: (int) id of this epidemic model
+        :param settings: (COVIDSettings) model settings
+        """
+
+        BatchOfEpiModels.__init__(self, ids=[id], settings=settings)
+        self.id = id
+        self.seed = None
+        self.params = None
+        self.nTrajsDiscarded = 0
+        self.ifAFeasibleTraj = True
+        self.lnl = None, ''
+
+    def simulate(self, seed=None):
+        """ simulate the epidemic model
+        :param seed: (int) random number seed
+        """
+
+        self.seed = self.id if seed is None else seed
+        BatchOfEpiModels.simulate(self, seeds=[self.seed])
+
+        self.params = self.listOfParams[0]
+        self.ifAFeasibleTraj = self.ifFeasible[0]
+        self.lnl = self.lnls[0]
+
+    def get_dic_of_intervention_utilization(self, i=0):
+        return BatchOfEpiModels.get_dic_of_intervention_utilization(self, i=i)
+
+    def get_trajectories(self, i=0):
+        return BatchOfEpiModels.get_trajectories(self, i=i)
+
+    def get_total_discounted_cost_and_health(self):
+        return 'Economic evaluation is not available for the vectorized model.'
+
+
+class TrajectoryHistory:
+    """ stores the (aggregated) state of a batch of trajectories at the end of each simulation output period """
+
+    def __init__(self, shape, max_n_rows, dtype=np.int64):
+        """
+        :param shape: (tuple) shape of compartments (trajectory, age group, variant, vaccination status)
+        :param max_n_rows: (int) maximum number of simulation output periods
+        :param dtype: type of counts (float for the deterministic model)
+        """
+
+        n, n_ages = shape[0], shape[1]
+        # incidence during the current simulation output period and cumulative incidence
+        self._incdInf = np.zeros(shape, dtype=dtype)
+        self._incdHosp = np.zeros(shape, dtype=dtype)
+        self._cumInf = np.zeros((n, n_ages), dtype=dtype)
+        self._cumHosp = np.zeros((n, n_ages), dtype=dtype)
+        self._cumDeath = np.zeros((n, n_ages), dtype=dtype)
+        self._cumVacc = np.zeros((n, n_ages), dtype=dtype)
+
+        # number of rows recorded for each trajectory
+        self.nRows = np.zeros(n, dtype=np.int64)
+
+        # [trajectory, row, ...]
+        self.popSizeByAge = np.zeros((n, max_n_rows, n_ages), dtype=dtype)
+        self.hospOccupancy = np.zeros((n, max_n_rows), dtype=dtype)
+        self.nSusceptible = np.zeros((n, max_n_rows), dtype=dtype)
+        self.nImmuneFromInf = np.zeros((n, max_n_rows), dtype=dtype)
+        self.cumInfByAge = np.zeros((n, max_n_rows, n_ages), dtype=dtype)
+        self.cumHospByAge = np.zeros((n, max_n_rows, n_ages), dtype=dtype)
+        self.cumDeathByAge = np.zeros((n, max_n_rows, n_ages), dtype=dtype)
+        self.cumVaccByAge = np.zeros((n, max_n_rows, n_ages), dtype=dtype)
+        self.incdInf = np.zeros((n, max_n_rows) + shape[1:], dtype=dtype)   # not available for the first row
+        self.incdHosp = np.zeros((n, max_n_rows) + shape[1:], dtype=dtype)
+        self.interventions = np.zeros((n, max_n_rows, 2), dtype=np.int64)
+
+    def update_incd(self, idx, new_inf, new_hosp, new_deaths, new_vacc):
+        """ updates incidence of trajectories idx over a simulation time-step """
+
+        self._incdInf[idx] += new_inf
+        self._incdHosp[idx] += new_hosp
+        self._cumInf[idx] += new_inf.sum(axis=(-2, -1))
+        self._cumHosp[idx] += new_hosp.sum(axis=(-2, -1))
+        self._cumDeath[idx] += new_deaths.sum(axis=(-2, -1))
+        self._cumVacc[idx] += new_vacc
+
+    def record(self, S, V, E, I, H, R, switches, if_recording):
+        """ records a new row for the trajectories in if_recording
+        :returns (np.array) the index of the last recorded row of each trajectory """
+
+        idx = np.nonzero(if_recording)[0]
+        rows = self.nRows[idx]
+
+        self.popSizeByAge[idx, rows] = S[idx] + V[idx] + (E[idx] + I[idx] + H[idx] + R[idx]).sum(axis=(-2, -1))
+        self.hospOccupancy[idx, rows] = H[idx].sum(axis=(-3, -2, -1))
+        self.nSusceptible[idx, rows] = S[idx].sum(axis=-1)
+        self.nImmuneFromInf[idx, rows] = R[idx][..., 0].sum(axis=(-2, -1))
+        self.cumInfByAge[idx, rows] = self._cumInf[idx]
+        self.cumHospByAge[idx, rows] = self._cumHosp[idx]
+        self.cumDeathByAge[idx, rows] = self._cumDeath[idx]
+        self.cumVaccByAge[idx, rows] = self._cumVacc[idx]
+        self.incdInf[idx, rows] = self._incdInf[idx]
+        self.incdHosp[idx, rows] = self._incdHosp[idx]
+        self.interventions[idx, rows] = switches[idx]
+
+        self._incdInf[idx] = 0
+        self._incdHosp[idx] = 0
+        self.nRows[idx] += 1
+
+        return self.nRows - 1
+
+    def get_ratios_for_feasibility(self, rows):
+        """
+        :param rows: (np.array) the row of each trajectory
+        :return: (dictionary) with the values of ratio time-series that have feasible conditions
+            (see get_feasible_conditions in model_support.py) at the given rows (nan if not available)
+        """
+
+        idx = np.arange(len(self.nRows))
+        pop_size = self.popSizeByAge[idx, rows].sum(axis=-1)
+        # incidence is not available for the first row and incidence rates use
+        # the population size at the beginning of the simulation output period
+        if_incd = rows > 0
+        pop_size_at_start = np.where(if_incd, self.popSizeByAge[idx, rows - 1].sum(axis=-1), 0)
+        incd_by_variant = self.incdInf[idx, rows].sum(axis=(-3, -1))
+        incd = np.where(if_incd, incd_by_variant.sum(axis=-1), 0)
+
+        return {
+            'Hospital occupancy rate': _divide(self.hospOccupancy[idx, rows], pop_size),
+            'New hospitalization rate': _divide(self.incdHosp[idx, rows].sum(axis=(-3, -2, -1)), pop_size_at_start),
+            'Prevalence with immunity from infection': _divide(self.nImmuneFromInf[idx, rows], pop_size),
+            'Cumulative hospitalization rate': _divide(self.cumHospByAge[idx, rows].sum(axis=-1), pop_size),
+            '% of incidence due to Delta': _divide(incd_by_variant[:, Variants.DELTA.value], incd),
+            '% of incidence due to Novel': _divide(incd_by_variant[:, Variants.NOVEL.value], incd)
+        }
+
+    def get_last_incd(self):
+        """ :returns the total incidence of each trajectory during its last recorded simulation output period """
+        return self.incdInf[np.arange(len(self.nRows)), np.maximum(self.nRows - 1, 0)].sum(axis=(-3, -2, -1))
+
+    def get_columns(self, i, pd, delta_t, n_delta_ts_in_sim_output_period, detection_row, names_of_ratios=None):
+        """
+        :param i: (int) index of the trajectory
+        :param pd: (ProfileDefiner)
+        :param delta_t: (float) simulation time-step
+        :param n_delta_ts_in_sim_output_period: (int) number of time-steps in a simulation output period
+        :param detection_row: (int) the row when the epidemic is detected (None if not detected)
+        :param names_of_ratios: (set) names of ratio time-series to include (with the sum time-series they are
+            defined on and incidence); if None, all time-series are included
+        :return: (list) of columns (the first element of each column is its title)
+        """
+
+        n = self.nRows[i]
+        sums, ratios = get_sum_and_ratio_time_series(history=self, i=i, pd=pd)
+        if names_of_ratios is not None:
+            ratios = [r for r in ratios if r.name in names_of_ratios]
+            sums_in_use = [s for r in ratios for s in r.sumTimeSeries]
+            sums = [s for s in sums if s.name == 'Incidence' or any(s is s_in_use for s_in_use in sums_in_use)]
+        interventions = self.interventions[i, :n].tolist()
+
+        # surveyed outputs are available from the observation period when the epidemic is detected
+        if_obs = np.array([detection_row is not None and r >= detection_row for r in range(n)])
+
+        cols = []
+        # time-based simulation outputs
+        cols.append(['Simulation Time'] + [r * n_delta_ts_in_sim_output_period * delta_t for r in range(n)])
+        for s in sums:
+            if s.type in ('prev', 'cum-incd'):
+                cols.append([s.name] + _to_list(s.values))
+        for r in ratios:
+            if r.type in ('prev/prev', 'cum-incd/cum-incd', 'cum-incd/prev'):
+                cols.append([r.name] + _to_list(r.values))
+
+        # period-based simulation outputs
+        cols.append(['Simulation Period'] + list(range(n)))
+        for s in sums:
+            if s.type == 'incd':
+                cols.append([s.name] + _to_list(s.values))
+        for r in ratios:
+            if r.type in ('incd/incd', 'incd/prev'):
+                cols.append([r.name] + _to_list(r.values))
+        cols.append(['Interventions'] + interventions)
+
+        # time-based observation outputs
+        # (the epidemic is assumed to have started one observation period before it is detected,
+        # so the observation time is the epidemic time at the end of each observation period)
+        obs_periods = [r - detection_row + 1 if if_obs[r] else None for r in range(n)]
+        cols.append(['Observation Time'] + [
+            None if p is None else p * n_delta_ts_in_sim_output_period * delta_t for p in obs_periods])
+        for s in sums:
+            if s.ifSurveyed and s.type in ('prev', 'cum-incd'):
+                cols.append(['Obs: ' + s.name] + _to_list(s.values, mask=if_obs))
+        for r in ratios:
+            if r.ifSurveyed and r.type in ('prev/prev', 'cum-incd/cum-incd', 'cum-incd/prev'):
+                cols.append(['Obs: ' + r.name] + _to_list(r.values, mask=if_obs))
+
+        # period-based observation outputs
+        cols.append(['Observation Period'] + obs_periods)
+        for s in sums:
+            if s.ifSurveyed and s.type == 'incd':
+                cols.append(['Obs: ' + s.name] + _to_list(s.values, mask=if_obs))
+        for r in ratios:
+            if r.ifSurveyed and r.type in ('incd/incd', 'incd/prev'):
+                cols.append(['Obs: ' + r.name] + _to_list(r.values, mask=if_obs))
+        cols.append(['Obs: Interventions'] + interventions)
+
+        return cols
+
+
+class _TimeSeries:
+    """ a sum or a ratio time-series calculated from the simulation history """
+
+    def __init__(self, name, type, values, if_surveyed=False, sum_time_series=None):
+        """
+        :param name: (string) name of the time-series (title of the column in trajectory files)
+        :param type: (string) 'prev', 'incd', 'cum-incd' or
+                     for ratios 'prev/prev', 'incd/incd', 'incd/prev', 'cum-incd/prev', or 'cum-incd/cum-incd'
+        :param values: (np.array) values over simulation output periods (nan if not available)
+        :param if_surveyed: (bool) if this time-series is surveyed
+        :param sum_time_series: (tuple) numerator and denominator of a ratio time-series
+        """
+        self.name = name
+        self.type = type
+        self.values = values
+        self.ifSurveyed = if_surveyed
+        self.sumTimeSeries = sum_time_series
+
+
+def get_sum_and_ratio_time_series(history, i, pd):
+    """
+    :param history: (TrajectoryHistory) simulation history
+    :param i: (int) index of the trajectory
+    :param pd: (ProfileDefiner)
+    :return: (list of sum time-series, list of ratio time-series) with the same names and in the same order
+        as the time-series defined in build_covid_model (covid_model/model.py)
+    """
+
+    n_a, n_v, n_vs = pd.nAgeGroups, pd.nVariants, pd.nVaccStatus
+    n = history.nRows[i]
+
+    pop_by_age = history.popSizeByAge[i, :n]
+    # incidence is not available for the first simulation output period
+    incd_inf = history.incdInf[i, :n].astype(float)
+    incd_inf[0] = np.nan
+    incd_hosp = history.incdHosp[i, :n].astype(float)
+    incd_hosp[0] = np.nan
+    cum_inf = history.cumInfByAge[i, :n]
+    cum_hosp = history.cumHospByAge[i, :n]
+    cum_death = history.cumDeathByAge[i, :n]
+    cum_vacc = history.cumVaccByAge[i, :n]
+
+    sums = []
+    ratios = []
+
+    def add_sum(name, type, values, if_surveyed=False):
+        sums.append(_TimeSeries(name=name, type=type, values=values, if_surveyed=if_surveyed))
+        return sums[-1]
+
+    def add_ratio(name, numerator, denominator, if_surveyed=False):
+        if denominator.type == 'prev' and numerator.type == 'incd':
+            # the denominator is evaluated at the beginning of the simulation output period
+            denom = np.concatenate(([np.nan], denominator.values[:-1]))
+        else:
+            denom = denominator.values
+        values = np.divide(numerator.values, denom,
+                           out=np.full(len(denom), np.nan), where=np.nan_to_num(denom) > 0)
+        ratios.append(_TimeSeries(name=name, type=numerator.type + '/' + denominator.type,
+                                  values=values, if_surveyed=if_surveyed, sum_time_series=(numerator, denominator)))
+        # as in apacepy, the numerator of a surveyed ratio is surveyed
+        # (the denominator is only surveyed if it is surveyed itself)
+        if if_surveyed:
+            numerator.ifSurveyed = True
+        return ratios[-1]
+
+    # sum time-series
+    pop_size = [add_sum('Population size', 'prev', pop_by_age.sum(axis=1))]
+    for a in range(n_a):
+        pop_size.append(add_sum('Population-' + pd.strAge[a], 'prev', pop_by_age[:, a]))
+    hosp_occupancy = add_sum('Hospital occupancy', 'prev', history.hospOccupancy[i, :n])
+    num_susp = add_sum('Individuals susceptible', 'prev', history.nSusceptible[i, :n])
+    num_immune_from_inf = add_sum('Unvaccinated individuals wth immunity from infection', 'prev',
+                                  history.nImmuneFromInf[i, :n])
+
+    incd = [add_sum('Incidence', 'incd', incd_inf.sum(axis=(1, 2, 3)), if_surveyed=True)]
+    for a in range(n_a):
+        incd.append(add_sum('Incidence-' + pd.strAge[a], 'incd', incd_inf[:, a].sum(axis=(1, 2))))
+    new_hosp = [add_sum('New hospitalizations', 'incd', incd_hosp.sum(axis=(1, 2, 3)), if_surveyed=True)]
+    for a in range(n_a):
+        new_hosp.append(add_sum('New hospitalizations-' + pd.strAge[a], 'incd', incd_hosp[:, a].sum(axis=(1, 2))))
+
+    cum_incd = [add_sum('Cumulative incidence', 'cum-incd', cum_inf.sum(axis=1))]
+    for a in range(n_a):
+        cum_incd.append(add_sum('Cumulative incidence-' + pd.strAge[a], 'cum-incd', cum_inf[:, a]))
+    cum_hosps = [add_sum('Cumulative hospitalizations', 'cum-incd', cum_hosp.sum(axis=1), if_surveyed=True)]
+    for a in range(n_a):
+        cum_hosps.append(add_sum('Cumulative hospitalizations-' + pd.strAge[a], 'cum-incd', cum_hosp[:, a]))
+    cum_deaths = [add_sum('Cumulative death', 'cum-incd', cum_death.sum(axis=1), if_surveyed=True)]
+    for a in range(n_a):
+        cum_deaths.append(add_sum('Cumulative death-' + pd.strAge[a], 'cum-incd', cum_death[:, a]))
+    cum_vaccs = [add_sum('Cumulative vaccination', 'cum-incd', cum_vacc.sum(axis=1), if_surveyed=True)]
+    for a in range(n_a):
+        cum_vaccs.append(add_sum('Cumulative vaccination-' + pd.strAge[a], 'cum-incd', cum_vacc[:, a]))
+
+    incd_by_profile = []
+    new_hosp_by_profile = []
+    for v in range(n_v):
+        for vs in range(n_vs):
+            incd_by_profile.append(add_sum(
+                'Incidence-' + pd.strProfile[v][vs], 'incd', incd_inf[:, :, v, vs].sum(axis=1)))
+    for v in range(n_v):
+        for vs in range(n_vs):
+            new_hosp_by_profile.append(add_sum(
+                'New hosp-' + pd.strProfile[v][vs], 'incd', incd_hosp[:, :, v, vs].sum(axis=1)))
+    incd_vacc = add_sum('Incidence-vaccinated', 'incd', incd_inf[..., 1].sum(axis=(1, 2)))
+    new_hosp_vacc = add_sum('New hospitalizations and vaccinated', 'incd', incd_hosp[..., 1].sum(axis=(1, 2)))
+    incd_by_variant = [add_sum('Incidence-' + pd.strVariant[v], 'incd', incd_inf[:, :, v].sum(axis=(1, 2)))
+                       for v in range(n_v)]
+    new_hosp_by_variant = [add_sum('New hospitalizations-' + pd.strVariant[v], 'incd',
+                                   incd_hosp[:, :, v].sum(axis=(1, 2))) for v in range(n_v)]
+
+    # ratio time-series
+    add_ratio('Hospital occupancy rate', hosp_occupancy, pop_size[0], if_surveyed=True)
+    add_ratio('Incidence rate', incd[0], pop_size[0], if_surveyed=True)
+    for a in range(n_a):
+        add_ratio('Incidence rate-' + pd.strAge[a], incd[a + 1], pop_size[a + 1], if_surveyed=True)
+    add_ratio('Prevalence susceptible', num_susp, pop_size[0], if_surveyed=True)
+    add_ratio('Prevalence with immunity from infection', num_immune_from_inf, pop_size[0], if_surveyed=True)
+    add_ratio('New hospitalization rate', new_hosp[0], pop_size[0], if_surveyed=True)
+    for a in range(n_a):
+        add_ratio('New hospitalization rate-' + pd.strAge[a], new_hosp[a + 1], pop_size[a + 1], if_surveyed=True)
+    add_ratio('Cumulative hospitalization rate', cum_hosps[0], pop_size[0], if_surveyed=True)
+    for a in range(n_a):
+        add_ratio('Cumulative hospitalization rate-' + pd.strAge[a], cum_hosps[a + 1], pop_size[a + 1],
+                  if_surveyed=True)
+    add_ratio('Cumulative death rate', cum_deaths[0], pop_size[0], if_surveyed=True)
+    for a in range(n_a):
+        add_ratio('Cumulative death rate-' + pd.strAge[a], cum_deaths[a + 1], pop_size[a + 1])
+    add_ratio('Cumulative vaccination rate', cum_vaccs[0], pop_size[0], if_surveyed=True)
+    for a in range(n_a):
+        add_ratio('Cumulative vaccination rate-' + pd.strAge[a], cum_vaccs[a + 1], pop_size[a + 1],
+                  if_surveyed=True)
+    for v in range(n_v):
+        for vs in range(n_vs):
+            add_ratio('% of incidence due to ' + pd.strProfile[v][vs],
+                      incd_by_profile[n_vs * v + vs], incd[0], if_surveyed=True)
+    for v in range(n_v):
+        for vs in range(n_vs):
+            add_ratio('% of new hospitalizations due to ' + pd.strProfile[v][vs],
+                      new_hosp_by_profile[n_vs * v + vs], new_hosp[0], if_surveyed=True)
+    for a in range(n_a):
+        add_ratio('Cumulative incidence-' + pd.strAge[a] + ' (%)', cum_incd[a + 1], cum_incd[0], if_surveyed=True)
+    for a in range(n_a):
+        add_ratio('Cumulative hospitalizations-' + pd.strAge[a] + ' (%)', cum_hosps[a + 1], cum_hosps[0])
+    for a in range(n_a):
+        add_ratio('Cumulative death-' + pd.strAge[a] + ' (%)', cum_deaths[a + 1], cum_deaths[0])
+    add_ratio('% of incidence that are vaccinated', incd_vacc, incd[0], if_surveyed=True)
+    add_ratio('% of new hospitalizations that are vaccinated', new_hosp_vacc, new_hosp[0], if_surveyed=True)
+    for v in range(n_v):
+        add_ratio('% of incidence due to ' + pd.strVariant[v], incd_by_variant[v], incd[0], if_surveyed=True)
+    for v in range(n_v):
+        add_ratio('% of new hospitalizations due to ' + pd.strVariant[v],
+                  new_hosp_by_variant[v], new_hosp[0], if_surveyed=True)
+
+    return sums, ratios
+
+
+def _divide(numerator, denominator):
+    """ :returns numerator/denominator (nan where the denominator is not positive) """
+    return np.divide(numerator, denominator,
+                     out=np.full(np.shape(numerator), np.nan), where=denominator > 0)
+
+
+def _to_list(values, mask=None):
+    """ :returns values as a list (with None for missing values and integers for counts) """
+
+    result = []
+    for i, v in enumerate(values):
+        if np.isnan(v) or (mask is not None and not mask[i]):
+            result.append(None)
+        elif float(v).is_integer() and not isinstance(v, np.floating):
+            result.append(int(v))
+        else:
+            result.append(float(v))
+    return result
+
+
+class VectorizedMultiEpidemics(MultiEpidemics):
+    """ simulates multiple vectorized COVID models in batches
+    (summaries are saved and printed as in apacepy's MultiEpidemics) """
+
+    def __init__(self, model_settings, batch_size=None):
+        """
+        :param model_settings: (COVIDSettings) model settings
+        :param batch_size: (int) number of trajectories simulated together (D.SIM_BATCH_SIZE if None)
+        """
+        MultiEpidemics.__init__(self, model_settings=model_settings)
+        self.batchSize = D.SIM_BATCH_SIZE if batch_size is None else batch_size
+        self.snapshots = None   # batches paused by simulate(until=...)
+
+    def simulate(self, function_to_populate_model=None, n=1,
+                 if_export_trajs=None, trajs_folder=None,
+                 seeds=None, weights=None, sample_seeds_by_weights=True, initial_seed=None,
+                 if_run_in_parallel=False, until=None, snapshots=None):
+        """
+        :param function_to_populate_model: (not used; the vectorized model builds itself)
+        :param n: number of epidemics to simulate
+        :param if_export_trajs: (bool) set to True to export simulated trajectories
+        :param trajs_folder: (string) folder to store the simulated trajectories to
+        :param seeds: (list) of seeds
+        :param weights: (list) probability weights over seeds
+        :param sample_seeds_by_weights: (bool) set to False to only use seeds with positive weights
+        :param initial_seed: (int) to initialize the seed of the RandomState that is used to generate the seeds of
+            simulated trajectories when seeds are not provided.
+        :param if_run_in_parallel: set to True to simulate batches in parallel
+        :param until: (float) time (in years) to pause the simulation at; if provided, the paused batches
+            are stored in self.snapshots (to be continued under different scenarios) and no outputs are exported
+        :param snapshots: (list) of paused batches (self.snapshots of another VectorizedMultiEpidemics)
+            to continue under the settings of this object (n and the arguments to generate seeds are not used)
+        """
+
+        if snapshots is None:
+            seed_generator = SeedGenerator(seeds=seeds, weights=weights)
+            initial_seed = 0 if initial_seed is None else initial_seed
+            seeds = seed_generator.next_seeds(
+                n=n, rng=RandomState(initial_seed), sample_by_weight=sample_seeds_by_weights)
+
+            # split trajectories into batches (at least one batch per processor if running in parallel)
+            n_batches = int(np.ceil(n / self.batchSize))
+            if if_run_in_parallel:
+                n_batches = max(n_batches, min(n, mp.cpu_count()))
+            batches = [BatchOfEpiModels(ids=ids.tolist(), settings=self.modelSets)
+                       for ids in np.array_split(np.arange(n), n_batches)]
+            function = simulate_this_batch
+            args = [(batch, [seeds[i] for i in batch.ids], until) for batch in batches]
+        else:
+            function = resume_this_batch
+            args = [(snapshot.get_branch(settings=self.modelSets), until) for snapshot in snapshots]
+
+        if not if_run_in_parallel:
+            simulated_batches = [function(*a) for a in args]
+        else:
+            pool = mp.Pool(mp.cpu_count())
+            simulated_batches = pool.starmap(function, args)
+            pool.close()
+
+        if until is not None:
+            self.snapshots = simulated_batches
+            return
+
+        if if_export_trajs is None:
+            if_export_trajs = self.modelSets.exportTrajectories
+        if trajs_folder is None:
+            trajs_folder = self.modelSets.folderToSaveTrajs
+
+        # all trajectories are exported into one trajectory store
+        if if_export_trajs:
+            write_trajectory_store(
+                ids=[id for batch in simulated_batches for id in batch.ids],
+                seeds=[seed for batch in simulated_batches for seed in batch.seeds],
+                list_of_columns=[batch.get_trajectories(i=i) for batch in simulated_batches for i in range(len(batch))],
+                directory=trajs_folder,
+                scenario=self.modelSets.scenario,
+                # run-time of a batch is shared equally among its trajectories
+                run_times=[batch.runTime / len(batch) for batch in simulated_batches for i in range(len(batch))])
+
+        for batch in simulated_batches:
+            self._extract_outputs(batch=batch)
+
+        self.multiModelOutputs.calculate_summary_stats()
+
+    def _extract_outputs(self, batch):
+        """ stores the id, seed, run-time, projected outcomes, and parameter values of simulated trajectories """
+
+        outputs = self.multiModelOutputs
+        for i in range(len(batch)):
+            outputs.ids.append(batch.ids[i])
+            outputs.seeds.append(batch.seeds[i])
+            outputs.ifFeasible.append(batch.ifFeasible[i])
+            # run-time of the batch is shared equally among its trajectories
+            outputs.runTimes.append(batch.runTime / len(batch))
+            if self.modelSets.storeProjectedOutcomes:
+                append_to_a_dict(existing_dict=outputs.dictOfProjectedOutcomes,
+                                 new_dict=batch.get_dic_of_intervention_utilization(i=i))
+            if self.modelSets.storeParameterValues:
+                outputs.listOfParamValues.append(batch.listOfParams[i].get_list_of_parameter_samples())
+                append_to_a_dict(existing_dict=outputs.dictParameterValues,
+                                 new_dict=batch.listOfParams[i].get_dic_of_parameter_samples())
+            outputs.lnL.append(batch.lnls[i])
+
+
+def simulate_this_batch(batch, seeds, until=None):
+
+    batch.simulate(seeds=seeds, until=until)
+    return batch
+
+
+def resume_this_batch(batch, until=None):
+
+    batch.resume(until=until)
+    return batch
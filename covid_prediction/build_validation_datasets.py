@@ -5,7 +5,7 @@ import warnings
 from build_training_datasets import build_and_combine_datasets
 from definitions import ROOT_DIR, SIM_DURATION, N_SIM_VALIDATION, N_SIM_TRAINING, \
     N_NOVEL_INCD, SCENARIOS, FIRST_WEEK_OF_PREDICTION_PERIOD, HOSP_OCCU_THRESHOLDS, WEEKS_TO_PREDICT, \
-    SMALLER_N_NOVEL_INCD
+    SMALLER_N_NOVEL_INCD, SIM_ENGINE, FEASIBILITY_PERIOD
 from simulate_many import simulate
 
 
@@ -32,13 +32,26 @@ def build_validation_datasets(weeks_to_predict):
     if len(seeds) <= N_SIM_TRAINING + N_SIM_VALIDATION:
         print('** Warning **: there is overlap between simulation trajectories used for training and validation.')
 
+    # with the numpy engine, the base and no mitigating strategies scenarios are identical until
+    # mitigating strategies could first be used (end of the feasibility period); so trajectories are
+    # simulated only once until then and both scenarios branch from this snapshot.
+    # (the scenario with no novel variant differs from time 0 and is simulated from the start)
+    snapshots = None
+    if SIM_ENGINE == 'numpy':
+        snapshots = simulate(n=N_SIM_VALIDATION,
+                             seeds=seeds[-N_SIM_VALIDATION:],
+                             sample_seeds_by_weights=False,
+                             print_summary_stats=False,
+                             until=FEASIBILITY_PERIOD)
+
     # simulate a new set of trajectories for validation
     simulate(n=N_SIM_VALIDATION,
              seeds=seeds[-N_SIM_VALIDATION:],
              n_to_display=N_SIM_VALIDATION,
              sample_seeds_by_weights=False,
              print_summary_stats=False,
-             folder_to_save_plots=ROOT_DIR + '/outputs/figures/scenarios/base')
+             folder_to_save_plots=ROOT_DIR + '/outputs/figures/scenarios/base',
+             snapshots=snapshots)
 
     # ---- build the dataset for the base scenario ----
     build_and_combine_datasets(
@@ -85,7 +98,8 @@ def build_validation_datasets(weeks_to_predict):
              sample_seeds_by_weights=False,
              mitigating_strategies_on=False,
              print_summary_stats=False,
-             folder_to_save_plots=ROOT_DIR + '/outputs/figures/scenarios/no_mitigation')
+             folder_to_save_plots=ROOT_DIR + '/outputs/figures/scenarios/no_mitigation',
+             snapshots=snapshots)
     # build the dataset
     build_and_combine_datasets(
         name_of_dataset='data-validating ' + SCENARIOS['no control measure'],
@@ -1,7 +1,12 @@
+import copy
 import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
 from deampy.in_out_functions import write_csv
 from deampy.statistics import SummaryStat
-from sklearn.model_selection import cross_val_score
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import check_cv, cross_val_score
 from sklearn.neural_network import MLPRegressor
 from sklearn.tree import DecisionTreeClassifier
 
@@ -9,6 +14,9 @@ from covid_prediction.pre_process import PreProcessor
 from covid_prediction.prediction_models import DecisionTree
 
 MAX_PROCESSES = mp.cpu_count()  # maximum number of processors
+# if fitted decision trees can be pruned with another ccp alpha (with the private method that sklearn
+# uses to prune trees after growing them); otherwise, trees are fitted again with each ccp alpha
+IF_PRUNE_FITTED_TREES = hasattr(DecisionTreeClassifier, '_prune_tree')
 
 
 class _CrossValidSummary:
@@ -98,6 +106,10 @@ class _CrossValidator:
         self.scoring = scoring
         self.performanceSummary = None
 
+    def get_performance_summaries(self):
+        """ :returns (list) of performance summaries of the specifications evaluated by this cross validator """
+        return [self.performanceSummary]
+
     def _do_cross_validation(self, model):
         """
         performs cross validation on the provided model
@@ -166,7 +178,7 @@ class DecTreeCrossValidator(_CrossValidator):
 
     def __init__(self, preprocessed_data, cv_fold, scoring,
                  feature_selection_method=None, n_features_wanted=None,
-                 max_depth=None, ccp_alpha=0.0):
+                 max_depth=None, ccp_alpha=0.0, full_data_trees=None):
         """
         :param preprocessed_data: (PreProcessor)
         :param n_features_wanted: (int or None)
@@ -175,6 +187,8 @@ class DecTreeCrossValidator(_CrossValidator):
         :param feature_selection_method: (string or None) 'rfe', 'lasso', or 'pi'
         :param max_depth: (int) maximum depth of the decision tree
         :param ccp_alpha: (float) Complexity parameter used for Minimal Cost-Complexity Pruning
+        :param full_data_trees: (FullDataTrees) trees fitted on the entire preprocessed dataset
+            (shared by the cross validators of a parameter optimizer; if None, trees are not shared)
         """
 
         _CrossValidator.__init__(self,
@@ -185,10 +199,25 @@ class DecTreeCrossValidator(_CrossValidator):
 
         self.maxDepth = max_depth
         self.ccpAlpha = ccp_alpha
+        self.fullDataTrees = FullDataTrees(preprocessed_data) if full_data_trees is None else full_data_trees
 
     def go(self):
         """ performs cross validation and calculates the scores """
 
+        self.cross_validate(selected_features=self.get_selected_features())
+
+    def get_selected_features(self):
+        """ :returns (list) of the features selected by the tree fitted on the entire dataset """
+
+        # the strongest features of the tree fitted on the entire dataset
+        tree = self.fullDataTrees.get_tree(ccp_alpha=self.ccpAlpha, max_depth=self.maxDepth)
+        return [self.preProcessedData.featureName[i] for i, v in enumerate(tree.feature_importances_) if v > 0]
+
+    def cross_validate(self, selected_features):
+        """ performs cross validation with the selected features and calculates the scores
+        :param selected_features: (list) of features to use
+        """
+
         # make a performance object
         self.performanceSummary = DecTreeCVSummary(
             n_features=self.nFeatures, max_depth=self.maxDepth, ccp_alpha=self.ccpAlpha)
@@ -196,15 +225,6 @@ class DecTreeCrossValidator(_CrossValidator):
         # construct a decision tree model
         model = DecisionTreeClassifier(max_depth=self.maxDepth, ccp_alpha=self.ccpAlpha, random_state=0)
 
-        # fit the model to find the strongest features on the entire dataset
-        model.fit(X=self.preProcessedData.X, y=self.preProcessedData.y)
-
-        # get selected features
-        selected_features = []
-        for i, v in enumerate(model.feature_importances_):
-            if v > 0:
-                selected_features.append(self.preProcessedData.featureName[i])
-
         # update selected features and predictors
         self.preProcessedData.update_selected_features(selected_features=selected_features)
 
@@ -220,12 +240,419 @@ class DecTreeCrossValidator(_CrossValidator):
                                                    selected_features=self.preProcessedData.selectedFeatureNames)
 
 
-def run_this_cross_validator(cross_validator, i):
-    """ helper function for parallelization (the extra argument i is needed to prevent errors) """
+class DecTreeAlphaSweepCrossValidator(_CrossValidator):
+    """ class to run cross validation on decision tree models with different ccp alphas
+    (for each fold, one unpruned tree is grown and the trees of all ccp alphas are pruned from it) """
+
+    def __init__(self, preprocessed_data, cv_fold, scoring, list_of_ccp_alphas,
+                 feature_selection_method=None, n_features_wanted=None, max_depth=None, full_data_trees=None):
+        """
+        :param preprocessed_data: (PreProcessor)
+        :param n_features_wanted: (int or None)
+        :param cv_fold: (int) number of cross validation folds
+        :param scoring: (string) from: https://scikit-learn.org/stable/modules/model_evaluation.html#scoring-parameter
+        :param list_of_ccp_alphas: (list) of complexity parameters used for Minimal Cost-Complexity Pruning
+        :param feature_selection_method: (string or None) 'rfe', 'lasso', or 'pi'
+        :param max_depth: (int) maximum depth of the decision tree
+        :param full_data_trees: (FullDataTrees) trees fitted on the entire preprocessed dataset
+            (shared by the cross validators of a parameter optimizer; if None, trees are not shared)
+        """
+
+        _CrossValidator.__init__(self,
+                                 preprocessed_data=preprocessed_data,
+                                 n_features_wanted=n_features_wanted,
+                                 feature_selection_method=feature_selection_method,
+                                 cv_fold=cv_fold, scoring=scoring)
+
+        self.maxDepth = max_depth
+        self.ccpAlphas = list_of_ccp_alphas
+        self.fullDataTrees = FullDataTrees(preprocessed_data) if full_data_trees is None else full_data_trees
+        self.performanceSummaries = None
+
+    def get_performance_summaries(self):
+        return self.performanceSummaries
+
+    def go(self):
+        """ performs cross validation and calculates the scores for all ccp alphas
+        (the scores are the same as those of DecTreeCrossValidator for each ccp alpha) """
+
+        list_of_selected_features = self.get_selected_features()
+
+        # cross-validation (trees of ccp alphas that select the same features
+        # are pruned from the same unpruned tree of each fold)
+        list_of_scores = [[] for alpha in self.ccpAlphas]
+        for selected_features in _get_unique(list_of_selected_features):
+            for fold in range(self.get_n_folds()):
+                for k, score in self.get_fold_scores(selected_features=selected_features,
+                                                     list_of_selected_features=list_of_selected_features,
+                                                     fold=fold).items():
+                    list_of_scores[k].append(score)
+
+        self.set_performance_summaries(list_of_selected_features=list_of_selected_features,
+                                       list_of_scores=list_of_scores)
+
+    def get_n_folds(self):
+        """ :returns (int) number of cross validation folds """
+        return check_cv(self.cvFold, y=self.preProcessedData.y, classifier=True).get_n_splits()
+
+    def get_selected_features(self):
+        """ :returns (list) of the features selected by the tree of each ccp alpha fitted on the entire dataset """
+
+        list_of_selected_features = []
+        for alpha in self.ccpAlphas:
+            tree = self.fullDataTrees.get_tree(ccp_alpha=alpha, max_depth=self.maxDepth)
+            list_of_selected_features.append(
+                [self.preProcessedData.featureName[i] for i, v in enumerate(tree.feature_importances_) if v > 0])
+        return list_of_selected_features
+
+    def get_fold_scores(self, selected_features, list_of_selected_features, fold):
+        """ fits an unpruned tree on the training set of a fold
+        :param selected_features: (list) of features to use
+        :param list_of_selected_features: (list) of the features selected by the tree of each ccp alpha
+        :param fold: (int) index of the fold
+        :returns (dictionary) index of ccp alpha -> score of its tree on the test set of the fold
+            (for ccp alphas that select the specified features) """
+
+        # update selected features and predictors
+        self.preProcessedData.update_selected_features(selected_features=selected_features)
+        X, y = self.preProcessedData.selectedX, self.preProcessedData.y
+
+        model = self._get_model()
+        train, test = list(check_cv(self.cvFold, y=y, classifier=True).split(X, y))[fold]
+        unpruned_tree = model.fit(X[train], y[train])
+        scorer = check_scoring(model, scoring=self.scoring)
+
+        scores = {}
+        for k, alpha in enumerate(self.ccpAlphas):
+            if list_of_selected_features[k] == selected_features:
+                pruned_tree = _get_pruned_tree(unpruned_tree=unpruned_tree, ccp_alpha=alpha, X=X[train], y=y[train])
+                scores[k] = scorer(pruned_tree, X[test], y[test])
+        return scores
+
+    def set_performance_summaries(self, list_of_selected_features, list_of_scores):
+        """ stores the performance of the specification of each ccp alpha
+        :param list_of_selected_features: (list) of the features selected by the tree of each ccp alpha
+        :param list_of_scores: (list) of the scores of folds for each ccp alpha
+        """
+
+        self.performanceSummaries = []
+        for k, alpha in enumerate(self.ccpAlphas):
+            summary = DecTreeCVSummary(n_features=self.nFeatures, max_depth=self.maxDepth, ccp_alpha=alpha)
+            summary.add_cv_performance(scores=np.array(list_of_scores[k]),
+                                       selected_features=list_of_selected_features[k])
+            self.performanceSummaries.append(summary)
+
+    def _get_model(self):
+        """ :returns an unpruned decision tree model """
+        return DecisionTreeClassifier(max_depth=self.maxDepth, random_state=0)
+
+
+class FullDataTrees:
+    """ decision trees fitted on the entire preprocessed dataset for each (ccp alpha, max depth)
+    (one unpruned tree is grown for each max depth and the tree of each ccp alpha is pruned from it,
+    so that a tree is never grown twice for feature selection) """
+
+    def __init__(self, preprocessed_data):
+        """
+        :param preprocessed_data: (PreProcessor)
+        """
+
+        self.preProcessedData = preprocessed_data
+        self._unprunedTrees = {}  # max depth -> unpruned tree
+        self._trees = {}  # (ccp alpha, max depth) -> tree
+
+    def has_unpruned_tree(self, max_depth):
+        """ :returns if the unpruned tree of this max depth is grown """
+        return max_depth in self._unprunedTrees
+
+    def add_unpruned_tree(self, max_depth, unpruned_tree):
+        """ stores the unpruned tree of a max depth (e.g. grown in another process)
+        :param max_depth: (int) maximum depth of the decision tree
+        :param unpruned_tree: (DecisionTreeClassifier) unpruned tree fitted on the entire dataset
+        """
+        self._unprunedTrees[max_depth] = unpruned_tree
+
+    def get_tree(self, ccp_alpha, max_depth):
+        """
+        :param ccp_alpha: (float) complexity parameter used for Minimal Cost-Complexity Pruning
+        :param max_depth: (int) maximum depth of the decision tree
+        :returns (DecisionTreeClassifier) the tree with this ccp alpha and max depth fitted on the entire dataset
+        """
+
+        if (ccp_alpha, max_depth) not in self._trees:
+            if max_depth not in self._unprunedTrees:
+                self._unprunedTrees[max_depth] = _fit_unpruned_tree(
+                    X=self.preProcessedData.X, y=self.preProcessedData.y, max_depth=max_depth)
+            self._trees[ccp_alpha, max_depth] = _get_pruned_tree(
+                unpruned_tree=self._unprunedTrees[max_depth], ccp_alpha=ccp_alpha,
+                X=self.preProcessedData.X, y=self.preProcessedData.y)
+
+        return self._trees[ccp_alpha, max_depth]
+
+
+def _fit_unpruned_tree(X, y, max_depth):
+    """ :returns (DecisionTreeClassifier) an unpruned decision tree fitted on X and y """
+    return DecisionTreeClassifier(max_depth=max_depth, random_state=0).fit(X=X, y=y)
+
+
+def _get_pruned_tree(unpruned_tree, ccp_alpha, X, y):
+    """ :returns a copy of a fitted unpruned decision tree pruned with Minimal Cost-Complexity Pruning
+    (this is the tree that is fitted to the same data with this ccp alpha since sklearn grows the
+    unpruned tree and then prunes it; if fitted trees cannot be pruned, the tree is fitted with this
+    ccp alpha to X and y, the data the unpruned tree is fitted to) """
+
+    if not IF_PRUNE_FITTED_TREES:
+        return copy.deepcopy(unpruned_tree).set_params(ccp_alpha=ccp_alpha).fit(X=X, y=y)
+
+    tree = copy.deepcopy(unpruned_tree)
+    tree.set_params(ccp_alpha=ccp_alpha)
+    tree._prune_tree()
+    return tree
+
+
+def _get_unique(lists):
+    """ :returns (list) of unique lists in the order they first appear """
+
+    unique = []
+    for l in lists:
+        if l not in unique:
+            unique.append(l)
+    return unique
+
+
+class _SharedDataset:
+    """ X and y of a preprocessed dataset placed in shared memory once, so that worker processes
+    receive a handle to them instead of a pickled copy of the dataset for each cross validator """
+
+    def __init__(self, preprocessed_data):
+        """
+        :param preprocessed_data: (PreProcessor)
+        """
+
+        self._memories = []
+        self.handle = {'feature names': list(preprocessed_data.featureName), 'arrays': {}}
+        for name, values in (('X', preprocessed_data.X), ('y', preprocessed_data.y)):
+            values = np.ascontiguousarray(values)
+            memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=memory.buf)[:] = values
+            self._memories.append(memory)
+            self.handle['arrays'][name] = (memory.name, values.shape, values.dtype.str)
+
+    def release(self):
+        """ frees the shared memory """
 
-    # simulate and return the cohort
-    cross_validator.go()
-    return cross_validator
+        for memory in self._memories:
+            memory.close()
+            memory.unlink()
+
+
+class _SharedPreProcessedData:
+    """ the preprocessed data used by cross validators in a worker process
+    (X and y are attached from the shared memory of a _SharedDataset) """
+
+    def __init__(self, handle):
+        """
+        :param handle: (dictionary) handle of a _SharedDataset
+        """
+
+        self._memories = []
+        arrays = {}
+        for name, (memory_name, shape, dtype) in handle['arrays'].items():
+            memory = shared_memory.SharedMemory(name=memory_name)
+            self._memories.append(memory)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+        self.X = arrays['X']
+        self.y = arrays['y']
+        self.featureName = handle['feature names']
+
+        # selected features and X after feature selection
+        self.selectedFeatureNames = None
+        self.selectedX = None
+
+    def update_selected_features(self, selected_features):
+        """ update the selected feature names and the selectedX (see PreProcessor)
+        :param selected_features: (list) of selected feature names
+        """
+
+        self.selectedFeatureNames = selected_features
+        self.selectedX = self.X[:, [self.featureName.index(f) for f in selected_features]]
+
+    def close(self):
+        """ detaches from the shared memory """
+
+        self.X = self.y = self.selectedX = None
+        for memory in self._memories:
+            memory.close()
+
+
+def run_this_cross_validator(cross_validator, handle):
+    """ helper function for parallelization: runs a cross validator and returns its performance summaries
+    :param cross_validator: (_CrossValidator) with no preprocessed data if handle is not None
+    :param handle: (dictionary) handle of the _SharedDataset (if None, the data of the cross validator is used)
+    """
+
+    return _run_this_task(cross_validator=cross_validator, handle=handle, method_name='go', kwargs={})
+
+
+def get_pool(initializer=None, initargs=()):
+    """
+    :param initializer: (function) to call when each process starts (e.g. to read datasets)
+    :param initargs: (tuple) arguments of the initializer
+    :returns (multiprocessing.Pool) of MAX_PROCESSES processes to run cross validators in
+    (the resource tracker of this process is started first so that processes that attach to
+    datasets in shared memory report to it rather than to trackers of their own, which would
+    remove the shared memory when the processes exit)
+    """
+
+    resource_tracker.ensure_running()
+    return mp.Pool(MAX_PROCESSES, initializer=initializer, initargs=initargs)
+
+
+def _run_this_task(cross_validator, handle, method_name, kwargs):
+    """ helper function for parallelization: runs a task of a cross validator
+    :param cross_validator: (_CrossValidator) with no preprocessed data if handle is not None
+    :param handle: (dictionary) handle of the _SharedDataset (if None, the data of the cross validator is used)
+    :param method_name: (string) name of the method of the cross validator to run
+    :param kwargs: (dictionary) arguments of the method
+    :returns what the method returns (or the performance summaries of the cross validator
+        if the method does not return anything, e.g. 'go')
+    """
+
+    if handle is not None:
+        data = _SharedPreProcessedData(handle=handle)
+        cross_validator.preProcessedData = data
+    try:
+        result = getattr(cross_validator, method_name)(**kwargs)
+        return cross_validator.get_performance_summaries() if result is None else result
+    finally:
+        if handle is not None:
+            data.close()
+
+
+def _fit_this_unpruned_tree(handle, max_depth):
+    """ helper function for parallelization: fits an unpruned tree on the dataset in shared memory
+    :param handle: (dictionary) handle of the _SharedDataset
+    :param max_depth: (int) maximum depth of the decision tree
+    :returns (DecisionTreeClassifier) the unpruned tree
+    """
+
+    data = _SharedPreProcessedData(handle=handle)
+    try:
+        return _fit_unpruned_tree(X=data.X, y=data.y, max_depth=max_depth)
+    finally:
+        data.close()
+
+
+def _run_tasks(tasks, pool):
+    """ runs tasks (see _run_this_task) in the pool (or in this process if pool is None)
+    :returns (list) of what tasks return (in the order of tasks)
+    """
+
+    if pool is None:
+        return [_run_this_task(*task) for task in tasks]
+    else:
+        # tasks are handed out one at a time so that all processes stay busy until the last task
+        return pool.starmap(_run_this_task, tasks, chunksize=1)
+
+
+def run_dec_tree_parameter_optimizers(parameter_optimizers, pool=None):
+    """ runs cross validation of several decision tree parameter optimizers (e.g. for different model
+    specifications, thresholds, and prediction horizons) as one set of tasks, so that the folds of
+    one optimizer do not wait for other optimizers to finish:
+        1) for each max depth of each optimizer, an unpruned tree is grown on the entire dataset
+            (the features selected by the tree of each ccp alpha are found from it, see FullDataTrees),
+        2) for each set of selected features of all optimizers, each fold is a task where one unpruned tree
+            is grown and the trees of all ccp alphas that select these features are pruned from it
+            (cross validators that do not sweep ccp alphas are one task each).
+    :param parameter_optimizers: (list) of DecTreeParameterOptimizer
+    :param pool: (multiprocessing.Pool) to run tasks in (if None, tasks are run in this process)
+    """
+
+    cross_validators, handles = [], []
+    shared_datasets = []
+    try:
+        for optimizer in parameter_optimizers:
+            if pool is None:
+                handle = None
+            else:
+                # place the preprocessed data in shared memory once
+                shared_datasets.append(_SharedDataset(preprocessed_data=optimizer.preprocessedData))
+                handle = shared_datasets[-1].handle
+            for cv in optimizer.crossValidators:
+                cross_validators.append(cv)
+                handles.append(handle)
+
+        # step 1: unpruned trees on the entire datasets
+        # (if run in this process, trees are grown when selected features are first needed)
+        if pool is not None:
+            args, trees_to_add = [], []
+            for optimizer, shared_dataset in zip(parameter_optimizers, shared_datasets):
+                for max_depth in _get_unique([cv.maxDepth for cv in optimizer.crossValidators]):
+                    if not optimizer.fullDataTrees.has_unpruned_tree(max_depth=max_depth):
+                        args.append((shared_dataset.handle, max_depth))
+                        trees_to_add.append(optimizer.fullDataTrees)
+            for full_data_trees, (handle, max_depth), unpruned_tree in zip(
+                    trees_to_add, args, pool.starmap(_fit_this_unpruned_tree, args, chunksize=1)):
+                full_data_trees.add_unpruned_tree(max_depth=max_depth, unpruned_tree=unpruned_tree)
+
+        # selected features (of each ccp alpha for cross validators that sweep ccp alphas)
+        selected_features = [cv.get_selected_features() for cv in cross_validators]
+
+        # cross validators are passed to processes without the preprocessed data and trees
+        if pool is None:
+            passed_cross_validators = cross_validators
+        else:
+            passed_cross_validators = []
+            for cv in cross_validators:
+                cv_without_data = copy.copy(cv)
+                cv_without_data.preProcessedData = None
+                cv_without_data.fullDataTrees = None
+                passed_cross_validators.append(cv_without_data)
+
+        # step 2: folds
+        tasks, indices = [], []
+        for i, cv in enumerate(cross_validators):
+            if isinstance(cv, DecTreeAlphaSweepCrossValidator):
+                for features in _get_unique(selected_features[i]):
+                    for fold in range(cv.get_n_folds()):
+                        tasks.append((passed_cross_validators[i], handles[i], 'get_fold_scores',
+                                      {'selected_features': features,
+                                       'list_of_selected_features': selected_features[i],
+                                       'fold': fold}))
+                        indices.append(i)
+            else:
+                tasks.append((passed_cross_validators[i], handles[i], 'cross_validate',
+                              {'selected_features': selected_features[i]}))
+                indices.append(i)
+        results = _run_tasks(tasks=tasks, pool=pool)
+
+    finally:
+        for shared_dataset in shared_datasets:
+            shared_dataset.release()
+
+    # scores of each ccp alpha (in the order of folds) of cross validators that sweep ccp alphas
+    # and performance summaries of other cross validators
+    dict_of_scores, dict_of_summaries = {}, {}
+    for i, result in zip(indices, results):
+        if isinstance(cross_validators[i], DecTreeAlphaSweepCrossValidator):
+            list_of_scores = dict_of_scores.setdefault(i, [[] for alpha in cross_validators[i].ccpAlphas])
+            for k, score in result.items():
+                list_of_scores[k].append(score)
+        else:
+            dict_of_summaries[i] = result
+
+    # store performance summaries
+    i = 0
+    for optimizer in parameter_optimizers:
+        for cv in optimizer.crossValidators:
+            if isinstance(cv, DecTreeAlphaSweepCrossValidator):
+                cv.set_performance_summaries(list_of_selected_features=selected_features[i],
+                                             list_of_scores=dict_of_scores[i])
+                optimizer.crossValidationSummaries.extend(cv.get_performance_summaries())
+            else:
+                optimizer.crossValidationSummaries.extend(dict_of_summaries[i])
+            i += 1
 
 
 class _ParameterOptimizer:
@@ -251,25 +678,34 @@ class _ParameterOptimizer:
                                          if_standardize=if_standardize,
                                          balance_binary_outcome=balance_binary_outcome)
 
-    def _run(self, run_in_parallel):
-        """ runs cross validation over all combinations of parameters """
+    def _run(self, run_in_parallel, pool=None):
+        """ runs cross validation over all combinations of parameters
+        :param run_in_parallel: (bool) set to True to run the cross validation in parallel
+        :param pool: (multiprocessing.Pool) to run the cross validation in
+            (if None, a pool is created to run the cross validation in parallel)
+        """
 
         if run_in_parallel:
 
-            # create a list of arguments
-            args = [(cv, 0) for cv in self.crossValidators]
+            # cross validators are passed with their preprocessed data (the dataset is handed to processes
+            # through shared memory only for decision trees, see run_dec_tree_parameter_optimizers,
+            # since _SharedPreProcessedData does not implement the feature selection of other cross validators)
+            args = [(cv, None) for cv in self.crossValidators]
 
             # run all
-            with mp.Pool(MAX_PROCESSES) as pl:
-                analyzed_cross_validators = pl.starmap(run_this_cross_validator, args)
+            if pool is None:
+                with get_pool() as pl:
+                    list_of_summaries = pl.starmap(run_this_cross_validator, args)
+            else:
+                list_of_summaries = pool.starmap(run_this_cross_validator, args)
 
-            for cv in analyzed_cross_validators:
-                self.crossValidationSummaries.append(cv.performanceSummary)
+            for summaries in list_of_summaries:
+                self.crossValidationSummaries.extend(summaries)
 
         else:
             for cv in self.crossValidators:
                 cv.go()
-                self.crossValidationSummaries.append(cv.performanceSummary)
+                self.crossValidationSummaries.extend(cv.get_performance_summaries())
 
     def _save_results(self, summary, best_spec, save_to_file_performance, save_to_file_features):
         """
@@ -330,16 +766,19 @@ class NeuralNetParameterOptimizer(_ParameterOptimizer):
                             feature_selection_method=feature_selection_method,
                             cv_fold=cv_fold, scoring=scoring))
 
-    def find_best_parameters(self, run_in_parallel=False, save_to_file_performance=None, save_to_file_features=None):
+    def find_best_parameters(self, run_in_parallel=False, save_to_file_performance=None, save_to_file_features=None,
+                             pool=None):
         """ find the best specification for the neural network model
         :param run_in_parallel: (bool) set to True to run the cross validation in parallel
         :param save_to_file_performance: (string) filename where the performance results should be saved.
         :param save_to_file_features: (string) filename where the selected features should be saved
+        :param pool: (multiprocessing.Pool) to run the cross validation in if run_in_parallel is True
+            (if None, a pool is created)
         :return: the best specification
         """
 
         # run
-        self._run(run_in_parallel=run_in_parallel)
+        self._run(run_in_parallel=run_in_parallel, pool=pool)
 
         # find the best specification
         best_spec = None
@@ -363,7 +802,8 @@ class DecTreeParameterOptimizer(_ParameterOptimizer):
 
     def __init__(self, df, feature_names, outcome_name,
                  list_of_n_features_wanted=None, list_of_max_depths=None, list_of_ccp_alphas=None,
-                 feature_selection_method=None, cv_fold=10, error_tolerance=0.01, scoring=None):
+                 feature_selection_method=None, cv_fold=10, error_tolerance=0.01, scoring=None,
+                 if_sweep_alphas=True):
         """
         :param df: (panda DataFrame)
         :param feature_names: (list) of feature names to be included in the analysis
@@ -376,6 +816,8 @@ class DecTreeParameterOptimizer(_ParameterOptimizer):
         :param error_tolerance: (float) a tree with lower accuracy than but pruner than the optimal tree
             would be selected if it's accuracy is within error_tolerance of the accuracy of the optimal tree.
         :param scoring: (string) from: https://scikit-learn.org/stable/modules/model_evaluation.html#scoring-parameter
+        :param if_sweep_alphas: (bool) set True to evaluate all ccp alphas from one unpruned tree per fold
+            (otherwise, a tree is fitted and cross-validated for each ccp alpha separately)
         """
 
         _ParameterOptimizer.__init__(self, df=df,
@@ -386,6 +828,8 @@ class DecTreeParameterOptimizer(_ParameterOptimizer):
                                      balance_binary_outcome=True)
 
         self.errorTolerance = error_tolerance
+        # trees fitted on the entire dataset (shared by all cross validators)
+        self.fullDataTrees = FullDataTrees(preprocessed_data=self.preprocessedData)
 
         if list_of_n_features_wanted is None:
             list_of_n_features_wanted = [None]
@@ -394,24 +838,54 @@ class DecTreeParameterOptimizer(_ParameterOptimizer):
 
         for n_fs in list_of_n_features_wanted:
             for max_depth in list_of_max_depths:
-                for alpha in list_of_ccp_alphas:
+                if if_sweep_alphas:
                     self.crossValidators.append(
-                        DecTreeCrossValidator(
+                        DecTreeAlphaSweepCrossValidator(
                             preprocessed_data=self.preprocessedData,
                             feature_selection_method=feature_selection_method,
                             n_features_wanted=n_fs, cv_fold=cv_fold,
-                            scoring=scoring, max_depth=max_depth, ccp_alpha=alpha))
-
-    def find_best_parameters(self, run_in_parallel=False, save_to_file_performance=None, save_to_file_features=None):
+                            scoring=scoring, max_depth=max_depth, list_of_ccp_alphas=list_of_ccp_alphas,
+                            full_data_trees=self.fullDataTrees))
+                else:
+                    for alpha in list_of_ccp_alphas:
+                        self.crossValidators.append(
+                            DecTreeCrossValidator(
+                                preprocessed_data=self.preprocessedData,
+                                feature_selection_method=feature_selection_method,
+                                n_features_wanted=n_fs, cv_fold=cv_fold,
+                                scoring=scoring, max_depth=max_depth, ccp_alpha=alpha,
+                                full_data_trees=self.fullDataTrees))
+
+    def find_best_parameters(self, run_in_parallel=False, save_to_file_performance=None, save_to_file_features=None,
+                             pool=None):
         """ find the best specification for the neural network model
         :param run_in_parallel: (bool) set to True to run the cross validation in parallel
         :param save_to_file_performance: (string) filename where the performance results should be saved.
         :param save_to_file_features: (string) filename where the selected features should be saved
+        :param pool: (multiprocessing.Pool) to run the cross validation in if run_in_parallel is True
+            (if None, a pool is created)
         :return: the best specification
         """
 
         # run
-        self._run(run_in_parallel=run_in_parallel)
+        if run_in_parallel and pool is not None:
+            run_dec_tree_parameter_optimizers(parameter_optimizers=[self], pool=pool)
+        elif run_in_parallel:
+            with get_pool() as pl:
+                run_dec_tree_parameter_optimizers(parameter_optimizers=[self], pool=pl)
+        else:
+            run_dec_tree_parameter_optimizers(parameter_optimizers=[self])
+
+        return self.select_best_parameters(save_to_file_performance=save_to_file_performance,
+                                           save_to_file_features=save_to_file_features)
+
+    def select_best_parameters(self, save_to_file_performance=None, save_to_file_features=None):
+        """ find the best specification for the decision tree model from the results of cross validation
+        (see run_dec_tree_parameter_optimizers)
+        :param save_to_file_performance: (string) filename where the performance results should be saved.
+        :param save_to_file_features: (string) filename where the selected features should be saved
+        :return: the best specification
+        """
 
         # find the best specification
         best_spec = None
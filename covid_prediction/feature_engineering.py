@@ -1,77 +1,187 @@
-import numpy as np
+import hashlib
+import json
+import multiprocessing as mp
 import os
+
+import numpy as np
 import pandas as pd
 from deampy.in_out_functions import write_csv
-from math import sqrt
-from numpy.random import RandomState
 from pathlib import Path
 from scipy.stats import pearsonr
 
-from definitions import HOSP_OCCUPANCY_IN_TRAJ_FILE, OUTCOME_NAME_IN_DATASET, get_outcome_label
+from covid_model.parameter_store import ParameterStore
+from covid_model.trajectory_store import TrajectoryStore
+from definitions import FE_N_WORKERS, HOSP_OCCUPANCY_IN_TRAJ_FILE, OUTCOME_NAME_IN_DATASET, get_outcome_label
 
 
 class ErrorModel:
 
-    def __init__(self, survey_size=None, weeks_delay=0):
+    def __init__(self, survey_size=None, weeks_delay=0, seed=1):
         """
         :param survey_size: (int) sample size 
         :param weeks_delay: (int) weeks of delay
+        :param seed: (int) seed of this error model (the survey noise of a feature in each trajectory is drawn
+            from a random stream derived from this seed, the name of the feature, and the seed of the trajectory)
         """
 
         self.surveySize = survey_size
         self.weeksDelay = weeks_delay
-        self.rnd = RandomState(1)
+        self.seed = seed
 
-    def get_obs(self, true_values):
+    def get_obs(self, true_values, seeds, feature_name):
         """
-        :param true_values: (list) time-series of true values
-        :return: observed value (with noise and bias added)
+        :param true_values: (np.array) time-series of true values of trajectories [trajectory, recording]
+        :param seeds: (list) seed of each trajectory
+        :param feature_name: (string) name of the feature observed with this error model
+            (features observed with the same error model have independent noise)
+        :return: (np.array) observed values (with noise and delay) [trajectory, recording]
+            (nan if not observed yet because of the delay)
         """
 
-        # which true value to use
-        y = None
-        if self.weeksDelay > 0:
-            # the value with delay
-            if len(true_values) > self.weeksDelay:
-                y = true_values[-self.weeksDelay-1]
-        else:
-            # last true value
-            y = true_values[-1]
+        observed_values = np.full(true_values.shape, np.nan)
 
-        if y is not None:
-            noise = self.get_noise(true_value=y, n=self.surveySize)
-            return min(max(y + noise, 0), 1)
-        else:
-            return None
+        # the value with delay
+        y = true_values[:, :true_values.shape[1] - self.weeksDelay]
+        observed_values[:, self.weeksDelay:] = y + self.get_noise(
+            true_values=y, seeds=seeds, n=self.surveySize, key=_get_stream_key(feature_name))
+
+        return np.clip(observed_values, 0, 1)
 
-    def get_noise(self, true_value, n):
+    def get_noise(self, true_values, seeds, n, key):
 
         if n is None:
             return 0
         else:
-            st_dev = sqrt(true_value * (1 - true_value) / n)
-            return self.rnd.normal(loc=0, scale=st_dev)
+            st_dev = np.sqrt(true_values * (1 - true_values) / n)
+            z = np.array([np.random.default_rng([self.seed, key, seed]).standard_normal(true_values.shape[1])
+                          for seed in seeds]).reshape(true_values.shape)
+            return st_dev * z
+
+
+def _get_stream_key(name):
+    """ :returns (int) a key of the random stream of a feature derived from its name
+    (unlike hash(), it is the same in every process) """
+
+    return int(hashlib.sha1(name.encode()).hexdigest()[:8], 16)
+
+
+def _get_error_model(info):
+    """ :returns the error model of a feature (None if the feature is observed without error) """
+
+    if isinstance(info, tuple):
+        for v in info:
+            if isinstance(v, ErrorModel):
+                return v
+    return None
+
+
+def _get_spec_hash(weeks_to_predict, hosp_thresholds, list_of_weeks_of_pred_period,
+                   info_of_incd_fs, info_of_prev_fs):
+    """ :returns (string) a hash of the specification of incidence and prevalence features and outcomes
+    (including the configuration of error models) """
+
+    def get_spec(info):
+        if isinstance(info, tuple):
+            return [vars(v) if isinstance(v, ErrorModel) else v for v in info]
+        return info
+
+    spec = {'weeks to predict': weeks_to_predict,
+            'thresholds': list(hosp_thresholds),
+            'prediction periods': [list(w) for w in list_of_weeks_of_pred_period],
+            'incidence features': [get_spec(info) for info in info_of_incd_fs],
+            'prevalence features': [get_spec(info) for info in info_of_prev_fs],
+            # (rows cached before the noise of error models was drawn for each feature are not reused)
+            'noise streams': 'error model, feature, trajectory'}
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=int).encode()).hexdigest()[:16]
+
+
+def _get_row_blocks(dir_of_trajs, weeks_to_predict, hosp_thresholds, trajs,
+                    list_of_weeks_of_pred_period, info_of_incd_fs, info_of_prev_fs):
+    """ gets the row blocks of a shard of trajectories in a worker process
+    (see FeatureEngineering._get_row_blocks) """
+
+    feature_engineer = FeatureEngineering(dir_of_trajs=dir_of_trajs,
+                                          weeks_of_pred_period=None,
+                                          weeks_to_predict=weeks_to_predict,
+                                          hosp_thresholds=hosp_thresholds)
+    return feature_engineer._get_row_blocks(trajs=trajs,
+                                            list_of_weeks_of_pred_period=list_of_weeks_of_pred_period,
+                                            info_of_incd_fs=info_of_incd_fs,
+                                            info_of_prev_fs=info_of_prev_fs)
+
+
+class _RowCache:
+    """ cache of the row blocks of trajectories for one specification of features
+    (rows of a trajectory are keyed by a digest of its id, seed, and the time-series used, so
+    trajectories of different scenarios with the same ids are cached separately) """
+
+    def __init__(self, file_name):
+        """
+        :param file_name: (Path) file of the cache (the cache is empty if the file does not exist)
+        """
+
+        self.fileName = file_name
+        if file_name.exists():
+            with np.load(file_name) as cache:
+                self.digests = cache['digests']
+                self.blocks = [cache['f_values'], cache['hosp_max'], cache['if_passed']]
+        else:
+            self.digests = np.zeros(0, dtype='S20')
+            self.blocks = None
+
+    def get_index(self, digests):
+        """ :returns (np.array) index of the rows of each trajectory in the cache
+            (-1 if the trajectory is new or has changed since rows were cached) """
+
+        return pd.Index(self.digests).get_indexer(digests)
+
+    def add(self, digests, blocks):
+        """ adds the row blocks of trajectories and saves the cache
+        :param digests: (np.array) digests of trajectories
+        :param blocks: row blocks of trajectories (see FeatureEngineering._get_row_blocks)
+        """
+
+        self.digests = np.concatenate([self.digests, digests])
+        if self.blocks is None:
+            self.blocks = list(blocks)
+        else:
+            self.blocks = [np.concatenate([cached, new], axis=1) for cached, new in zip(self.blocks, blocks)]
+
+        self.fileName.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self.fileName) + '.tmp', 'wb') as file:
+            np.savez(file, digests=self.digests,
+                     f_values=self.blocks[0], hosp_max=self.blocks[1], if_passed=self.blocks[2])
+        os.replace(str(self.fileName) + '.tmp', self.fileName)
 
 
 class FeatureEngineering:
     def __init__(self, dir_of_trajs, weeks_of_pred_period, weeks_to_predict,
-                 hosp_thresholds, n_of_trajs_used=None):
+                 hosp_thresholds, n_of_trajs_used=None, n_of_workers=None, dir_of_cache=None):
         """ create the dataset needed to develop the predictive models
         :param dir_of_trajs: (string) the name of directory where trajectories are located
         :param weeks_of_pred_period: (tuple) (y0, y1) weeks when the prediction period starts and ends
+            (only used by pre_process)
         :weeks_to_predict: (int) number of weeks to predict in the future
         :param hosp_thresholds: (list) of thresholds for hospitalization capacity
         :param n_of_trajs_used: (None or int) number of trajectories used to build the dataset
-            (if None, all trajectories are used)
+            (the trajectories with the smallest ids are used; if None, all trajectories are used)
+        :param n_of_workers: (None or int) number of processes to build datasets
+            (if None, FE_N_WORKERS in definitions.py is used)
+        :param dir_of_cache: (None or string) directory to cache the rows of datasets of trajectories in
+            (rows are then only calculated for trajectories that are new or have changed;
+            if None, rows are not cached)
         """
         self.directoryName = dir_of_trajs
         self.weeksOfPredictionPeriod = weeks_of_pred_period
         self.weeksToPredict = weeks_to_predict
         self.hospThresholds = hosp_thresholds
+        self.trajStore = TrajectoryStore(directory=dir_of_trajs)
         if n_of_trajs_used is None:
-            self.namesOfTrajFiles = os.listdir(dir_of_trajs)
+            self.nOfTrajsUsed = len(self.trajStore)
         else:
-            self.namesOfTrajFiles = os.listdir(dir_of_trajs)[:n_of_trajs_used]
+            self.nOfTrajsUsed = min(n_of_trajs_used, len(self.trajStore))
+        self.nOfWorkers = FE_N_WORKERS if n_of_workers is None else n_of_workers
+        self.dirOfCache = dir_of_cache
 
     def pre_process(self, info_of_incd_fs, info_of_prev_fs, info_of_parameter_fs, output_file, report_corr=True):
         """
@@ -83,6 +193,34 @@ class FeatureEngineering:
         :param report_corr: (bool) whether to report correlations between features and outcomes
         """
 
+        df = self.get_datasets(list_of_weeks_of_pred_period=[self.weeksOfPredictionPeriod],
+                               info_of_incd_fs=info_of_incd_fs,
+                               info_of_prev_fs=info_of_prev_fs,
+                               info_of_parameter_fs=info_of_parameter_fs)[0]
+
+        # find directoy
+        output_dir = Path('outputs/prediction_datasets_{}_weeks/'.format(self.weeksToPredict))
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        # save new dataset to file
+        df.to_csv(output_dir / output_file, index=False)
+
+        # report correlations
+        if report_corr:
+            report_corrs(df=df, outcomes=OUTCOME_NAME_IN_DATASET,
+                         csv_file_name=output_dir / 'corrs-{}'.format(output_file))
+
+    def get_datasets(self, list_of_weeks_of_pred_period, info_of_incd_fs, info_of_prev_fs, info_of_parameter_fs):
+        """
+        reads each trajectory once to create the datasets for multiple prediction periods
+        :param list_of_weeks_of_pred_period: (list) of (y0, y1) weeks when each prediction period starts and ends
+        :param info_of_incd_fs: information of incidence features
+        :param info_of_prev_fs: information of prevalence features
+        :param info_of_parameter_fs: names of parameter feature
+        :return: (list) of DataFrames (one for each prediction period)
+        """
+
         # find the labels of features
         # note that on a trajectory these features can be defined:
         # last recoding, average of last recordings, slope of last recordings.
@@ -99,180 +237,247 @@ class FeatureEngineering:
         for t in self.hospThresholds:
             col_labels.append(get_outcome_label(threshold=t))
 
-        # read dataset of the parameter features
-        param_df = pd.read_csv('outputs/summary/parameter_values.csv')
+        # values of the parameter features of trajectories (joined by trajectory id)
         param_cols = []  # columns of parameter values
-        for name in info_of_parameter_fs:
-            param_cols.append(np.asarray(param_df[name]))
-
-        # values of incidence, prevalence, and parameters features
-        all_feature_values = []
-        for i in range(len(self.namesOfTrajFiles)):
-
-            # read trajectory file
-            df = pd.read_csv('{}/{}'.format(self.directoryName, self.namesOfTrajFiles[i]))
-
-            # find if for this trajectory threshold of hospitalization has passed, value of the peak, and
-            # time of the peak
-            if_hosp_threshold_passed, hosp_max, peak_week = \
-                self._get_if_threshold_passed_and_max_and_week_of_peak(df=df)
-
-            # read values of incidence and prevalence features for this trajectory
-            incd_fs = self._get_feature_values(
-                df=df, week=self.weeksOfPredictionPeriod[0],
-                info_of_features=info_of_incd_fs, incd_or_prev='incd')
-            prev_fs = self._get_feature_values(
-                df=df, week=self.weeksOfPredictionPeriod[0],
-                info_of_features=info_of_prev_fs, incd_or_prev='prev')
-
-            # make a row of feature values
-            # incidence features, prevalence features
-            row = incd_fs + prev_fs
-            # add epidemic parameter values for corresponding trajectory
-            for col in param_cols:
-                row.append(col[i])
-            # max hospital rate and whether surpass capacity
-            row.append(hosp_max)
-            row.extend(if_hosp_threshold_passed)
+        if len(info_of_parameter_fs) > 0:
+            param_store = ParameterStore(directory='outputs/summary')
+            for name in info_of_parameter_fs:
+                param_cols.append(param_store.get_values(name=name, ids=self.trajStore.ids[:self.nOfTrajsUsed]))
 
-            # store this row of feature values
-            all_feature_values.append(row)
+        # trajectories are stored in the order of their ids, so the rows of datasets are in the order of ids
+        trajs = np.arange(self.nOfTrajsUsed)
 
-        # convert to DataFrame
-        df = pd.DataFrame(data=all_feature_values,
-                          columns=col_labels)
-
-        # find directoy
-        output_dir = Path('outputs/prediction_datasets_{}_weeks/'.format(self.weeksToPredict))
+        # find trajectories with cached rows
+        if self.dirOfCache is None:
+            cache, index_in_cache = None, np.full(len(trajs), -1)
+        else:
+            cache = _RowCache(file_name=Path(self.dirOfCache) / 'rows-{}.npz'.format(_get_spec_hash(
+                weeks_to_predict=self.weeksToPredict, hosp_thresholds=self.hospThresholds,
+                list_of_weeks_of_pred_period=list_of_weeks_of_pred_period,
+                info_of_incd_fs=info_of_incd_fs, info_of_prev_fs=info_of_prev_fs)))
+            digests = self._get_digests(
+                trajs=trajs, series_names=self._get_names_of_series(info_of_incd_fs, info_of_prev_fs))
+            index_in_cache = cache.get_index(digests=digests)
+        new_trajs = trajs[index_in_cache < 0]
+
+        # calculate the rows of new trajectories in shards
+        shards = [s for s in np.array_split(new_trajs, self.nOfWorkers) if len(s) > 0]
+        if self.nOfWorkers > 1 and len(shards) > 1:
+            args = [(self.directoryName, self.weeksToPredict, self.hospThresholds, shard,
+                     list_of_weeks_of_pred_period, info_of_incd_fs, info_of_prev_fs)
+                    for shard in shards]
+            with mp.Pool(self.nOfWorkers) as pl:
+                blocks = pl.starmap(_get_row_blocks, args)
+        else:
+            blocks = [self._get_row_blocks(trajs=shard,
+                                           list_of_weeks_of_pred_period=list_of_weeks_of_pred_period,
+                                           info_of_incd_fs=info_of_incd_fs,
+                                           info_of_prev_fs=info_of_prev_fs)
+                      for shard in shards]
+
+        if cache is None:
+            f_values, hosp_max, if_hosp_threshold_passed = (
+                np.concatenate([block[k] for block in blocks], axis=1) for k in range(3))
+        else:
+            if len(blocks) > 0:
+                new_blocks = [np.concatenate([block[k] for block in blocks], axis=1) for k in range(3)]
+                cache.add(digests=digests[new_trajs], blocks=new_blocks)
+            # re-concatenate the rows of all trajectories from the (updated) cache
+            index_in_cache = cache.get_index(digests=digests)
+            f_values, hosp_max, if_hosp_threshold_passed = (block[:, index_in_cache] for block in cache.blocks)
+
+        # make a dataset for each prediction period
+        datasets = []
+        for p in range(len(list_of_weeks_of_pred_period)):
+
+            # incidence features, prevalence features, epidemic parameter values,
+            # max hospital rate and whether surpass capacity
+            cols = list(f_values[p].T)
+            cols.extend(param_cols)
+            cols.append(hosp_max[p])
+            cols.extend(if_hosp_threshold_passed[p].T)
 
-        output_dir.mkdir(parents=True, exist_ok=True)
+            # convert to DataFrame
+            df = pd.DataFrame(data=dict(enumerate(cols)))
+            df.columns = col_labels
+            datasets.append(df)
 
-        # save new dataset to file
-        df.to_csv(output_dir / output_file, index=False)
+        return datasets
 
-        # report correlations
-        if report_corr:
-            report_corrs(df=df, outcomes=OUTCOME_NAME_IN_DATASET,
-                         csv_file_name=output_dir / 'corrs-{}'.format(output_file))
+    @staticmethod
+    def _get_names_of_series(info_of_incd_fs, info_of_prev_fs):
+        """ :returns (list) names of time-series needed from trajectories """
+
+        series_names = ['Observation Time', 'Observation Period', HOSP_OCCUPANCY_IN_TRAJ_FILE]
+        for info in info_of_incd_fs + info_of_prev_fs:
+            series_names.append(info if isinstance(info, str) else info[0])
+        return series_names
+
+    def _get_digests(self, trajs, series_names):
+        """ :returns (np.array) digest of the id, seed, and time-series of each trajectory """
+
+        digests = []
+        for i in trajs:
+            digest = hashlib.sha1(self.trajStore.ids[i].tobytes() + self.trajStore.seeds[i].tobytes())
+            for name in series_names:
+                digest.update(self.trajStore.get_series(name)[i, :self.trajStore.nRows[i]].tobytes())
+            digests.append(digest.digest())
+        return np.array(digests, dtype='S20')
+
+    def _get_row_blocks(self, trajs, list_of_weeks_of_pred_period, info_of_incd_fs, info_of_prev_fs):
+        """
+        :param trajs: (np.array) indices of trajectories in the shard
+        :param list_of_weeks_of_pred_period: (list) of (y0, y1) weeks when each prediction period starts and ends
+        :param info_of_incd_fs: information of incidence features
+        :param info_of_prev_fs: information of prevalence features
+        :return: values of incidence and prevalence features [prediction period, trajectory, feature],
+            max hospital occupancy rate [prediction period, trajectory], and
+            'if threshold is passed' [prediction period, trajectory, threshold] of trajectories in the shard
+        """
 
-    def _get_if_threshold_passed_and_max_and_week_of_peak(self, df):
+        # time-series needed from trajectories [trajectory, row]
+        series = {name: np.asarray(self.trajStore.get_series(name)[trajs], dtype=float)
+                  for name in self._get_names_of_series(info_of_incd_fs, info_of_prev_fs)}
+        seeds = self.trajStore.seeds[trajs]
+
+        # weeks when predictions are made
+        weeks = np.array([w[0] for w in list_of_weeks_of_pred_period])
+
+        # values of incidence and prevalence features [trajectory, prediction period]
+        f_values = []
+        for info in info_of_incd_fs:
+            f_values.extend(self._get_feature_values(
+                series=series, seeds=seeds, weeks=weeks, info=info, incd_or_prev='incd'))
+        for info in info_of_prev_fs:
+            f_values.extend(self._get_feature_values(
+                series=series, seeds=seeds, weeks=weeks, info=info, incd_or_prev='prev'))
+
+        # find if for each trajectory threshold of hospitalization has passed, value of the peak, and
+        # time of the peak
+        hosp_max, if_hosp_threshold_passed = [], []
+        for weeks_of_pred_period in list_of_weeks_of_pred_period:
+            if_passed, maximum, peak_week = self._get_if_threshold_passed_and_max_and_week_of_peak(
+                obs_weeks=series['Observation Period'],
+                hosp_occu_rates=series[HOSP_OCCUPANCY_IN_TRAJ_FILE],
+                weeks_of_pred_period=weeks_of_pred_period)
+            hosp_max.append(maximum)
+            if_hosp_threshold_passed.append(if_passed)
+
+        return (np.stack(f_values, axis=2).transpose(1, 0, 2),
+                np.array(hosp_max),
+                np.array(if_hosp_threshold_passed))
+
+    def _get_if_threshold_passed_and_max_and_week_of_peak(self, obs_weeks, hosp_occu_rates, weeks_of_pred_period):
         """
-        :return: 'if threshold is passed' (0=no, 1=yes) and 'max hospitalization rate', and 'week of the peak'
+        :param obs_weeks: (np.array) observation periods of trajectories [trajectory, row]
+        :param hosp_occu_rates: (np.array) hospital occupancy rates of trajectories [trajectory, row]
+        :param weeks_of_pred_period: (tuple) (y0, y1) weeks when the prediction period starts and ends
+        :return: 'if threshold is passed' (0=no, 1=yes) [trajectory, threshold] and 'max hospitalization rate',
+            and 'week of the peak' (nan if hospital occupancy is 0 during the prediction period) of each trajectory
         """
 
-        obs_times = df['Observation Time']
-        obs_weeks = df['Observation Period']
-        # hosp_rates = df['Obs: New hospitalization rate']
-        hosp_occu_rates = df[HOSP_OCCUPANCY_IN_TRAJ_FILE]
+        # hospital occupancy rates during the prediction period
+        with np.errstate(invalid='ignore'):
+            in_pred_period = (weeks_of_pred_period[0] <= obs_weeks) & (obs_weeks < weeks_of_pred_period[1])
+        values = np.where(in_pred_period & (hosp_occu_rates > 0), hosp_occu_rates, 0)
 
         # get maximum hospitalization rate during the prediction period
-        maximum = 0
-        week_of_peak = None
-        for pair in zip(obs_times, obs_weeks, hosp_occu_rates):
-            if self.weeksOfPredictionPeriod[0] <= pair[1] < self.weeksOfPredictionPeriod[1]:
-                if pair[2] > maximum:
-                    week_of_peak = pair[1]
-                    maximum = pair[2]
-            # exit loop if prediction period has passed
-            if pair[1] > self.weeksOfPredictionPeriod[1]:
-                break
+        maximum = values.max(axis=1)
+        rows = values.argmax(axis=1)
+        week_of_peak = np.where(maximum > 0, obs_weeks[np.arange(len(rows)), rows], np.nan)
 
         # decide if surpass the hospitalization threshold
         # 0 if yes, 1 if not
-        if_surpass_thresholds = [1] * len(self.hospThresholds)
-        for i, t in enumerate(self.hospThresholds):
-            if maximum * 100000 > t:
-                if_surpass_thresholds[i] = 0
+        if_surpass_thresholds = np.array(
+            [np.where(maximum * 100000 > t, 0, 1) for t in self.hospThresholds]).reshape(-1, len(maximum)).T
 
         return if_surpass_thresholds, maximum, week_of_peak
 
     @staticmethod
-    def _get_feature_values(df, week, info_of_features, incd_or_prev):
+    def _get_feature_values(series, seeds, weeks, info, incd_or_prev):
         """
-        get value of an incidence feature over the specified week
-        :param df: df of interest
-        :param week: (int) week when feature values should be collected
-        :param info_of_features: list of information for features that are observed over a week
+        get values of an incidence or prevalence feature for all trajectories at the specified weeks
+        :param series: (dictionary) of time-series of trajectories [trajectory, row]
+        :param seeds: (np.array) seed of each trajectory
+        :param weeks: (np.array) weeks when feature values should be collected
+        :param info: information for a feature that is observed over a week
         :param incd_or_prev: 'incd' or 'prev' to specify if incidence features or prevalence features are provided
-        :return: list of values for features
+        :return: list of values [trajectory, week] (one for each feature defined by info)
         """
 
-        err_model = None  # error model
-        f_values = []   # feature values
-        for info in info_of_features:
-            # multiplier to multiply the value of this column by
-            multiplier = 1
-
-            # get the column in trajectory files where the data is located to define features
-            if isinstance(info, str):
-                col = df[info]
-            elif isinstance(info, tuple):
-                # find multiplier
-                if type(info[1]) == int or type(info[1]) == float:
-                    multiplier = info[1]
-
-                # feature name
-                col = df[info[0]]
-                # find the error model
-                for v in info:
-                    if isinstance(v, ErrorModel):
-                        err_model = v
-            else:
-                raise ValueError('Invalid feature information.')
+        # multiplier to multiply the value of this column by
+        multiplier = 1
+
+        # get the column in trajectory files where the data is located to define features
+        if isinstance(info, str):
+            name = info
+        elif isinstance(info, tuple):
+            # find multiplier
+            if type(info[1]) == int or type(info[1]) == float:
+                multiplier = info[1]
+            # feature name
+            name = info[0]
+        else:
+            raise ValueError('Invalid feature information.')
 
-            # read trajectory data until the time of prediction
-            true_values = []
-            observed_values = []
+        # recordings of the feature (without missing values) and their times [trajectory, recording]
+        if incd_or_prev == 'incd':
+            times = series['Observation Period']
+        elif incd_or_prev == 'prev':
+            times = series['Observation Time']
+        else:
+            raise ValueError('Invalid value for the type of features.')
+        if_recorded = ~np.isnan(series[name])
+        order = np.argsort(~if_recorded, axis=1, kind='stable')
+        true_values = np.take_along_axis(series[name], order, axis=1) * multiplier
+        times = np.take_along_axis(times, order, axis=1)
+
+        # number of recordings until each week [trajectory, week]
+        # (recordings are used until the first one that is not before the week)
+        with np.errstate(invalid='ignore'):
             if incd_or_prev == 'incd':
-                for pair in zip(df['Observation Period'], col):
-                    if not np.isnan(pair[1]):
-                        if pair[0] < week:
-                            true_values.append(pair[1]*multiplier)
-                            if err_model is None:
-                                observed_values.append(true_values[-1])
-                            else:
-                                observed_values.append(err_model.get_obs(true_values=true_values))
-                        else:
-                            break
-            elif incd_or_prev == 'prev':
-                for pair in zip(df['Observation Time'], col):
-                    if not np.isnan(pair[1]):
-                        if 52 * pair[0] - week < 0.5:
-                            true_values.append(pair[1]*multiplier)
-                            if err_model is None:
-                                observed_values.append(true_values[-1])
-                            else:
-                                observed_values.append(err_model.get_obs(true_values=true_values))
-                        else:
-                            break
+                if_before = times[:, None, :] < weeks[None, :, None]
             else:
-                raise ValueError('Invalid value for the type of features.')
-
-            # calculate feature value
-            if isinstance(info, str):
-                f_values.append(observed_values[-1])
-            elif isinstance(info, tuple):
-                for v in info:
-                    if isinstance(v, str):
-                        # get the last observation
-                        f_values.append(observed_values[-1])
-                    elif isinstance(v, tuple):
-                        if v[0] == 'ave':
-                            # get the average
-                            f_values.append(np.average(observed_values[-v[1]:]))
-                        elif v[0] == 'slope':
-                            # get the slope
-                            x = np.arange(0, v[1])
-                            y = observed_values[-v[1]:]
-                            if None in y:
-                                slope = 0
-                            else:
-                                slope = np.polyfit(x, y, deg=1)[0]
-                            f_values.append(slope)
-                        else:
-                            raise ValueError('Invalid.')
-            else:
-                raise ValueError('Invalid feature information.')
+                if_before = 52 * times[:, None, :] - weeks[None, :, None] < 0.5
+        if_before &= np.arange(true_values.shape[1]) < if_recorded.sum(axis=1)[:, None, None]
+        n_recordings = np.cumprod(if_before, axis=2).sum(axis=2)
+        if (n_recordings == 0).any():
+            raise ValueError("'{}' is not recorded before week {} in some trajectories."
+                             .format(name, weeks[(n_recordings == 0).any(axis=0)][0]))
+
+        # observed values [trajectory, recording] (nan if not observed)
+        err_model = _get_error_model(info)
+        if err_model is None:
+            observed_values = true_values
+        else:
+            observed_values = err_model.get_obs(true_values=true_values, seeds=seeds, feature_name=name)
+
+        # the last k observations before each week [trajectory, week, k] (nan if not available)
+        def get_window(k):
+            rows = n_recordings[:, :, None] - k + np.arange(k)
+            window = np.take_along_axis(observed_values[:, None, :], np.maximum(rows, 0), axis=2)
+            return np.where(rows >= 0, window, np.nan)
+
+        # calculate feature value
+        f_values = []
+        values = info if isinstance(info, tuple) else (info,)
+        for v in values:
+            if isinstance(v, str):
+                # get the last observation
+                f_values.append(get_window(1)[:, :, 0])
+            elif isinstance(v, tuple):
+                window = get_window(v[1])
+                if v[0] == 'ave':
+                    # get the average
+                    with np.errstate(invalid='ignore'):
+                        f_values.append(np.nansum(window, axis=2) / (~np.isnan(window)).sum(axis=2))
+                elif v[0] == 'slope':
+                    # get the slope (least-squares slope of observations over weeks 0, 1, ..., k-1)
+                    x = np.arange(v[1]) - (v[1] - 1) / 2
+                    slope = (window * x).sum(axis=2) / (x * x).sum()
+                    f_values.append(np.where(np.isnan(slope), 0, slope))
+                else:
+                    raise ValueError('Invalid.')
 
         return f_values
 
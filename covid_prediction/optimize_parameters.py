@@ -5,6 +5,10 @@ import covid_prediction.cross_validation as CV
 from covid_prediction.prediction_models import DecisionTree
 from definitions import ROOT_DIR, get_outcome_label, SCENARIOS, FILL_TREE
 
+# training and validation datasets read by this process (weeks to predict -> (training dataset,
+# list of validation datasets)), see get_datasets
+_DATASETS = {}
+
 
 class SummaryOfTreePerformance:
 
@@ -52,7 +56,8 @@ def optimize_and_eval_dec_tree(
         error_tolerance=0.01,
         cv_fold=10,
         if_parallel=False,
-        shorten_feature_names=None):
+        shorten_feature_names=None,
+        pool=None):
     """
     :param model_spec: (ModelSpec) model specifications
     :param hosp_occu_thresholds: (list) of thresholds for hospital occupancy
@@ -66,47 +71,32 @@ def optimize_and_eval_dec_tree(
     :param if_parallel: (bool) set True to run code in parallel
     :param shorten_feature_names: (dictionary) with keys as features names in the dataset and
         values as alternative names to replace the original names with
+    :param pool: (multiprocessing.Pool) pool of processes to use if if_parallel is True (see get_pool)
+        (if None, a pool is created for the cross validation of each threshold)
     :return: (best specification, the final model performance)
     """
 
-    # read training dataset
-    df = pd.read_csv(ROOT_DIR+'/outputs/prediction_datasets_{}_weeks/data-training.csv'.format(weeks_to_predict))
-    # randomize rows (since the dataset might have some order)
-    df_training = df.sample(frac=1, random_state=1)
-
-    # read validation datasets
-    validation_dfs = [None] * len(SCENARIOS)
-    i = 0
-    for key, value in SCENARIOS.items():
-        validation_dfs[i] = pd.read_csv(
-            ROOT_DIR+'/outputs/prediction_datasets_{}_weeks/data-validating {}.csv'.format(weeks_to_predict, value))
-        i += 1
+    # read datasets
+    df_training, validation_dfs = get_datasets(weeks_to_predict=weeks_to_predict)
 
     # for all thresholds
-    validation_performance = {}
+    list_of_best_specs, list_of_specs = [], []
     for t in hosp_occu_thresholds:
 
         # if the optimal value of ccp alpha is not provided
         if optimal_ccp_alpha is None:
             # find the best specification
-            cv = CV.DecTreeParameterOptimizer(
-                df=df_training,
-                feature_names=model_spec.features,
-                outcome_name=get_outcome_label(threshold=t),
-                list_of_ccp_alphas=list_of_ccp_alphas,
-                error_tolerance=error_tolerance,
-                cv_fold=cv_fold,
-                scoring='accuracy')
+            cv = _get_parameter_optimizer(
+                df_training=df_training, model_spec=model_spec, hosp_occu_threshold=t,
+                list_of_ccp_alphas=list_of_ccp_alphas, error_tolerance=error_tolerance, cv_fold=cv_fold)
 
             best_spec = cv.find_best_parameters(
                 run_in_parallel=if_parallel,
-                save_to_file_performance=ROOT_DIR
-                                         + '/outputs/prediction_summary_{}_weeks/dec_tree/cv/cv-{}-{}.csv'
-                                             .format(weeks_to_predict, model_spec.name, t),
-                save_to_file_features=ROOT_DIR
-                                      + '/outputs/prediction_summary_{}_weeks/dec_tree/features/features-{}-{}.csv'
-                                          .format(weeks_to_predict, model_spec.name, t)
-            )
+                save_to_file_performance=_get_cv_filename(
+                    weeks_to_predict=weeks_to_predict, model_name=model_spec.name, hosp_occu_threshold=t),
+                save_to_file_features=_get_features_filename(
+                    weeks_to_predict=weeks_to_predict, model_name=model_spec.name, hosp_occu_threshold=t),
+                pool=pool)
             feature_names = best_spec.selectedFeatures
             ccp_alpha = best_spec.ccpAlpha
 
@@ -115,32 +105,225 @@ def optimize_and_eval_dec_tree(
             ccp_alpha = optimal_ccp_alpha
             feature_names = model_spec.features
 
-        # make a final decision tree model
-        model = DecisionTree(df=df_training,
-                             feature_names=feature_names,
-                             y_name=get_outcome_label(threshold=t))
+        list_of_best_specs.append(best_spec)
+        list_of_specs.append((weeks_to_predict, model_spec.name, t, feature_names, ccp_alpha, optimal_ccp_alpha))
 
-        # train the model
-        model.train(ccp_alpha=ccp_alpha)
+    # train, validate, and plot the final decision tree models
+    list_of_performances = _train_and_validate_trees(list_of_specs=list_of_specs,
+                                                     shorten_feature_names=shorten_feature_names,
+                                                     pool=pool if if_parallel else None)
 
-        # validate the final model
-        model.validate(validation_dfs=validation_dfs)
+    # store summary of validation performance
+    validation_performance = {}
+    for t, best_spec, performance in zip(hosp_occu_thresholds, list_of_best_specs, list_of_performances):
+        validation_performance[str(t)] = (best_spec, performance)
 
-        # store summary of validation performance
-        validation_performance[str(t)] = (best_spec, model.validationPerformanceSummaries)
+    return validation_performance
 
-        # save the best tree
-        if optimal_ccp_alpha is None:
-            filename = ROOT_DIR + '/outputs/figures/trees_{}_weeks/{}-{}.png'.format(
-                weeks_to_predict, model_spec.name, t)
-        else:
-            filename = ROOT_DIR + '/outputs/figures/trees_{}_weeks/{}-{}-{}.png'.format(
-                weeks_to_predict, model_spec.name, t, optimal_ccp_alpha)
 
+def optimize_and_eval_dec_trees(
+        model_specs,
+        hosp_occu_thresholds,
+        list_of_weeks_to_predict,
+        list_of_ccp_alphas,
+        error_tolerance=0.01,
+        cv_fold=10,
+        shorten_feature_names=None,
+        pool=None):
+    """
+    finds the best specification of decision trees for all model specifications, thresholds,
+    and weeks to predict, where the cross validation of all of them is run as one set of tasks
+    (see CV.run_dec_tree_parameter_optimizers)
+    :param model_specs: (list) of model specifications (ModelSpec)
+    :param hosp_occu_thresholds: (list) of thresholds for hospital occupancy
+    :param list_of_weeks_to_predict: (list) of number of weeks to predict in the future
+    :param list_of_ccp_alphas: (list) of ccp alphas
+    :param error_tolerance: (float) a pruner tree will be selected if it's accuracy is less
+        that the accuracy of the optimal tree by this amount
+    :param cv_fold: (int) number of cross validation folds
+    :param shorten_feature_names: (dictionary) with keys as features names in the dataset and
+        values as alternative names to replace the original names with
+    :param pool: (multiprocessing.Pool) pool of processes to run cross validation and the final models in
+        (see get_pool; if None, code is run in this process)
+    :return: (dictionary) weeks to predict -> model name -> (dictionary) of (best specification,
+        the final model performance) for each threshold (as returned by optimize_and_eval_dec_tree)
+    """
+
+    # build the parameter optimizer of each model specification, threshold, and weeks to predict
+    optimizers = {}
+    for weeks_to_predict in list_of_weeks_to_predict:
+        df_training, validation_dfs = get_datasets(weeks_to_predict=weeks_to_predict)
+        for model_spec in model_specs:
+            for t in hosp_occu_thresholds:
+                optimizers[weeks_to_predict, model_spec.name, t] = _get_parameter_optimizer(
+                    df_training=df_training, model_spec=model_spec, hosp_occu_threshold=t,
+                    list_of_ccp_alphas=list_of_ccp_alphas, error_tolerance=error_tolerance, cv_fold=cv_fold)
+
+    # cross validation
+    CV.run_dec_tree_parameter_optimizers(parameter_optimizers=list(optimizers.values()), pool=pool)
+
+    # find the best specifications
+    best_specs = {}
+    for (weeks_to_predict, model_name, t), optimizer in optimizers.items():
+        best_specs[weeks_to_predict, model_name, t] = optimizer.select_best_parameters(
+            save_to_file_performance=_get_cv_filename(
+                weeks_to_predict=weeks_to_predict, model_name=model_name, hosp_occu_threshold=t),
+            save_to_file_features=_get_features_filename(
+                weeks_to_predict=weeks_to_predict, model_name=model_name, hosp_occu_threshold=t))
+
+    # train, validate, and plot the final decision tree models
+    list_of_performances = _train_and_validate_trees(
+        list_of_specs=[(weeks_to_predict, model_name, t, best_spec.selectedFeatures, best_spec.ccpAlpha, None)
+                       for (weeks_to_predict, model_name, t), best_spec in best_specs.items()],
+        shorten_feature_names=shorten_feature_names,
+        pool=pool)
+
+    validation_performance = {}
+    for (weeks_to_predict, model_name, t), performance in zip(best_specs, list_of_performances):
+        validation_performance.setdefault(weeks_to_predict, {}).setdefault(model_name, {})[str(t)] = (
+            best_specs[weeks_to_predict, model_name, t], performance)
+
+    return validation_performance
+
+
+def get_pool(list_of_weeks_to_predict):
+    """
+    :param list_of_weeks_to_predict: (list) of number of weeks to predict in the future
+    :returns (multiprocessing.Pool) a pool of processes to run the cross validation and the final
+        decision tree models of the specified weeks to predict, which is meant to be created once and
+        shared by all calls to optimize_and_eval_dec_tree(s). The training and validation datasets are
+        read once (by this process before the pool is forked, or by each process when it starts),
+        so tasks only carry the specifications of models.
+    """
+
+    _read_all_datasets(list_of_weeks_to_predict=list_of_weeks_to_predict)
+    return CV.get_pool(initializer=_read_all_datasets, initargs=(list_of_weeks_to_predict, ))
+
+
+def get_datasets(weeks_to_predict):
+    """ :returns (training dataset, list of validation datasets) for the specified weeks to predict
+    (datasets are read once by each process) """
+
+    if weeks_to_predict not in _DATASETS:
+
+        # read training dataset
+        df = pd.read_csv(ROOT_DIR+'/outputs/prediction_datasets_{}_weeks/data-training.csv'.format(weeks_to_predict))
+        # randomize rows (since the dataset might have some order)
+        df_training = df.sample(frac=1, random_state=1)
+
+        # read validation datasets
+        validation_dfs = [None] * len(SCENARIOS)
+        i = 0
+        for key, value in SCENARIOS.items():
+            validation_dfs[i] = pd.read_csv(
+                ROOT_DIR+'/outputs/prediction_datasets_{}_weeks/data-validating {}.csv'.format(weeks_to_predict, value))
+            i += 1
+
+        _DATASETS[weeks_to_predict] = (df_training, validation_dfs)
+
+    return _DATASETS[weeks_to_predict]
+
+
+def _read_all_datasets(list_of_weeks_to_predict):
+    """ reads the training and validation datasets of the specified weeks to predict into this process """
+
+    for weeks_to_predict in list_of_weeks_to_predict:
+        get_datasets(weeks_to_predict=weeks_to_predict)
+
+
+def _get_parameter_optimizer(df_training, model_spec, hosp_occu_threshold,
+                             list_of_ccp_alphas, error_tolerance, cv_fold):
+    """ :returns (DecTreeParameterOptimizer) to find the best specification of a decision tree """
+
+    return CV.DecTreeParameterOptimizer(
+        df=df_training,
+        feature_names=model_spec.features,
+        outcome_name=get_outcome_label(threshold=hosp_occu_threshold),
+        list_of_ccp_alphas=list_of_ccp_alphas,
+        error_tolerance=error_tolerance,
+        cv_fold=cv_fold,
+        scoring='accuracy')
+
+
+def _get_cv_filename(weeks_to_predict, model_name, hosp_occu_threshold):
+    """ :returns (string) filename to save the cross validation results to """
+    return ROOT_DIR + '/outputs/prediction_summary_{}_weeks/dec_tree/cv/cv-{}-{}.csv'.format(
+        weeks_to_predict, model_name, hosp_occu_threshold)
+
+
+def _get_features_filename(weeks_to_predict, model_name, hosp_occu_threshold):
+    """ :returns (string) filename to save the features of the best specification to """
+    return ROOT_DIR + '/outputs/prediction_summary_{}_weeks/dec_tree/features/features-{}-{}.csv'.format(
+        weeks_to_predict, model_name, hosp_occu_threshold)
+
+
+def _train_and_validate_trees(list_of_specs, shorten_feature_names=None, pool=None):
+    """ trains, validates, and plots the final decision tree models
+    (models with the same weeks to predict, threshold, features, and ccp alpha are the same tree,
+    which is trained and validated once and plotted for each of these models)
+    :param list_of_specs: (list) of (weeks to predict, model name, threshold, features, ccp alpha,
+        optimal ccp alpha) of each model (see optimize_and_eval_dec_tree for optimal ccp alpha)
+    :param shorten_feature_names: (dictionary) with keys as features names in the dataset and
+        values as alternative names to replace the original names with
+    :param pool: (multiprocessing.Pool) pool of processes to use (if None, models are trained in this process)
+    :returns (list) of validation performance summaries of each model
+    """
+
+    # filenames of plots of each tree
+    dict_of_filenames = {}
+    for weeks_to_predict, model_name, t, feature_names, ccp_alpha, optimal_ccp_alpha in list_of_specs:
+        dict_of_filenames.setdefault((weeks_to_predict, t, tuple(feature_names), ccp_alpha), []).append(
+            _get_tree_filename(weeks_to_predict=weeks_to_predict, model_name=model_name,
+                               hosp_occu_threshold=t, optimal_ccp_alpha=optimal_ccp_alpha))
+
+    args = [(weeks_to_predict, t, list(feature_names), ccp_alpha, filenames, shorten_feature_names)
+            for (weeks_to_predict, t, feature_names, ccp_alpha), filenames in dict_of_filenames.items()]
+    if pool is None:
+        list_of_performances = [_train_and_validate_tree(*a) for a in args]
+    else:
+        list_of_performances = pool.starmap(_train_and_validate_tree, args, chunksize=1)
+
+    performances = dict(zip(dict_of_filenames, list_of_performances))
+    return [performances[weeks_to_predict, t, tuple(feature_names), ccp_alpha]
+            for weeks_to_predict, model_name, t, feature_names, ccp_alpha, optimal_ccp_alpha in list_of_specs]
+
+
+def _train_and_validate_tree(weeks_to_predict, hosp_occu_threshold, feature_names, ccp_alpha,
+                             plot_filenames, shorten_feature_names=None):
+    """ trains the final decision tree model, validates it, and plots it
+    :param plot_filenames: (list) of filenames to save the plot of the tree as
+    :returns (list) of validation performance summaries of the final model
+    """
+
+    df_training, validation_dfs = get_datasets(weeks_to_predict=weeks_to_predict)
+
+    # make a final decision tree model
+    model = DecisionTree(df=df_training,
+                         feature_names=feature_names,
+                         y_name=get_outcome_label(threshold=hosp_occu_threshold))
+
+    # train the model
+    model.train(ccp_alpha=ccp_alpha)
+
+    # validate the final model
+    model.validate(validation_dfs=validation_dfs)
+
+    # save the best tree
+    for filename in plot_filenames:
         model.plot_decision_path(
             file_name=filename,
             simple=True, class_names=['Yes', 'No'],
             precision=2, shorten_feature_names=shorten_feature_names, filled=FILL_TREE)
 
-    return validation_performance
+    return model.validationPerformanceSummaries
+
+
+def _get_tree_filename(weeks_to_predict, model_name, hosp_occu_threshold, optimal_ccp_alpha=None):
+    """ :returns (string) filename to save the plot of the final decision tree model as """
 
+    if optimal_ccp_alpha is None:
+        return ROOT_DIR + '/outputs/figures/trees_{}_weeks/{}-{}.png'.format(
+            weeks_to_predict, model_name, hosp_occu_threshold)
+    else:
+        return ROOT_DIR + '/outputs/figures/trees_{}_weeks/{}-{}-{}.png'.format(
+            weeks_to_predict, model_name, hosp_occu_threshold, optimal_ccp_alpha)
@@ -1,4 +1,3 @@
-from deampy.in_out_functions import delete_file
 from imblearn.over_sampling import SMOTE
 from sklearn.preprocessing import StandardScaler, PolynomialFeatures
 
@@ -75,6 +74,97 @@ class PreProcessor:
         self.selectedX = np.asarray(self.df[self.selectedFeatureNames])
 
 
+def get_info_of_features(survey_size_novel_inf):
+    """
+    :param survey_size_novel_inf: (int) survey size of novel infection surveillance
+    :return: information of incidence features, information of prevalence features,
+        and names of parameter features (see FeatureEngineering.pre_process)
+    """
+
+    # error model for novel variant surveillance
+    err_novel_incd = ErrorModel(survey_size=survey_size_novel_inf, weeks_delay=1)
+
+    # information for incidence and prevalence features can be provided as
+    #   'name of the feature' to calculate the recording at prediction time
+    # or
+    #   (feature's name, 100, ('ave', 2), ('slope', 4))
+    # to multiply the column values as needed,
+    # to report the recording at prediction time, and
+    # to calculate the average and slope of observations during past weeks
+    info_of_incd_fs = [
+        # ('Obs: Incidence rate', 100000, ('ave', 2), ('slope', 4)),
+        ('Obs: New hospitalization rate', 100000, ('ave', 2), ('slope', 4)),
+        # ('Obs: % of new hospitalizations that are vaccinated', ('ave', 2), ('slope', 4)),
+        ('Obs: % of incidence due to Novel', err_novel_incd, ('ave', 2), ('slope', 4)),
+        # ('Obs: % of new hospitalizations due to novel variant', ('ave', 2), ('slope', 4)),
+        # ('Obs: % of new hospitalizations due to Novel-V', ('ave', 2), ('slope', 4)),
+    ]
+    info_of_prev_fs = [
+        ('Obs: Hospital occupancy rate', 100000),
+        # ('Obs: Cumulative hospitalization rate', 100000),
+        ('Obs: Cumulative vaccination rate', 1),
+        # ('Obs: Prevalence susceptible', 1)
+    ]
+    info_of_parameter_fs = [
+        # 'R0',
+        # 'Duration of infectiousness-dominant',
+        # 'Prob novel strain params-0',
+        # 'Prob novel strain params-1',
+        # 'Prob novel strain params-2',
+        # 'Ratio infectiousness duration of novel to dominant',
+        # 'Duration of vaccine immunity',
+        # 'Ratio of duration of immunity from infection+vaccination to infection',
+        # 'Vaccine effectiveness against infection-0',
+        # 'Vaccine effectiveness against infection-1',
+        # 'Ratio transmissibility of novel to dominant',
+        # 'Vaccine effectiveness in reducing infectiousness-0',
+        # 'Vaccine effectiveness in reducing infectiousness-1',
+        # 'Ratio prob of hospitalization of novel to dominant',
+        # 'Vaccine effectiveness against hospitalization-0',
+        # 'Vaccine effectiveness against hospitalization-1',
+        # 'Prob Hosp for 18-29',
+        # 'Relative prob hosp by age-0',
+        # 'Relative prob hosp by age-1',
+        # 'Relative prob hosp by age-2',
+        # 'Relative prob hosp by age-4',
+        # 'Relative prob hosp by age-5',
+        # 'Relative prob hosp by age-6',
+        # 'Relative prob hosp by age-7',
+        # 'Duration of E-0',
+        # 'Duration of E-1',
+        # 'Duration of E-2',
+        # 'Duration of E-3',
+        # 'Duration of I-0',
+        # 'Duration of I-1',
+        # 'Duration of I-2',
+        # 'Duration of I-3',
+        # 'Duration of Hosp-0',
+        # 'Duration of Hosp-1',
+        # 'Duration of Hosp-2',
+        # 'Duration of Hosp-3',
+        # 'Duration of R-0',
+        # 'Duration of R-1',
+        # 'Duration of R-2',
+        # 'Duration of R-3',
+        # 'Vaccination rate params-0',
+        # 'Vaccination rate params-1',
+        # 'Vaccination rate params-3',
+        # 'Vaccination rate t_min by age-1',
+        # 'Vaccination rate t_min by age-2',
+        # 'Vaccination rate t_min by age-3',
+        # 'Vaccination rate t_min by age-4',
+        # 'Vaccination rate t_min by age-5',
+        # 'Vaccination rate t_min by age-6',
+        # 'Vaccination rate t_min by age-7',
+        # 'Y1 thresholds-0',
+        # 'Y1 thresholds-1',
+        # 'Y1 Maximum hosp occupancy',
+        # 'Y1 Max effectiveness of control measures'
+    ]
+
+    return info_of_incd_fs, info_of_prev_fs, info_of_parameter_fs
+
+
 def build_dataset(weeks_into_winter,
                   weeks_to_predict,
                   weeks_of_pred_period,
@@ -102,8 +192,9 @@ def build_dataset(weeks_into_winter,
         hosp_thresholds=hosp_thresholds,
         n_of_trajs_used=n_of_trajs_used)
 
-    # error model for novel variant surveillance
-    err_novel_incd = ErrorModel(survey_size=survey_size_novel_inf, weeks_delay=1)
+    # information of features
+    info_of_incd_fs, info_of_prev_fs, info_of_parameter_fs = get_info_of_features(
+        survey_size_novel_inf=survey_size_novel_inf)
 
     # find output file name
     label = get_dataset_labels(week=weeks_into_winter, survey_size=survey_size_novel_inf)
@@ -111,83 +202,9 @@ def build_dataset(weeks_into_winter,
 
     # create new dataset based on raw data
     feature_engineer.pre_process(
-        # information for incidence and prevalence features can be provided as
-        #   'name of the feature' to calculate the recording at prediction time
-        # or
-        #   (feature's name, 100, ('ave', 2), ('slope', 4))
-        # to multiply the column values as needed,
-        # to report the recording at prediction time, and
-        # to calculate the average and slope of observations during past weeks
-        info_of_incd_fs=[
-            # ('Obs: Incidence rate', 100000, ('ave', 2), ('slope', 4)),
-            ('Obs: New hospitalization rate', 100000, ('ave', 2), ('slope', 4)),
-            # ('Obs: % of new hospitalizations that are vaccinated', ('ave', 2), ('slope', 4)),
-            ('Obs: % of incidence due to Novel', err_novel_incd, ('ave', 2), ('slope', 4)),
-            # ('Obs: % of new hospitalizations due to novel variant', ('ave', 2), ('slope', 4)),
-            # ('Obs: % of new hospitalizations due to Novel-V', ('ave', 2), ('slope', 4)),
-        ],
-        info_of_prev_fs=[
-            ('Obs: Hospital occupancy rate', 100000),
-            # ('Obs: Cumulative hospitalization rate', 100000),
-            ('Obs: Cumulative vaccination rate', 1),
-            # ('Obs: Prevalence susceptible', 1)
-        ],
-        info_of_parameter_fs=[
-            # 'R0',
-            # 'Duration of infectiousness-dominant',
-            # 'Prob novel strain params-0',
-            # 'Prob novel strain params-1',
-            # 'Prob novel strain params-2',
-            # 'Ratio infectiousness duration of novel to dominant',
-            # 'Duration of vaccine immunity',
-            # 'Ratio of duration of immunity from infection+vaccination to infection',
-            # 'Vaccine effectiveness against infection-0',
-            # 'Vaccine effectiveness against infection-1',
-            # 'Ratio transmissibility of novel to dominant',
-            # 'Vaccine effectiveness in reducing infectiousness-0',
-            # 'Vaccine effectiveness in reducing infectiousness-1',
-            # 'Ratio prob of hospitalization of novel to dominant',
-            # 'Vaccine effectiveness against hospitalization-0',
-            # 'Vaccine effectiveness against hospitalization-1',
-            # 'Prob Hosp for 18-29',
-            # 'Relative prob hosp by age-0',
-            # 'Relative prob hosp by age-1',
-            # 'Relative prob hosp by age-2',
-            # 'Relative prob hosp by age-4',
-            # 'Relative prob hosp by age-5',
-            # 'Relative prob hosp by age-6',
-            # 'Relative prob hosp by age-7',
-            # 'Duration of E-0',
-            # 'Duration of E-1',
-            # 'Duration of E-2',
-            # 'Duration of E-3',
-            # 'Duration of I-0',
-            # 'Duration of I-1',
-            # 'Duration of I-2',
-            # 'Duration of I-3',
-            # 'Duration of Hosp-0',
-            # 'Duration of Hosp-1',
-            # 'Duration of Hosp-2',
-            # 'Duration of Hosp-3',
-            # 'Duration of R-0',
-            # 'Duration of R-1',
-            # 'Duration of R-2',
-            # 'Duration of R-3',
-            # 'Vaccination rate params-0',
-            # 'Vaccination rate params-1',
-            # 'Vaccination rate params-3',
-            # 'Vaccination rate t_min by age-1',
-            # 'Vaccination rate t_min by age-2',
-            # 'Vaccination rate t_min by age-3',
-            # 'Vaccination rate t_min by age-4',
-            # 'Vaccination rate t_min by age-5',
-            # 'Vaccination rate t_min by age-6',
-            # 'Vaccination rate t_min by age-7',
-            # 'Y1 thresholds-0',
-            # 'Y1 thresholds-1',
-            # 'Y1 Maximum hosp occupancy',
-            # 'Y1 Max effectiveness of control measures'
-        ],
+        info_of_incd_fs=info_of_incd_fs,
+        info_of_prev_fs=info_of_prev_fs,
+        info_of_parameter_fs=info_of_parameter_fs,
         output_file=output_file,
         report_corr=report_corr)
 
@@ -208,38 +225,36 @@ def build_and_combine_datasets(
 
     # datasets for predicting whether hospitalization capacities would surpass withing 4 weeks
     weeks_into_winter = 0
-    weeks = []  # to then read the files
+    list_of_weeks_of_pred_period = []
     while first_week_of_winter + weeks_into_winter + weeks_to_predict <= last_week_of_winter:
 
-        weeks.append(weeks_into_winter)
-
         # the week at which the prediction should be made
         pred_week = first_week_of_winter + weeks_into_winter
-
-        # build the dataset
-        build_dataset(weeks_into_winter=weeks_into_winter,
-                      weeks_to_predict=weeks_to_predict,
-                      weeks_of_pred_period=(pred_week, pred_week + weeks_to_predict),
-                      hosp_thresholds=hosp_occu_thresholds,
-                      survey_size_novel_inf=survey_size_novel_inf,
-                      report_corr=False,
-                      n_of_trajs_used=n_of_trajs_used)
+        list_of_weeks_of_pred_period.append((pred_week, pred_week + weeks_to_predict))
 
         weeks_into_winter += 2
 
+    # information of features
+    info_of_incd_fs, info_of_prev_fs, info_of_parameter_fs = get_info_of_features(
+        survey_size_novel_inf=survey_size_novel_inf)
+
+    # build the datasets for all prediction weeks reading each trajectory once
+    feature_engineer = FeatureEngineering(
+        dir_of_trajs='outputs/trajectories',
+        weeks_to_predict=weeks_to_predict,
+        weeks_of_pred_period=None,
+        hosp_thresholds=hosp_occu_thresholds,
+        n_of_trajs_used=n_of_trajs_used,
+        dir_of_cache='outputs/prediction_datasets_{}_weeks/cache'.format(weeks_to_predict))
+    dataframes = feature_engineer.get_datasets(
+        list_of_weeks_of_pred_period=list_of_weeks_of_pred_period,
+        info_of_incd_fs=info_of_incd_fs,
+        info_of_prev_fs=info_of_prev_fs,
+        info_of_parameter_fs=info_of_parameter_fs)
+
     # merge the data collected at different weeks to from a
     # single dataset for training the model
-    dataframes = []
     prefix = '/outputs/prediction_datasets_{}_weeks'.format(weeks_to_predict)
-    for w in weeks:
-        # file name
-        label = get_dataset_labels(week=w, survey_size=survey_size_novel_inf)
-        file_name = ROOT_DIR + prefix + '/data-{}.csv'.format(label)
-        # read and store
-        dataframes.append(pd.read_csv(file_name))
-        # delete file
-        delete_file(file_name=file_name)
-
     dataset = pd.concat(dataframes)
     dataset.to_csv(ROOT_DIR + prefix + '/{}.csv'.format(name_of_dataset),
                    index=False)
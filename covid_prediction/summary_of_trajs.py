@@ -1,6 +1,6 @@
-import apacepy.analysis.trajectories as T
 from deampy.statistics import SummaryStat
 
+from covid_model.trajectory_store import TrajectoryStore
 from definitions import FEASIBILITY_PERIOD, SIM_DURATION, ROOT_DIR
 
 
@@ -12,11 +12,12 @@ def print_stat_summary(name, obss, multiplier):
 
 
 def get_trajs_over_training_period(sim_trajs, outcome_name):
+    """ :returns (list) of views of the observations of each trajectory during the training period """
 
-    assert isinstance(sim_trajs, T.SimOutcomeTrajectories)
+    assert isinstance(sim_trajs, TrajectoryStore)
 
-    return sim_trajs.dictOfSimOutcomeTrajectories[outcome_name].get_obss_over_time_period(
-        period_time_index=[FEASIBILITY_PERIOD*52, SIM_DURATION*52])
+    t0, t1 = int(FEASIBILITY_PERIOD*52), int(SIM_DURATION*52)
+    return [sim_trajs[i, t0:min(t1, sim_trajs.nRows[i]), outcome_name] for i in range(len(sim_trajs))]
 
 
 def report_traj_summary(hosp_occ_thresholds, perc_novel_thresholds):
@@ -27,8 +28,7 @@ def report_traj_summary(hosp_occ_thresholds, perc_novel_thresholds):
     """
 
     # read trajectories
-    sim_trajs = T.SimOutcomeTrajectories(
-        csv_directory=ROOT_DIR+'/outputs/trajectories')
+    sim_trajs = TrajectoryStore(directory=ROOT_DIR+'/outputs/trajectories')
 
     hosp_occ_all_trajs = get_trajs_over_training_period(
         sim_trajs=sim_trajs,
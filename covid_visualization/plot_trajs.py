@@ -4,6 +4,7 @@ import covid_model.data as D
 import definitions as Def
 from covid_model.data import *
 from covid_model.settings import COVIDSettings
+from covid_model.trajectory_store import TrajectoryStore
 from definitions import AgeGroups, Variants, FEASIBILITY_PERIOD, ROOT_DIR
 
 A.FEASIBLE_REGION_COLOR_CODE = 'pink'
@@ -28,7 +29,7 @@ def plot(prev_multiplier=52, incd_multiplier=1, obs_incd_multiplier=1,
         save_plots_dir = ROOT_DIR + '/outputs/figures'
 
     directory = ROOT_DIR + '/outputs/trajectories'
-    sim_outcomes = A.SimOutcomeTrajectories(csv_directory=directory)
+    sim_outcomes = TrajectoryStore(directory=directory).get_sim_outcome_trajectories()
 
     # defaults
     SIM_DURATION = Def.SIM_DURATION*52
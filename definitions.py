@@ -8,8 +8,17 @@ ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 FEASIBILITY_PERIOD = 1.75  # years (from Mar-1, 2020 to Dec-1) -> week 91
 CALIB_PERIOD = 2  # years (simulation duration during calibration)
 N_SIM_CALIBRATION = 150*50  # number of simulated trajectories used for calibration
+CALIB_METHOD = 'random sampling'  # 'random sampling' or 'abc-smc' (ABC-SMC requires SIM_ENGINE = 'numpy')
 
 SIM_DURATION = 2.25  # years (until Jun-1, 2022)
+SIM_ENGINE = 'apacepy'  # 'apacepy' or 'numpy' (vectorized implementation of the COVID model)
+SIM_BATCH_SIZE = 250  # number of trajectories simulated together by the 'numpy' engine
+SIM_DETERMINISTIC = False  # if True, the 'numpy' engine integrates the ODEs of the expected (mean-field) dynamics
+SIM_TAU_LEAPING = False  # if True, the 'numpy' engine adapts its time-step to the expected change in E and I
+TAU_LEAPING_EPS = 0.1  # maximum expected relative change in E and I (of each variant) during a time-step
+TAU_LEAPING_MIN_CHANGE = 30  # change in E and I (of each variant) that is allowed during a time-step however small they are
+OUTPUT_PROFILE = 'full diagnostics'  # time-series collected for each trajectory when not calibrating:
+                                     # 'minimal for prediction' or 'full diagnostics' (needed to plot trajectories)
 
 # to build datasets for developing predictive models
 FIRST_WEEK_OF_PREDICTION_PERIOD = 96  # for example, 96 is the first week of winter
@@ -20,6 +29,7 @@ HOSP_OCCU_THRESHOLDS = (10, 15, 20)  # per 100,000 population
 N_SIM_TRAINING = 20*50
 N_SIM_VALIDATION = 5*50
 CV_FOLD = 10         # num of splits for cross validation
+FE_N_WORKERS = 1     # num of processes to build datasets from trajectories (1: no process pool)
 FILL_TREE = True
 
 SCENARIOS = {
@@ -2,8 +2,13 @@ import apacepy.calibration as calib
 from apacepy.multi_epidemics import MultiEpidemics
 
 from covid_model import model as M
+from covid_model.parameter_store import write_parameter_store
 from covid_model.settings import COVIDSettings
+from covid_model.trajectory_store import convert_csv_files_to_trajectory_store
+from covid_model.vectorized_calibration import get_param_overrides
+from covid_model.vectorized_model import VectorizedMultiEpidemics
 from covid_visualization.plot_trajs import plot
+from definitions import ROOT_DIR
 
 N = 100  # N_SIM_TRAINING  # number of simulation
 IF_NOVEL_VARIANT = True     # default True
@@ -18,7 +23,16 @@ def simulate(n=25,
              calibrated=True, seeds=None, weights=None, sample_seeds_by_weights=False,
              novel_variant_will_emerge=True, mitigating_strategies_on=True,
              print_summary_stats=True,
-             folder_to_save_plots=None):
+             folder_to_save_plots=None,
+             until=None, snapshots=None):
+    """
+    :param until: (float) time (in years) to pause the simulation at; if provided, trajectories are not
+        exported and the paused batches are returned (requires SIM_ENGINE = 'numpy')
+    :param snapshots: (list) of paused batches returned by this function to continue under the
+        scenario specified by novel_variant_will_emerge and mitigating_strategies_on
+        (requires SIM_ENGINE = 'numpy')
+    :return: the paused batches if until is provided
+    """
 
     print('Simulating ...')
 
@@ -27,39 +41,75 @@ def simulate(n=25,
         novel_variant_will_emerge=novel_variant_will_emerge,
         mitigating_strategies_on=mitigating_strategies_on)
 
-    # build multiple epidemics
-    multi_model = MultiEpidemics(model_settings=sets)
+    if calibrated:
+        # parameter values of calibrated trajectories if the model is calibrated with ABC-SMC
+        sets.paramOverrides = get_param_overrides(filename=ROOT_DIR + '/outputs/summary/calibration_summary.csv')
+        if sets.paramOverrides is not None and sets.engine != 'numpy':
+            raise ValueError("Simulating a model calibrated with ABC-SMC requires SIM_ENGINE = 'numpy'.")
 
-    if calibrated and seeds is None:
+    # build multiple epidemics
+    if sets.engine == 'numpy':
+        multi_model = VectorizedMultiEpidemics(model_settings=sets)
+    else:
+        if until is not None or snapshots is not None:
+            raise ValueError("Pausing and branching simulations requires SIM_ENGINE = 'numpy'.")
+        multi_model = MultiEpidemics(model_settings=sets)
+
+    if calibrated and seeds is None and snapshots is None:
         # get the seeds and probability weights
         seeds = calib.get_seeds_with_non_zero_prob(
             filename='outputs/summary/calibration_summary.csv',
             random_state=0)
         # seeds, weights = calib.get_seeds_and_probs('outputs/summary/calibration_summary.csv')
 
-    multi_model.simulate(function_to_populate_model=M.build_covid_model,
-                         n=n,
-                         seeds=seeds,
-                         weights=weights,
-                         sample_seeds_by_weights=sample_seeds_by_weights,
-                         if_run_in_parallel=IF_PARALLEL)
+    if until is None and snapshots is None:
+        multi_model.simulate(function_to_populate_model=M.build_covid_model,
+                             n=n,
+                             seeds=seeds,
+                             weights=weights,
+                             sample_seeds_by_weights=sample_seeds_by_weights,
+                             if_run_in_parallel=IF_PARALLEL)
+        if sets.engine != 'numpy' and sets.exportTrajectories:
+            # apacepy exports trajectories into csv files
+            convert_csv_files_to_trajectory_store(
+                directory=sets.folderToSaveTrajs,
+                scenario=sets.scenario,
+                dict_of_run_times=dict(zip(multi_model.multiModelOutputs.ids, multi_model.multiModelOutputs.runTimes)))
+    else:
+        multi_model.simulate(n=n,
+                             seeds=seeds,
+                             weights=weights,
+                             sample_seeds_by_weights=sample_seeds_by_weights,
+                             if_run_in_parallel=IF_PARALLEL,
+                             until=until,
+                             snapshots=snapshots)
+        if until is not None:
+            return multi_model.snapshots
 
     # save ids, seeds, runtime,
     if print_summary_stats:
         multi_model.save_summary()
+        # save parameter values into the parameter store (read by feature engineering)
+        if sets.storeParameterValues:
+            write_parameter_store(ids=multi_model.multiModelOutputs.ids,
+                                  seeds=multi_model.multiModelOutputs.seeds,
+                                  dict_of_param_values=multi_model.multiModelOutputs.dictParameterValues,
+                                  directory=sets.folderToSaveSummary)
 
     # get summary statistics of runtime,
     if print_summary_stats:
         multi_model.print_summary_stats()
 
-    # plot trajectories
-    if n_to_display is not None:
+    # plot trajectories (which requires all time-series)
+    if n_to_display is not None and sets.outputProfile == 'full diagnostics':
         plot(prev_multiplier=52,  # to show weeks on the x-axis of prevalence data
              incd_multiplier=sets.simulationOutputPeriod * 52,  # to show weeks on the x-axis of incidence data
              obs_incd_multiplier=sets.observationPeriod*52,
              n_random_trajs_to_display=n_to_display,
              save_plots_dir=folder_to_save_plots
              )
+    elif n_to_display is not None:
+        print("Trajectories are not plotted since OUTPUT_PROFILE is not 'full diagnostics'.")
 
 
 if __name__ == "__main__":
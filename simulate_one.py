@@ -2,6 +2,8 @@ from apacepy.epidemic import EpiModel
 
 from covid_model import model as M
 from covid_model.settings import COVIDSettings
+from covid_model.trajectory_store import convert_csv_files_to_trajectory_store
+from covid_model.vectorized_model import VectorizedEpiModel
 from covid_visualization.plot_trajs import plot
 
 
@@ -9,16 +11,27 @@ def simulate(seed):
 
     # get model settings
     sets = COVIDSettings(novel_variant_will_emerge=True, if_calibrating=True)
-
-    # make an (empty) epidemic model
-    model = EpiModel(id=1, settings=sets)
-    # populate the SIR model
-    M.build_covid_model(model)
+    # all time-series are needed to plot the trajectory
+    sets.outputProfile = 'full diagnostics'
+
+    if sets.engine == 'numpy':
+        # make a vectorized COVID model
+        model = VectorizedEpiModel(id=1, settings=sets)
+    else:
+        # make an (empty) epidemic model
+        model = EpiModel(id=1, settings=sets)
+        # populate the SIR model
+        M.build_covid_model(model)
 
     # simulate
     model.simulate(seed=seed)
     # print trajectories
     model.export_trajectories(delete_existing_files=True)
+    if sets.engine != 'numpy':
+        # apacepy exports trajectories into csv files
+        convert_csv_files_to_trajectory_store(directory=sets.folderToSaveTrajs,
+                                              scenario=sets.scenario,
+                                              dict_of_run_times={model.id: model.runTime})
 
     # print discounted outcomes
     print(model.get_total_discounted_cost_and_health())